@@ -0,0 +1,6 @@
+from django.contrib import admin
+
+from analytics.models import DailyBookStats, DailyRevenue
+
+admin.site.register(DailyBookStats)
+admin.site.register(DailyRevenue)
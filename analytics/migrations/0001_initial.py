@@ -0,0 +1,81 @@
+# Generated by Django 4.0.4 on 2026-10-18 10:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ("book", "0002_book_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRevenue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                ("payments", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "fines_revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "fines_issued",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily revenue",
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyBookStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("borrowings", models.PositiveIntegerField(default=0)),
+                ("returns", models.PositiveIntegerField(default=0)),
+                ("late_returns", models.PositiveIntegerField(default=0)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="book.book",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily book stats",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailybookstats",
+            constraint=models.UniqueConstraint(
+                fields=("date", "book"), name="unique_daily_book_stats"
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import models
+
+from book.models import Book
+
+
+class DailyBookStats(models.Model):
+    """How often a book was borrowed and returned on one day"""
+
+    date = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    borrowings = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    late_returns = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "book"], name="unique_daily_book_stats"
+            ),
+        ]
+        verbose_name_plural = "daily book stats"
+
+    def __str__(self):
+        return f"{self.book_id} on {self.date}"
+
+
+class DailyRevenue(models.Model):
+    """Money collected and fines issued on one day"""
+
+    date = models.DateField(unique=True)
+    payments = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fines_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fines_issued = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "daily revenue"
+
+    def __str__(self):
+        return f"Revenue on {self.date}"
@@ -0,0 +1,185 @@
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django_q.tasks import async_task
+
+from borrowing.models import Borrowing, ScanCheckpoint
+from payment.models import Payment
+from scheduler.locks import task_lock
+from .models import DailyBookStats, DailyRevenue
+
+ROLLUP = "rollup_daily_stats"
+# Days rolled up in one transaction
+WINDOW_DAYS = 31
+# Days before the last rolled-up one that are aggregated again, so that
+# changes made around midnight are not missed
+OVERLAP_DAYS = 1
+# Stop early enough to commit the window before the cluster kills the task
+TIME_BUDGET = settings.Q_CLUSTER["timeout"] * 0.8
+
+
+def rollup_daily_stats(start=None, end=None, time_budget=TIME_BUDGET):
+    """
+    Aggregate borrowings and payments into the daily rollup tables.
+
+    Days from ``start`` to ``end`` (today by default, ISO strings accepted)
+    are rebuilt from the raw tables in windows of ``WINDOW_DAYS``. Without
+    a start, the job continues from the last day it rolled up, or covers
+    the whole history on its first run. The checkpoint is saved with every
+    window, and a run about to hit the cluster timeout queues its own
+    continuation from the next window. Returns the number of days rolled
+    up, or None when another run holds the lock.
+    """
+    end = _as_date(end) or date.today()
+    deadline = monotonic() + time_budget
+
+    with task_lock(ROLLUP, ttl=settings.Q_CLUSTER["timeout"]) as acquired:
+        if not acquired:
+            return None
+
+        checkpoint = ScanCheckpoint.objects.filter(name=ROLLUP).first()
+        start = _as_date(start)
+        if start is None and checkpoint is not None:
+            start = checkpoint.run_date - timedelta(days=OVERLAP_DAYS)
+        if start is None:
+            start = _first_activity_date() or end
+
+        window_start = start
+        while window_start <= end:
+            window_end = min(window_start + timedelta(days=WINDOW_DAYS - 1), end)
+            _rollup(window_start, window_end)
+            window_start = window_end + timedelta(days=1)
+            if window_start <= end and monotonic() > deadline:
+                break
+        else:
+            window_end = end
+
+    # Queued only once the lock is released, so the continuation can take it
+    if window_start <= end:
+        async_task(
+            "analytics.tasks.rollup_daily_stats",
+            start=window_start.isoformat(),
+            end=end.isoformat(),
+        )
+    return max((window_end - start).days + 1, 0)
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _first_activity_date():
+    dates = [
+        Borrowing.objects.aggregate(first=Min("borrow_date"))["first"],
+        Payment.objects.aggregate(first=Min("paid_at"))["first"],
+    ]
+    dates = [
+        timezone.localdate(value) if isinstance(value, datetime) else value
+        for value in dates
+        if value is not None
+    ]
+    return min(dates, default=None)
+
+
+@transaction.atomic
+def _rollup(start, end):
+    DailyBookStats.objects.filter(date__range=(start, end)).delete()
+    DailyRevenue.objects.filter(date__range=(start, end)).delete()
+
+    DailyBookStats.objects.bulk_create(_book_stats(start, end), batch_size=1000)
+    DailyRevenue.objects.bulk_create(_revenue(start, end), batch_size=1000)
+
+    # Committed with the window, so a killed run resumes after it
+    checkpoint, created = ScanCheckpoint.objects.select_for_update().get_or_create(
+        name=ROLLUP, defaults={"run_date": end, "completed": True}
+    )
+    if not created and checkpoint.run_date < end:
+        checkpoint.run_date = end
+        checkpoint.save(update_fields=["run_date"])
+
+
+def _book_stats(start, end):
+    stats = {}
+
+    borrowed = (
+        Borrowing.objects.filter(borrow_date__range=(start, end))
+        .values("borrow_date", "book_id")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    for row in borrowed:
+        key = (row["borrow_date"], row["book_id"])
+        stats[key] = DailyBookStats(
+            date=key[0], book_id=key[1], borrowings=row["count"]
+        )
+
+    returned = (
+        Borrowing.objects.filter(actual_return_date__range=(start, end))
+        .values("actual_return_date", "book_id")
+        .annotate(
+            count=Count("id"),
+            late=Count(
+                "id", filter=Q(actual_return_date__gt=F("expected_return_date"))
+            ),
+        )
+        .order_by()
+    )
+    for row in returned:
+        key = (row["actual_return_date"], row["book_id"])
+        day = stats.setdefault(key, DailyBookStats(date=key[0], book_id=key[1]))
+        day.returns = row["count"]
+        day.late_returns = row["late"]
+
+    return stats.values()
+
+
+def _revenue(start, end):
+    days = {}
+
+    # Bounds on the raw column, so the paid_at index can be used
+    paid = (
+        Payment.objects.filter(
+            status=Payment.StatusChoices.PAID,
+            paid_at__gte=_start_of_day(start),
+            paid_at__lt=_start_of_day(end + timedelta(days=1)),
+        )
+        .annotate(day=TruncDate("paid_at"))
+        .values("day")
+        .annotate(
+            count=Count("id"),
+            revenue=Sum("money_to_pay"),
+            fines=Sum("money_to_pay", filter=Q(type=Payment.TypeChoices.FINE)),
+        )
+        .order_by()
+    )
+    for row in paid:
+        days[row["day"]] = DailyRevenue(
+            date=row["day"],
+            payments=row["count"],
+            revenue=row["revenue"],
+            fines_revenue=row["fines"] or 0,
+        )
+
+    issued = (
+        Payment.objects.filter(
+            type=Payment.TypeChoices.FINE,
+            borrowing__actual_return_date__range=(start, end),
+        )
+        .values(day=F("borrowing__actual_return_date"))
+        .annotate(total=Sum("money_to_pay"))
+        .order_by()
+    )
+    for row in issued:
+        day = days.setdefault(row["day"], DailyRevenue(date=row["day"]))
+        day.fines_issued = row["total"]
+
+    return days.values()
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
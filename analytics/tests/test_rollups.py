@@ -0,0 +1,220 @@
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from analytics.models import DailyBookStats, DailyRevenue
+from analytics import tasks
+from analytics.tasks import rollup_daily_stats
+from book.models import Book
+from borrowing.models import Borrowing, ScanCheckpoint
+from payment.models import Payment
+
+User = get_user_model()
+
+REVENUE_URL = reverse("analytics:report-revenue")
+BOOKS_URL = reverse("analytics:report-books")
+
+
+class RollupTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pw")
+        self.dune = Book.objects.create(title="Dune", daily_fee=2, inventory=9)
+        self.emma = Book.objects.create(title="Emma", daily_fee=1, inventory=9)
+
+    def borrow(self, book, borrowed, expected, returned=None):
+        borrowing = Borrowing.objects.create(
+            expected_return_date=expected, book=book, user=self.user
+        )
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrow_date=borrowed, actual_return_date=returned
+        )
+        return borrowing
+
+    def pay(self, borrowing, amount, paid_on, payment_type="Payment"):
+        return Payment.objects.create(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PAID,
+            type=payment_type,
+            money_to_pay=amount,
+            paid_at=timezone.make_aware(datetime.combine(paid_on, datetime.min.time()))
+            + timedelta(hours=12),
+        )
+
+
+class RollupDailyStatsTestCase(RollupTestMixin, TestCase):
+    def test_first_run_covers_the_whole_history(self):
+        first = self.borrow(
+            self.dune, date(2023, 1, 1), date(2023, 1, 3), returned=date(2023, 1, 5)
+        )
+        self.borrow(self.dune, date(2023, 1, 1), date(2023, 1, 9))
+        self.borrow(self.emma, date(2023, 1, 5), date(2023, 1, 9))
+        self.pay(first, 6, date(2023, 1, 1))
+        self.pay(first, 8, date(2023, 1, 5), payment_type="Fine")
+
+        rollup_daily_stats(end=date(2023, 1, 10))
+
+        self.assertEqual(
+            list(
+                DailyBookStats.objects.order_by("date", "book_id").values_list(
+                    "date", "book_id", "borrowings", "returns", "late_returns"
+                )
+            ),
+            [
+                (date(2023, 1, 1), self.dune.id, 2, 0, 0),
+                (date(2023, 1, 5), self.dune.id, 0, 1, 1),
+                (date(2023, 1, 5), self.emma.id, 1, 0, 0),
+            ],
+        )
+        self.assertEqual(
+            list(
+                DailyRevenue.objects.order_by("date").values_list(
+                    "date", "payments", "revenue", "fines_revenue", "fines_issued"
+                )
+            ),
+            [
+                (date(2023, 1, 1), 1, 6, 0, 0),
+                (date(2023, 1, 5), 1, 8, 8, 8),
+            ],
+        )
+
+    def test_later_runs_only_rebuild_recent_days(self):
+        self.borrow(self.dune, date(2023, 1, 1), date(2023, 1, 3))
+        rollup_daily_stats(end=date(2023, 1, 10))
+        DailyBookStats.objects.update(borrowings=99)
+
+        self.borrow(self.emma, date(2023, 1, 11), date(2023, 1, 12))
+        days = rollup_daily_stats(end=date(2023, 1, 11))
+
+        self.assertEqual(days, 3)
+        self.assertEqual(
+            dict(DailyBookStats.objects.values_list("date", "borrowings")),
+            {date(2023, 1, 1): 99, date(2023, 1, 11): 1},
+        )
+
+    def test_rerun_is_idempotent(self):
+        self.borrow(self.dune, date(2023, 1, 1), date(2023, 1, 3))
+
+        rollup_daily_stats(end=date(2023, 1, 2))
+        rollup_daily_stats(start="2023-01-01", end="2023-01-02")
+
+        self.assertEqual(DailyBookStats.objects.get().borrowings, 1)
+
+    @mock.patch("analytics.tasks.async_task")
+    def test_run_out_of_time_keeps_its_windows_and_requeues(self, async_task):
+        self.borrow(self.dune, date(2023, 1, 1), date(2023, 1, 3))
+
+        days = rollup_daily_stats(end=date(2023, 3, 31), time_budget=-1)
+
+        # Only the first 31-day window was rolled up
+        self.assertEqual(days, 31)
+        self.assertEqual(
+            ScanCheckpoint.objects.get(name="rollup_daily_stats").run_date,
+            date(2023, 1, 31),
+        )
+        async_task.assert_called_once_with(
+            "analytics.tasks.rollup_daily_stats", start="2023-02-01", end="2023-03-31"
+        )
+
+    def test_killed_run_resumes_after_the_last_committed_window(self):
+        self.borrow(self.dune, date(2023, 1, 1), date(2023, 1, 3))
+        book_stats = tasks._book_stats
+        calls = []
+
+        def fail_second_window(start, end):
+            calls.append(start)
+            if len(calls) == 2:
+                raise RuntimeError("killed")
+            return book_stats(start, end)
+
+        with mock.patch("analytics.tasks._book_stats", fail_second_window):
+            with self.assertRaises(RuntimeError):
+                rollup_daily_stats(end=date(2023, 3, 31))
+
+        self.assertEqual(
+            ScanCheckpoint.objects.get(name="rollup_daily_stats").run_date,
+            date(2023, 1, 31),
+        )
+        self.assertEqual(DailyBookStats.objects.get().date, date(2023, 1, 1))
+
+    def test_no_activity(self):
+        self.assertEqual(rollup_daily_stats(), 1)
+        self.assertFalse(DailyBookStats.objects.exists())
+
+
+class AnalyticsApiTestCase(RollupTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_superuser(email="admin@example.com", password="pw")
+        )
+        january = self.borrow(self.dune, date(2023, 1, 1), date(2023, 1, 3))
+        self.borrow(self.dune, date(2023, 2, 1), date(2023, 2, 3))
+        self.borrow(self.emma, date(2023, 2, 2), date(2023, 2, 3))
+        self.pay(january, 6, date(2023, 1, 1))
+        self.pay(january, 4, date(2023, 1, 20))
+        self.pay(january, 8, date(2023, 2, 1), payment_type="Fine")
+        rollup_daily_stats(end=date(2023, 2, 28))
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        raw_tables = [Borrowing._meta.db_table, Payment._meta.db_table]
+        self.assertFalse(
+            [q for q in queries if any(table in q["sql"] for table in raw_tables)]
+        )
+        return response.data
+
+    def test_revenue_by_month(self):
+        rows = self.get(REVENUE_URL, {"period": "month"})
+
+        self.assertEqual(
+            [(row["period"], row["payments"], row["revenue"]) for row in rows],
+            [(date(2023, 1, 1), 2, 10), (date(2023, 2, 1), 1, 8)],
+        )
+        self.assertEqual(rows[1]["fines_revenue"], 8)
+
+    def test_revenue_by_day_in_a_range(self):
+        rows = self.get(REVENUE_URL, {"start": "2023-01-10", "end": "2023-01-31"})
+
+        self.assertEqual([row["period"] for row in rows], [date(2023, 1, 20)])
+
+    def test_most_borrowed_books(self):
+        rows = self.get(BOOKS_URL, {"limit": 1})
+
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "book": self.dune.id,
+                    "title": "Dune",
+                    "borrowings": 2,
+                    "returns": 0,
+                    "late_returns": 0,
+                }
+            ],
+        )
+
+    def test_invalid_range(self):
+        response = self.client.get(
+            REVENUE_URL, {"start": "2023-02-01", "end": "2023-01-01"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reports_require_admin(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(REVENUE_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,13 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from .views import AnalyticsViewSet
+
+router = DefaultRouter()
+router.register("reports", AnalyticsViewSet, basename="report")
+
+urlpatterns = [
+    path("", include(router.urls)),
+]
+
+app_name = "analytics"
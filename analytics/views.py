@@ -0,0 +1,84 @@
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from drf_spectacular.utils import extend_schema
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from drf_library.routers import ReplicaReadMixin
+from .models import DailyBookStats, DailyRevenue
+from .serializers import ReportQuerySerializer
+
+
+class AnalyticsViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    Reports served from the daily rollup tables, which the
+    rollup_daily_stats job keeps up to date; the raw borrowing and payment
+    tables are never read here.
+    """
+
+    permission_classes = [IsAdminUser]
+    replica_actions = ("revenue", "books")
+
+    def get_params(self):
+        serializer = ReportQuerySerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @staticmethod
+    def filter_dates(queryset, params):
+        if "start" in params:
+            queryset = queryset.filter(date__gte=params["start"])
+        if "end" in params:
+            queryset = queryset.filter(date__lte=params["end"])
+        return queryset
+
+    @extend_schema(parameters=[ReportQuerySerializer])
+    @action(detail=False, methods=["GET"])
+    def revenue(self, request):
+        """Payments, revenue and fines per day or per month"""
+        params = self.get_params()
+        queryset = self.filter_dates(DailyRevenue.objects.all(), params)
+        period = TruncMonth("date") if params["period"] == "month" else F("date")
+
+        rows = (
+            queryset.values(period=period)
+            .annotate(
+                payments=Sum("payments"),
+                revenue=Sum("revenue"),
+                fines_revenue=Sum("fines_revenue"),
+                fines_issued=Sum("fines_issued"),
+            )
+            .order_by("period")
+        )
+        return Response(list(rows))
+
+    @extend_schema(parameters=[ReportQuerySerializer])
+    @action(detail=False, methods=["GET"])
+    def books(self, request):
+        """The most borrowed books of the period"""
+        params = self.get_params()
+        queryset = self.filter_dates(DailyBookStats.objects.all(), params)
+
+        rows = (
+            queryset.values("book_id", "book__title")
+            .annotate(
+                borrowings=Sum("borrowings"),
+                returns=Sum("returns"),
+                late_returns=Sum("late_returns"),
+            )
+            .order_by("-borrowings", "book_id")[: params["limit"]]
+        )
+        return Response(
+            [
+                {
+                    "book": row["book_id"],
+                    "title": row["book__title"],
+                    "borrowings": row["borrowings"],
+                    "returns": row["returns"],
+                    "late_returns": row["late_returns"],
+                }
+                for row in rows
+            ]
+        )
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "book:catalog:version"
+CATALOG_TIMEOUT = 60 * 15
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from the clock so an evicted counter never reuses old keys
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    """
+    Orphan every cached catalog response by bumping the catalog version.
+
+    The version is bumped right away, so the current transaction does not
+    read its own stale pages, and once more after commit, so a page cached
+    by another request before the commit became visible is not served.
+    """
+    _bump_catalog_version()
+    transaction.on_commit(_bump_catalog_version)
+
+
+def _bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+
+
+def cached_catalog_response(request, render):
+    """
+    Serve a catalog response from the cache, rendering it on a miss.
+
+    Entries are keyed on the catalog version, the path and the sorted query
+    parameters, and carry an ETag of their data. A request whose
+    ``If-None-Match`` matches gets an empty 304.
+    """
+    query = sorted(request.query_params.lists())
+    key = "book:catalog:{}:{}".format(
+        get_catalog_version(),
+        hashlib.md5(json.dumps([request.path, query]).encode()).hexdigest(),
+    )
+
+    entry = cache.get(key)
+    if entry is None:
+        response = render()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        data = json.dumps(response.data, sort_keys=True, default=str)
+        entry = {
+            "data": response.data,
+            "etag": '"{}"'.format(hashlib.md5(data.encode()).hexdigest()),
+        }
+        cache.set(key, entry, CATALOG_TIMEOUT)
+
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if entry["etag"] in etags or "*" in etags:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(entry["data"])
+    response["ETag"] = entry["etag"]
+    return response
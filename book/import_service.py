@@ -0,0 +1,89 @@
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from drf_library.streaming import MAX_ERRORS, chunked, read_records
+from .cache import invalidate_catalog
+from .models import Book
+from .serializers import BookSerializer
+
+BATCH_SIZE = 1000
+FIELDS = ["id", "title", "author", "cover", "inventory", "daily_fee"]
+
+
+def import_books(lines, file_format, batch_size=BATCH_SIZE):
+    """
+    Upsert books from a CSV or NDJSON text stream.
+
+    Records are read lazily and validated with ``BookSerializer``. Each
+    batch is written in its own transaction: records whose ``id`` matches
+    an existing book update it, all others are inserted. Invalid records
+    are skipped and reported with their line number.
+    """
+    result = {"created": 0, "updated": 0, "invalid": 0, "errors": []}
+
+    for batch in chunked(read_records(lines, file_format), batch_size):
+        books = []
+        for line_number, record in batch:
+            book = _validate(record)
+            if isinstance(book, Book):
+                books.append(book)
+                continue
+            result["invalid"] += 1
+            if len(result["errors"]) < MAX_ERRORS:
+                result["errors"].append({"line": line_number, "errors": book})
+
+        created, updated = _upsert(books)
+        result["created"] += created
+        result["updated"] += updated
+
+    if result["created"] or result["updated"]:
+        invalidate_catalog()
+    return result
+
+
+def _validate(record):
+    if record is None:
+        return {"non_field_errors": ["Not a JSON object."]}
+
+    serializer = BookSerializer(data=record)
+    if not serializer.is_valid():
+        return serializer.errors
+
+    book_id = record.get("id")
+    try:
+        book_id = int(book_id) if book_id not in (None, "") else None
+    except (TypeError, ValueError):
+        return {"id": ["A valid integer is required."]}
+    return Book(id=book_id, **serializer.validated_data)
+
+
+@transaction.atomic
+def _upsert(books):
+    # Later records win when the same id appears twice in a batch
+    by_id = {book.id: book for book in books if book.id is not None}
+    existing = set(Book.objects.filter(id__in=by_id).values_list("id", flat=True))
+
+    to_update = [by_id[book_id] for book_id in existing]
+    to_create = [
+        book
+        for book in books
+        if book.id is None or (book.id not in existing and by_id[book.id] is book)
+    ]
+
+    Book.objects.bulk_update(to_update, FIELDS[1:])
+    with_id = [book for book in to_create if book.id is not None]
+    if with_id:
+        Book.objects.bulk_create(with_id)
+        # Before any row takes an id from the sequence, which on Postgres
+        # does not move past explicitly inserted ids
+        _reset_id_sequence()
+    Book.objects.bulk_create([book for book in to_create if book.id is None])
+    return len(to_create), len(to_update)
+
+
+def _reset_id_sequence():
+    """Move the id sequence past ids that were inserted explicitly"""
+    statements = connection.ops.sequence_reset_sql(no_style(), [Book])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
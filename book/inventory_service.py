@@ -0,0 +1,27 @@
+from django.db.models import F
+
+from .cache import invalidate_catalog
+from .models import Book
+
+
+def reserve_copies(book_id, quantity=1):
+    """
+    Take ``quantity`` copies of a book off the shelf.
+
+    The check and the decrement are one conditional UPDATE, so concurrent
+    checkouts serialize on the book's row lock instead of racing on a
+    value read earlier in Python, and the inventory can never go below
+    zero. Returns False when there are not enough copies left.
+    """
+    reserved = Book.objects.filter(pk=book_id, inventory__gte=quantity).update(
+        inventory=F("inventory") - quantity
+    )
+    if reserved:
+        invalidate_catalog()
+    return bool(reserved)
+
+
+def release_copies(book_id, quantity=1):
+    """Put ``quantity`` copies of a book back on the shelf."""
+    Book.objects.filter(pk=book_id).update(inventory=F("inventory") + quantity)
+    invalidate_catalog()
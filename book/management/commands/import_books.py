@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book.import_service import BATCH_SIZE, import_books
+from drf_library.streaming import detect_format
+
+
+class Command(BaseCommand):
+    help = "Create or update books from a CSV or NDJSON file, matched on id"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to import, or "-" for stdin')
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Defaults to the file extension, or csv",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or detect_format(path)
+
+        try:
+            lines = (
+                sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+            )
+        except OSError as error:
+            raise CommandError(error)
+
+        with lines:
+            result = import_books(lines, file_format, options["batch_size"])
+
+        for error in result["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result['created']}, updated {result['updated']}, "
+                f"skipped {result['invalid']} invalid books"
+            )
+        )
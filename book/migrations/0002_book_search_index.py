@@ -0,0 +1,72 @@
+from django.db import migrations
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE book_book_fts USING fts5(
+        title, author,
+        content='book_book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER book_book_fts_insert AFTER INSERT ON book_book BEGIN
+        INSERT INTO book_book_fts(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    """
+    CREATE TRIGGER book_book_fts_delete AFTER DELETE ON book_book BEGIN
+        INSERT INTO book_book_fts(book_book_fts, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    """
+    CREATE TRIGGER book_book_fts_update AFTER UPDATE OF title, author ON book_book
+    BEGIN
+        INSERT INTO book_book_fts(book_book_fts, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO book_book_fts(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    "INSERT INTO book_book_fts(book_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS book_book_fts_insert",
+    "DROP TRIGGER IF EXISTS book_book_fts_delete",
+    "DROP TRIGGER IF EXISTS book_book_fts_update",
+    "DROP TABLE IF EXISTS book_book_fts",
+]
+
+# Must match book.search.POSTGRES_VECTOR for the planner to use the index
+POSTGRES_CREATE = [
+    """
+    CREATE INDEX book_book_search_idx ON book_book USING GIN (
+        to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(author, ''))
+    )
+    """,
+]
+
+POSTGRES_DROP = ["DROP INDEX IF EXISTS book_book_search_idx"]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({"sqlite": SQLITE_CREATE, "postgresql": POSTGRES_CREATE}),
+            run_for_vendor({"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP}),
+        ),
+    ]
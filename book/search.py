@@ -0,0 +1,72 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# Kept in sync with the indexes created in migration 0002_book_search_index
+SQLITE_TABLE = "book_book_fts"
+POSTGRES_VECTOR = (
+    "to_tsvector('simple', "
+    "coalesce(book_book.title, '') || ' ' || coalesce(book_book.author, ''))"
+)
+
+
+def search_terms(query):
+    return re.findall(r"[^\W_]+", query)
+
+
+def search_books(queryset, query):
+    """
+    Filter books whose title or author match every word of ``query``.
+
+    Words match as prefixes, so "harr pot" finds "Harry Potter". Books are
+    annotated with ``search_rank`` (higher is better) and ordered by it.
+    SQLite uses the FTS5 table and Postgres the GIN tsvector index; other
+    backends fall back to ``icontains`` with a constant rank.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    # The alias the query runs on, which the replica router may have picked
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite":
+        match = " ".join('"{}"*'.format(term) for term in terms)
+        queryset = queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s",
+                (match,),
+            )
+        ).annotate(
+            # bm25() is lower for better matches
+            search_rank=RawSQL(
+                f"SELECT -bm25({SQLITE_TABLE}) FROM {SQLITE_TABLE} "
+                f"WHERE {SQLITE_TABLE} MATCH %s AND rowid = book_book.id",
+                (match,),
+                output_field=FloatField(),
+            )
+        )
+    elif vendor == "postgresql":
+        tsquery = " & ".join("{}:*".format(term) for term in terms)
+        queryset = queryset.filter(
+            RawSQL(
+                f"{POSTGRES_VECTOR} @@ to_tsquery('simple', %s)",
+                (tsquery,),
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank({POSTGRES_VECTOR}, to_tsquery('simple', %s))",
+                (tsquery,),
+                output_field=FloatField(),
+            )
+        )
+    else:
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(author__icontains=term)
+            )
+        queryset = queryset.annotate(search_rank=Value(1.0, FloatField()))
+
+    return queryset.order_by("-search_rank", "id")
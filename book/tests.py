@@ -1,12 +1,39 @@
+import io
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from .import_service import import_books
+from .inventory_service import release_copies, reserve_copies
 from .models import Book
+from .search import SQLITE_TABLE, search_books
 
 BOOK_URL = reverse("books:book-list")
+IMPORT_URL = reverse("books:book-import-file")
+EXPORT_URL = reverse("books:book-export")
+
+CATALOG_CSV = """id,title,author,cover,inventory,daily_fee
+,Dune,Frank Herbert,HARD,3,1.50
+,Emma,Jane Austen,SOFT,1,0.75
+,Broken,Nobody,PAPER,1,1
+"""
+
+
+def detail_url(book_id):
+    return reverse("books:book-detail", args=[book_id])
 
 
 class UnauthenticatedBookApiTests(TestCase):
@@ -60,3 +87,383 @@ class AdminBookApiTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         for key in payload:
             self.assertEqual(payload[key], getattr(book, key))
+
+
+class InventoryReservationTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Popular", author="Author", cover="HARD", inventory=2, daily_fee=1
+        )
+
+    def test_reserve_until_out_of_stock(self):
+        self.assertTrue(reserve_copies(self.book.id))
+        self.assertTrue(reserve_copies(self.book.id))
+        self.assertFalse(reserve_copies(self.book.id))
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_reserve_does_not_trust_stale_reads(self):
+        # Two checkouts that both read "2 copies left" before either writes
+        first = Book.objects.get(pk=self.book.pk)
+        second = Book.objects.get(pk=self.book.pk)
+
+        results = [reserve_copies(book.id, quantity=2) for book in (first, second)]
+
+        self.assertEqual(results, [True, False])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_release_copies(self):
+        reserve_copies(self.book.id)
+        release_copies(self.book.id)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+
+    def test_reservation_updates_only_inventory(self):
+        with CaptureQueriesContext(connection) as queries:
+            reserve_copies(self.book.id)
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("title", queries[0]["sql"])
+
+
+class BookCatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.book = Book.objects.create(
+            title="Popular", author="Author", cover="HARD", inventory=2, daily_fee=1
+        )
+
+    def test_list_is_served_from_cache(self):
+        self.client.get(BOOK_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(BOOK_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response.data[0]["title"], "Popular")
+
+    def test_query_params_are_part_of_the_key(self):
+        Book.objects.create(
+            title="Other", author="Author", cover="SOFT", inventory=1, daily_fee=1
+        )
+        self.client.get(BOOK_URL, {"title": "pop"})
+
+        response = self.client.get(BOOK_URL, {"title": "oth"})
+
+        self.assertEqual([book["title"] for book in response.data], ["Other"])
+
+    def test_unchanged_catalog_returns_not_modified(self):
+        etag = self.client.get(BOOK_URL)["ETag"]
+
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_book_change_invalidates_list_and_detail(self):
+        admin = get_user_model().objects.create_superuser("admin@admin.com", "pw")
+        self.client.force_authenticate(admin)
+        etag = self.client.get(BOOK_URL)["ETag"]
+        self.client.get(detail_url(self.book.id))
+
+        self.book.title = "Renamed"
+        self.book.save()
+
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data[0]["title"], "Renamed")
+        response = self.client.get(detail_url(self.book.id))
+        self.assertEqual(response.data["title"], "Renamed")
+
+    def test_book_delete_invalidates_list(self):
+        self.client.get(BOOK_URL)
+
+        self.book.delete()
+
+        self.assertEqual(self.client.get(BOOK_URL).data, [])
+
+    def test_inventory_change_invalidates_list(self):
+        self.client.get(BOOK_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_copies(self.book.id)
+
+        self.assertEqual(self.client.get(BOOK_URL).data[0]["inventory"], 1)
+
+        release_copies(self.book.id)
+
+        self.assertEqual(self.client.get(BOOK_URL).data[0]["inventory"], 2)
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for title, author in [
+            ("Harry Potter", "J. K. Rowling"),
+            ("Python Tricks", "Dan Bader"),
+            ("Fluent Python", "Luciano Ramalho"),
+            ("Python", "Python Software Foundation"),
+        ]:
+            Book.objects.create(
+                title=title, author=author, cover="SOFT", inventory=1, daily_fee=1
+            )
+
+    def search(self, query):
+        return list(
+            search_books(Book.objects.all(), query).values_list("title", flat=True)
+        )
+
+    def test_words_match_title_and_author_prefixes(self):
+        self.assertEqual(self.search("harr pot"), ["Harry Potter"])
+        self.assertEqual(self.search("rowl"), ["Harry Potter"])
+        self.assertEqual(self.search("pyth ramal"), ["Fluent Python"])
+        self.assertEqual(self.search("tter"), [])
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.search("python")[0], "Python")
+
+    def test_index_follows_updates_and_deletes(self):
+        book = Book.objects.get(title="Harry Potter")
+        book.title = "Philosopher's Stone"
+        book.save()
+
+        self.assertEqual(self.search("potter"), [])
+        self.assertEqual(self.search("philos"), ["Philosopher's Stone"])
+
+        book.delete()
+
+        self.assertEqual(self.search("philos"), [])
+
+    def test_backend_of_the_query_alias_is_used(self):
+        queryset = Book.objects.using("other")
+        other = mock.Mock(vendor="oracle")
+
+        with mock.patch("book.search.connections", {"other": other}):
+            sql = str(search_books(queryset, "python").query)
+
+        self.assertNotIn(SQLITE_TABLE, sql)
+        self.assertIn("LIKE", sql)
+
+    def test_list_search_param(self):
+        response = self.client.get(BOOK_URL, {"search": "fluent"})
+
+        self.assertEqual([book["title"] for book in response.data], ["Fluent Python"])
+
+    def test_title_param_still_filters(self):
+        response = self.client.get(BOOK_URL, {"title": "tricks"})
+
+        self.assertEqual([book["title"] for book in response.data], ["Python Tricks"])
+
+    def test_search_uses_the_index(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("checks the SQLite query plan")
+        with CaptureQueriesContext(connection) as queries:
+            self.search("python")
+
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + queries[0]["sql"])
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        self.assertIn("SEARCH book_book USING INTEGER PRIMARY KEY (rowid=?)", plan)
+        self.assertNotIn("SCAN book_book", plan)
+
+
+class BookImportTests(TestCase):
+    def test_csv_import_reports_invalid_rows(self):
+        result = import_books(io.StringIO(CATALOG_CSV), "csv", batch_size=2)
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(result["invalid"], 1)
+        self.assertEqual(result["errors"][0]["line"], 4)
+        self.assertIn("cover", result["errors"][0]["errors"])
+        self.assertEqual(
+            list(Book.objects.order_by("title").values_list("title", "inventory")),
+            [("Dune", 3), ("Emma", 1)],
+        )
+
+    def test_ndjson_import_upserts_on_id(self):
+        book = Book.objects.create(
+            title="Dune", author="Frank Herbert", cover="HARD", inventory=3, daily_fee=1
+        )
+        lines = [
+            {
+                "id": book.id,
+                "title": "Dune",
+                "author": "Frank Herbert",
+                "cover": "SOFT",
+                "inventory": 7,
+                "daily_fee": "2.00",
+            },
+            {
+                "id": 500,
+                "title": "Emma",
+                "author": "Jane Austen",
+                "cover": "SOFT",
+                "inventory": 1,
+                "daily_fee": "0.75",
+            },
+        ]
+        stream = io.StringIO("\n".join(map(json.dumps, lines)) + "\nnot json\n")
+
+        result = import_books(stream, "ndjson")
+
+        self.assertEqual((result["created"], result["updated"]), (1, 1))
+        self.assertEqual(result["errors"][0]["line"], 3)
+        book.refresh_from_db()
+        self.assertEqual((book.cover, book.inventory), ("SOFT", 7))
+        self.assertTrue(Book.objects.filter(id=500, title="Emma").exists())
+        # New books get ids after the explicitly imported ones
+        self.assertGreater(
+            Book.objects.create(
+                title="New", author="Author", cover="HARD", inventory=1, daily_fee=1
+            ).id,
+            500,
+        )
+
+    def test_id_sequence_is_reset_before_rows_without_id(self):
+        csv = (
+            "id,title,author,cover,inventory,daily_fee\n"
+            ",Dune,Frank Herbert,HARD,3,1.50\n"
+            "700,Emma,Jane Austen,SOFT,1,0.75\n"
+        )
+        seen = []
+
+        def reset():
+            seen.append(list(Book.objects.values_list("title", flat=True)))
+
+        with mock.patch("book.import_service._reset_id_sequence", side_effect=reset):
+            result = import_books(io.StringIO(csv), "csv")
+
+        self.assertEqual(result["created"], 2)
+        # Only the explicit id was inserted when the sequence was reset
+        self.assertEqual(seen, [["Emma"]])
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as file:
+            file.write(CATALOG_CSV)
+            file.flush()
+
+            call_command(
+                "import_books", file.name, stdout=io.StringIO(), stderr=io.StringIO()
+            )
+
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_imported_books_are_searchable_and_invalidate_the_catalog(self):
+        cache.clear()
+        self.assertEqual(APIClient().get(BOOK_URL).data, [])
+
+        import_books(io.StringIO(CATALOG_CSV), "csv")
+
+        self.assertEqual(len(APIClient().get(BOOK_URL).data), 2)
+        self.assertEqual(
+            list(
+                search_books(Book.objects.all(), "herb").values_list("title", flat=True)
+            ),
+            ["Dune"],
+        )
+
+
+class BookImportExportApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser("admin@admin.com", "password")
+        )
+
+    def test_import_upload(self):
+        upload = SimpleUploadedFile("catalog.csv", CATALOG_CSV.encode())
+
+        response = self.client.post(IMPORT_URL, {"file": upload}, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["invalid"], 1)
+
+    def test_import_requires_admin(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("user@user.com", "password")
+        )
+        upload = SimpleUploadedFile("catalog.csv", CATALOG_CSV.encode())
+
+        response = self.client.post(IMPORT_URL, {"file": upload}, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Book.objects.exists())
+
+    def test_export_round_trips_through_import(self):
+        import_books(io.StringIO(CATALOG_CSV), "csv")
+
+        for file_format in ["csv", "ndjson"]:
+            response = self.client.get(EXPORT_URL, {"file_format": file_format})
+
+            self.assertTrue(response.streaming)
+            content = b"".join(response.streaming_content).decode()
+            result = import_books(io.StringIO(content), file_format)
+            self.assertEqual((result["updated"], result["invalid"]), (2, 0))
+
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_export_ndjson_rows(self):
+        book = Book.objects.create(
+            title="Dune", author="Frank Herbert", cover="HARD", inventory=3, daily_fee=1
+        )
+
+        response = self.client.get(EXPORT_URL, {"file_format": "ndjson"})
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "id": book.id,
+                    "title": "Dune",
+                    "author": "Frank Herbert",
+                    "cover": "HARD",
+                    "inventory": 3,
+                    "daily_fee": "1.00",
+                }
+            ],
+        )
+
+
+@skipUnlessDBFeature("test_db_allows_multiple_connections")
+class ConcurrentInventoryReservationTests(TransactionTestCase):
+    CHECKOUTS = 50
+    COPIES = 20
+
+    def test_parallel_checkouts_never_oversell(self):
+        book = Book.objects.create(
+            title="Popular",
+            author="Author",
+            cover="HARD",
+            inventory=self.COPIES,
+            daily_fee=1,
+        )
+        barrier = threading.Barrier(self.CHECKOUTS)
+
+        def checkout():
+            barrier.wait()
+            try:
+                with transaction.atomic():
+                    return reserve_copies(book.id)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.CHECKOUTS) as executor:
+            results = list(executor.map(lambda _: checkout(), range(self.CHECKOUTS)))
+
+        book.refresh_from_db()
+        self.assertEqual(results.count(True), self.COPIES)
+        self.assertEqual(book.inventory, 0)
@@ -1,34 +1,65 @@
+from functools import partial
+
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, AllowAny
+from rest_framework.response import Response
+
+from drf_library.routers import ReplicaReadMixin
+from drf_library.streaming import (
+    CONTENT_TYPES,
+    get_file_format,
+    read_upload,
+    streaming_response,
+)
 
+from .cache import cached_catalog_response
+from .import_service import FIELDS, import_books
 from .models import Book
+from .search import search_books
 from .serializers import BookSerializer
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAdminUser]
 
+    @property
+    def throttle_scope(self):
+        params = self.request.query_params
+        if self.action in ("list", "filtered_list") and (
+            "search" in params or "title" in params
+        ):
+            return "book_search"
+        return None
+
     def get_queryset(self):
-        """Returns a list of all user profiles that match the specified username parameter, if provided"""
-        queryset = self.queryset
-        title = self.request.query_params.get("title")
+        """Returns books matching the search (or legacy title) parameter, best matches first"""
+        queryset = super().get_queryset()
+        query = self.request.query_params.get(
+            "search", self.request.query_params.get("title")
+        )
 
-        if title:
-            queryset = queryset.filter(title__icontains=title)
+        if query:
+            queryset = search_books(queryset, query)
 
-        return queryset.distinct()
+        return queryset
 
     @extend_schema(
         parameters=[
             OpenApiParameter(
-                "username",
+                "search",
                 type=OpenApiTypes.STR,
-                description="Filter by book title (ex. ?title=dicaprio)",
+                description="Search book titles and authors by word prefixes "
+                "(ex. ?search=harr pot)",
+            ),
+            OpenApiParameter(
+                "title",
+                type=OpenApiTypes.STR,
+                description="Alias of search kept for existing clients",
             ),
         ]
     )
@@ -37,6 +68,40 @@ class BookViewSet(viewsets.ModelViewSet):
         """Returns a list of all user profiles that match the 'username' parameter if it is specified"""
         return super().list(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        return cached_catalog_response(
+            request, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_catalog_response(
+            request, partial(super().retrieve, request, *args, **kwargs)
+        )
+
+    @action(detail=False, methods=["POST"], url_path="import")
+    def import_file(self, request):
+        """Create or update books from an uploaded CSV or NDJSON file, matched on id"""
+        lines, file_format = read_upload(request)
+        return Response(import_books(lines, file_format))
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "file_format",
+                type=OpenApiTypes.STR,
+                enum=sorted(CONTENT_TYPES),
+                description="csv (default) or ndjson",
+            ),
+        ]
+    )
+    @action(detail=False, methods=["GET"])
+    def export(self, request):
+        """Stream the whole catalog as CSV or NDJSON"""
+        file_format = get_file_format(request.query_params.get("file_format"))
+
+        rows = Book.objects.order_by("id").values_list(*FIELDS).iterator()
+        return streaming_response(rows, FIELDS, file_format, "books")
+
     def get_permissions(self):
         if self.action == "list":
             return [AllowAny()]
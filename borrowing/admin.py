@@ -1,5 +1,7 @@
 from django.contrib import admin
 
-from borrowing.models import Borrowing
+from borrowing.models import Borrowing, BorrowerSummary, ScanCheckpoint
 
 admin.site.register(Borrowing)
+admin.site.register(ScanCheckpoint)
+admin.site.register(BorrowerSummary)
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0003_alter_borrowing_actual_return_date_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScanCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("run_date", models.DateField()),
+                ("last_id", models.BigIntegerField(default=0)),
+                ("found", models.PositiveIntegerField(default=0)),
+                ("completed", models.BooleanField(default=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.0.4 on 2026-10-18 10:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+
+
+def fill_summaries(apps, schema_editor):
+    Borrowing = apps.get_model("borrowing", "Borrowing")
+    BorrowerSummary = apps.get_model("borrowing", "BorrowerSummary")
+    Payment = apps.get_model("payment", "Payment")
+
+    summaries = {}
+    active = (
+        Borrowing.objects.filter(actual_return_date__isnull=True)
+        .values("user_id")
+        .annotate(count=Count("id"))
+    )
+    for row in active:
+        summaries[row["user_id"]] = BorrowerSummary(
+            user_id=row["user_id"], active_borrowings=row["count"]
+        )
+    pending = (
+        Payment.objects.filter(status="Pending")
+        .values("borrowing__user_id")
+        .annotate(count=Count("id"), fines=Sum("money_to_pay", filter=Q(type="Fine")))
+    )
+    for row in pending:
+        summary = summaries.setdefault(
+            row["borrowing__user_id"],
+            BorrowerSummary(user_id=row["borrowing__user_id"]),
+        )
+        summary.pending_payments = row["count"]
+        summary.outstanding_fines = row["fines"] or 0
+
+    BorrowerSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0001_initial"),
+        ("borrowing", "0005_borrowing_borrowing_user_recent_idx_and_more"),
+        ("payment", "0004_payment_payment_borrowing_status_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BorrowerSummary",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("active_borrowings", models.PositiveIntegerField(default=0)),
+                ("pending_payments", models.PositiveIntegerField(default=0)),
+                (
+                    "outstanding_fines",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "borrower summaries",
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
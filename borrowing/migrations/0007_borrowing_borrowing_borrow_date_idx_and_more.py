@@ -0,0 +1,24 @@
+# Generated by Django 4.0.4 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrowing", "0006_borrowersummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["borrow_date"], name="borrowing_borrow_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["actual_return_date"], name="borrowing_returned_idx"
+            ),
+        ),
+    ]
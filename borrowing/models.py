@@ -1,11 +1,102 @@
-from datetime import datetime
-
 from django.db import models
+from django.db.models import (
+    Case,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
 
 from book.models import Book
 from user.models import User
 
 
+class DaysBetween(models.Func):
+    """Whole days from ``start`` to ``end`` (two date expressions), in SQL."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = models.IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, function="DATEDIFF", arg_joiner=", ", **extra_context
+        )
+
+
+class BorrowingQuerySet(models.QuerySet):
+    def with_prices(self):
+        """
+        Annotate ``annotated_total_price`` and ``annotated_fine_price`` so
+        that prices are computed by the database in the same query that
+        loads the rows, without fetching the book.
+        """
+        daily_fee = F("book__daily_fee")
+        price_field = models.DecimalField(max_digits=12, decimal_places=2)
+
+        return self.annotate(
+            annotated_total_price=ExpressionWrapper(
+                (DaysBetween("expected_return_date", "borrow_date") + 1) * daily_fee,
+                output_field=price_field,
+            ),
+            annotated_fine_price=Case(
+                When(actual_return_date__isnull=True, then=daily_fee),
+                default=ExpressionWrapper(
+                    DaysBetween("actual_return_date", "expected_return_date")
+                    * daily_fee
+                    * 2,
+                    output_field=price_field,
+                ),
+                output_field=price_field,
+            ),
+        )
+
+    def with_payment_totals(self):
+        """
+        Annotate ``paid_amount`` and ``pending_amount``, the sums of the
+        borrowing's payments by status. They are correlated subqueries
+        rather than a join with GROUP BY, so rows can still be streamed.
+        """
+        from payment.models import Payment
+
+        price_field = models.DecimalField(max_digits=12, decimal_places=2)
+
+        def total(status):
+            payments = (
+                Payment.objects.filter(borrowing=OuterRef("pk"), status=status)
+                .order_by()
+                .values("borrowing")
+                .annotate(total=Sum("money_to_pay"))
+                .values("total")
+            )
+            return Coalesce(
+                Subquery(payments, output_field=price_field),
+                Value(0),
+                output_field=price_field,
+            )
+
+        return self.annotate(
+            paid_amount=total(Payment.StatusChoices.PAID),
+            pending_amount=total(Payment.StatusChoices.PENDING),
+        )
+
+
 class Borrowing(models.Model):
     borrow_date = models.DateField(auto_now_add=True)
     expected_return_date = models.DateField()
@@ -13,33 +104,82 @@ class Borrowing(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="borrowings")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="borrowings")
 
+    objects = BorrowingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # A user's borrowings, newest first, as the API pages them
+            models.Index(
+                fields=["user", "-borrow_date", "-id"], name="borrowing_user_recent_idx"
+            ),
+            models.Index(
+                fields=["user", "-borrow_date", "-id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_user_active_idx",
+            ),
+            # The overdue scan only ever looks at borrowings still out
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_overdue_idx",
+            ),
+            # Date ranges read by the analytics rollups
+            models.Index(fields=["borrow_date"], name="borrowing_borrow_date_idx"),
+            models.Index(fields=["actual_return_date"], name="borrowing_returned_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.email}: {self.book.title}"
 
     @property
     def total_price(self):
-        borrow_date = datetime.strptime(str(self.borrow_date), "%Y-%m-%d").date()
-        expected_return_date = datetime.strptime(
-            str(self.expected_return_date), "%Y-%m-%d"
-        ).date()
-
-        if self.expected_return_date:
-            return (
-                    expected_return_date - borrow_date
-            ).days * self.book.daily_fee + self.book.daily_fee
+        if hasattr(self, "annotated_total_price"):
+            return self.annotated_total_price
 
-        return self.book.daily_fee
+        days = (self.expected_return_date - self.borrow_date).days
+        return days * self.book.daily_fee + self.book.daily_fee
 
     @property
     def fine_price(self):
+        if hasattr(self, "annotated_fine_price"):
+            return self.annotated_fine_price
+
         if self.actual_return_date:
-            actual_return_date = datetime.strptime(
-                str(self.actual_return_date), "%Y-%m-%d"
-            ).date()
-            expected_return_date = datetime.strptime(
-                str(self.expected_return_date), "%Y-%m-%d"
-            ).date()
-            return (
-                    self.book.daily_fee * (actual_return_date - expected_return_date).days
-            ) * 2
+            days = (self.actual_return_date - self.expected_return_date).days
+            return (self.book.daily_fee * days) * 2
         return self.book.daily_fee
+
+
+class ScanCheckpoint(models.Model):
+    """Where a long-running scan stopped, so that the next run can resume"""
+
+    name = models.CharField(max_length=100, unique=True)
+    run_date = models.DateField()
+    last_id = models.BigIntegerField(default=0)
+    found = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.name} ({self.run_date})"
+
+
+class BorrowerSummary(models.Model):
+    """
+    A user's open borrowings and unpaid payments, kept up to date by
+    borrowing.summary_service, so eligibility checks and account pages
+    read one row instead of aggregating the user's history.
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    active_borrowings = models.PositiveIntegerField(default=0)
+    pending_payments = models.PositiveIntegerField(default=0)
+    outstanding_fines = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "borrower summaries"
+
+    def __str__(self):
+        return f"Summary of {self.user_id}"
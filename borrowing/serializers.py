@@ -1,12 +1,39 @@
 from rest_framework import serializers
 
+from book.models import Book
 from book.serializers import BookSerializer
-from payment.models import Payment
 from payment.serializers import PaymentSerializer
-from .models import Borrowing
+from .models import Borrowing, BorrowerSummary
+from .summary_service import get_summary
+
+# Largest stack of books accepted by one bulk checkout or return
+BULK_LIMIT = 50
+
+
+class PrefetchedBookField(serializers.PrimaryKeyRelatedField):
+    """
+    Takes the book from the ``books`` dict in the serializer context when
+    there is one, so a list of borrowings costs one query for all books.
+    """
+
+    def to_internal_value(self, data):
+        books = self.context.get("books")
+        if books is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            book = books.get(int(data))
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if book is None:
+            self.fail("does_not_exist", pk_value=data)
+        return book
 
 
 class BorrowingSerializer(serializers.ModelSerializer):
+    book = PrefetchedBookField(queryset=Book.objects.all())
     payments = PaymentSerializer(many=True, read_only=True)
 
     class Meta:
@@ -22,23 +49,19 @@ class BorrowingSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ("id", "borrow_date", "actual_return_date", "user")
 
-        def validate(self, attrs):
-            user = self.context["request"].user
+    def validate(self, attrs):
+        user = self.context["request"].user
 
-            if Payment.objects.filter(
-                    borrowing__user=user, status=Payment.StatusChoices.PENDING
-            ).exists():
-                raise serializers.ValidationError(
-                    "You have pending payments. Cannot borrow a new book."
-                )
+        if get_summary(user).pending_payments:
+            raise serializers.ValidationError(
+                "You have pending payments. Cannot borrow a new book."
+            )
+        return attrs
 
-        @staticmethod
-        def validate_book(self, book):
-            if book.inventory == 0:
-                raise serializers.ValidationError(
-                    "Book is not available for borrowing."
-                )
-            return book
+    def validate_book(self, book):
+        if book.inventory == 0:
+            raise serializers.ValidationError("Book is not available for borrowing.")
+        return book
 
 
 class BorrowingListSerializer(BorrowingSerializer):
@@ -48,7 +71,7 @@ class BorrowingListSerializer(BorrowingSerializer):
 
 class BorrowingReturnSerializer(BorrowingSerializer):
     expected_return_date = serializers.ReadOnlyField()
-    book = serializers.ReadOnlyField()
+    book = serializers.PrimaryKeyRelatedField(read_only=True)
 
     def validate(self, attrs):
         borrowing = self.instance
@@ -57,3 +80,15 @@ class BorrowingReturnSerializer(BorrowingSerializer):
             raise serializers.ValidationError("Book has already been returned")
 
         return attrs
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BULK_LIMIT
+    )
+
+
+class BorrowerSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BorrowerSummary
+        fields = ("active_borrowings", "pending_payments", "outstanding_fines")
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from payment.models import Payment
+from .models import Borrowing
+from .summary_service import (
+    SummaryChanges,
+    apply_summary_deltas,
+    schedule_summary_refresh,
+)
+
+# New rows change the summary by a known amount. Changed and deleted rows
+# are recounted, since their previous state is not known here; code that
+# writes with update() or bulk_create() adjusts the summary itself.
+
+
+@receiver(post_save, sender=Borrowing)
+def update_summary_on_borrowing_save(sender, instance, created, **kwargs):
+    if not created:
+        schedule_summary_refresh([instance.user_id])
+    elif instance.actual_return_date is None:
+        apply_summary_deltas(instance.user_id, {"active_borrowings": 1})
+
+
+@receiver(post_delete, sender=Borrowing)
+def refresh_summary_on_borrowing_delete(sender, instance, **kwargs):
+    schedule_summary_refresh([instance.user_id])
+
+
+@receiver(post_save, sender=Payment)
+def update_summary_on_payment_save(sender, instance, created, **kwargs):
+    user_id = _user_id(instance)
+    if user_id is None:
+        return
+    if not created:
+        schedule_summary_refresh([user_id])
+    elif instance.status == Payment.StatusChoices.PENDING:
+        SummaryChanges().add_payment(user_id, instance).apply()
+
+
+@receiver(post_delete, sender=Payment)
+def refresh_summary_on_payment_delete(sender, instance, **kwargs):
+    user_id = _user_id(instance)
+    if user_id is not None:
+        schedule_summary_refresh([user_id])
+
+
+def _user_id(payment):
+    if Payment.borrowing.is_cached(payment):
+        return payment.borrowing.user_id
+    return (
+        Borrowing.objects.filter(pk=payment.borrowing_id)
+        .values_list("user_id", flat=True)
+        .first()
+    )
@@ -0,0 +1,148 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from payment.models import Payment
+from user.models import User
+from .models import Borrowing, BorrowerSummary
+
+SUMMARY_FIELDS = ("active_borrowings", "pending_payments", "outstanding_fines")
+
+
+class SummaryChanges:
+    """
+    Changes to several users' summaries, collected while writing and then
+    applied with one UPDATE per user:
+
+        changes = SummaryChanges()
+        for borrowing in borrowings:
+            changes.add(borrowing.user_id, active_borrowings=-1)
+        changes.apply()
+    """
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+
+    def add(self, user_id, **deltas):
+        for field, delta in deltas.items():
+            self.deltas[user_id][field] += delta
+        return self
+
+    def add_payment(self, user_id, payment, sign=1):
+        """Count a pending payment in, or with ``sign=-1`` out"""
+        fine = payment.money_to_pay if payment.type == Payment.TypeChoices.FINE else 0
+        return self.add(
+            user_id, pending_payments=sign, outstanding_fines=sign * Decimal(fine)
+        )
+
+    def apply(self):
+        for user_id in sorted(self.deltas):
+            apply_summary_deltas(user_id, self.deltas[user_id])
+
+
+def apply_summary_deltas(user_id, deltas):
+    """
+    Add ``deltas`` to the user's summary in the caller's transaction. The
+    F() update is atomic, so concurrent writers never lose a change; the
+    row is created on the user's first activity.
+    """
+    values = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not values:
+        return
+    if not BorrowerSummary.objects.filter(user_id=user_id).update(**values):
+        BorrowerSummary.objects.get_or_create(user_id=user_id)
+        BorrowerSummary.objects.filter(user_id=user_id).update(**values)
+
+
+def schedule_summary_refresh(user_ids):
+    """
+    Recount the summaries of ``user_ids`` once the current transaction
+    commits, for changes whose effect on the counts is not known, such as
+    a borrowing edited in the admin. Users scheduled several times in one
+    transaction are recounted once.
+    """
+    connection = transaction.get_connection()
+    pending = getattr(connection, "pending_summary_refresh", None)
+    # Still queued unless the transaction it belonged to has ended
+    if pending is not None and any(
+        func == pending.run for _, func in connection.run_on_commit
+    ):
+        pending.user_ids.update(user_ids)
+        return
+
+    pending = _PendingRefresh(user_ids)
+    connection.pending_summary_refresh = pending
+    transaction.on_commit(pending.run)
+
+
+class _PendingRefresh:
+    def __init__(self, user_ids):
+        self.user_ids = set(user_ids)
+
+    def run(self):
+        refresh_summaries(self.user_ids)
+
+
+def refresh_summaries(user_ids):
+    for user_id in sorted(user_ids):
+        refresh_summary(user_id)
+
+
+@transaction.atomic
+def refresh_summary(user_id):
+    """
+    Recount one user's summary from their open borrowings and pending
+    payments. The summary row is locked first, so the recount does not
+    interleave with other changes to it.
+    """
+    # The user may have been deleted since the refresh was scheduled
+    if not User.objects.filter(pk=user_id).exists():
+        return None
+
+    summary, _ = BorrowerSummary.objects.select_for_update().get_or_create(
+        user_id=user_id
+    )
+    counts = count_summaries([user_id]).get(user_id, {})
+    for field in SUMMARY_FIELDS:
+        setattr(summary, field, counts.get(field, 0))
+    summary.save()
+    return summary
+
+
+def count_summaries(user_ids):
+    """The summary values of ``user_ids``, counted from their history"""
+    counts = defaultdict(dict)
+
+    borrowings = (
+        Borrowing.objects.filter(user_id__in=user_ids, actual_return_date__isnull=True)
+        .values("user_id")
+        .annotate(count=Count("id"))
+    )
+    for row in borrowings:
+        counts[row["user_id"]]["active_borrowings"] = row["count"]
+
+    payments = (
+        Payment.objects.filter(
+            borrowing__user_id__in=user_ids, status=Payment.StatusChoices.PENDING
+        )
+        .values("borrowing__user_id")
+        .annotate(
+            count=Count("id"),
+            fines=Sum("money_to_pay", filter=Q(type=Payment.TypeChoices.FINE)),
+        )
+    )
+    for row in payments:
+        counts[row["borrowing__user_id"]]["pending_payments"] = row["count"]
+        counts[row["borrowing__user_id"]]["outstanding_fines"] = row["fines"] or 0
+
+    return counts
+
+
+def get_summary(user):
+    """The user's summary, or an empty unsaved one for users with no history"""
+    try:
+        return user.summary
+    except BorrowerSummary.DoesNotExist:
+        return BorrowerSummary(user=user)
@@ -1,26 +1,152 @@
+import time
 from datetime import date, timedelta
 
+from django.conf import settings
+from django.db import transaction
 from django_q.tasks import async_task
 
-from .models import Borrowing
-from .telegram_helper import send_telegram_message
+from notification.notification_service import send_telegram_message
+from scheduler.locks import task_lock
+from user.models import User
+from .models import Borrowing, BorrowerSummary, ScanCheckpoint
+from .summary_service import SUMMARY_FIELDS, count_summaries
 
+OVERDUE_SCAN = "check_overdue_borrowings"
+SUMMARY_REPAIR = "repair_borrower_summaries"
+CHUNK_SIZE = 500
+DIGEST_SIZE = 50
+# Stop early enough to save the checkpoint before the cluster kills the task
+TIME_BUDGET = settings.Q_CLUSTER["timeout"] * 0.8
 
-def check_overdue_borrowings():
-    tomorrow = date.today() + timedelta(days=1)
-    overdue_borrowings = Borrowing.objects.filter(
-        expected_return_date__lte=tomorrow, actual_return_date__isnull=True
+
+def check_overdue_borrowings(
+    chunk_size=CHUNK_SIZE, digest_size=DIGEST_SIZE, time_budget=TIME_BUDGET
+):
+    """
+    Report borrowings due by tomorrow in digest messages.
+
+    Rows are streamed in id order with the user's email and the book title
+    joined in, and the checkpoint is saved together with every digest. A
+    run that is about to hit the cluster timeout queues its own
+    continuation, which resumes after the last reported borrowing.
+
+    Only one scan runs at a time across all nodes; a scan started while
+    another one holds the lock returns None without doing anything.
+    """
+    with task_lock(OVERDUE_SCAN, ttl=settings.Q_CLUSTER["timeout"]) as acquired:
+        if not acquired:
+            return None
+        found, finished = _scan_overdue_borrowings(
+            chunk_size, digest_size, time.monotonic() + time_budget
+        )
+
+    # Queued only once the lock is released, so the continuation can take it
+    if not finished:
+        async_task("borrowing.tasks.check_overdue_borrowings")
+    return found
+
+
+def _scan_overdue_borrowings(chunk_size, digest_size, deadline):
+    today = date.today()
+
+    checkpoint, _ = ScanCheckpoint.objects.get_or_create(
+        name=OVERDUE_SCAN, defaults={"run_date": today}
     )
+    if checkpoint.run_date != today:
+        checkpoint.run_date = today
+        checkpoint.last_id = checkpoint.found = 0
+        checkpoint.completed = False
+    if checkpoint.completed:
+        return checkpoint.found, True
+
+    overdue_borrowings = (
+        Borrowing.objects.filter(
+            expected_return_date__lte=today + timedelta(days=1),
+            actual_return_date__isnull=True,
+            id__gt=checkpoint.last_id,
+        )
+        .order_by("id")
+        .values_list("id", "user__email", "book__title")
+    )
+
+    digest = []
+    for borrowing_id, user_email, book_title in overdue_borrowings.iterator(
+        chunk_size=chunk_size
+    ):
+        digest.append(f"User: {user_email}\nBook: {book_title}")
+        checkpoint.last_id = borrowing_id
+        checkpoint.found += 1
+
+        if len(digest) == digest_size:
+            _send_digest(digest, checkpoint)
+            digest = []
+            if time.monotonic() > deadline:
+                return checkpoint.found, False
+
+    checkpoint.completed = True
+    _send_digest(digest, checkpoint)
+    return checkpoint.found, True
+
+
+@transaction.atomic
+def _send_digest(digest, checkpoint):
+    if digest:
+        send_telegram_message("Borrowings overdue:\n\n" + "\n\n".join(digest))
+    elif checkpoint.completed and not checkpoint.found:
+        send_telegram_message("No borrowings overdue today!")
+
+    checkpoint.save()
+
+
+def repair_borrower_summaries(
+    chunk_size=CHUNK_SIZE, time_budget=TIME_BUDGET, after_id=0
+):
+    """
+    Recount every user's summary from their history and fix the rows that
+    drifted from it, e.g. after writes that bypassed summary_service. Users
+    are handled in id order, a chunk per transaction with their summary
+    rows locked; a run about to hit the cluster timeout queues its own
+    continuation after the last chunk. Returns the number of rows fixed,
+    or None when another run holds the lock.
+    """
+    deadline = time.monotonic() + time_budget
+    fixed = 0
+    with task_lock(SUMMARY_REPAIR, ttl=settings.Q_CLUSTER["timeout"]) as acquired:
+        if not acquired:
+            return None
+        while user_ids := list(
+            User.objects.filter(id__gt=after_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        ):
+            fixed += _repair_summaries(user_ids)
+            after_id = user_ids[-1]
+            if time.monotonic() > deadline:
+                break
+        else:
+            return fixed
+
+    async_task("borrowing.tasks.repair_borrower_summaries", after_id=after_id)
+    return fixed
+
 
-    if overdue_borrowings.exists():
-        for borrowing in overdue_borrowings:
-            user_email = borrowing.user.email
-            book_title = borrowing.book.title
-            message = f"Borrowing overdue:\nUser: {user_email}\nBook: {book_title}"
-            send_telegram_message(message)
-    else:
-        message = "No borrowings overdue today!"
-        send_telegram_message(message)
+@transaction.atomic
+def _repair_summaries(user_ids):
+    summaries = BorrowerSummary.objects.select_for_update().in_bulk(user_ids)
+    counts = count_summaries(user_ids)
 
+    changed, missing = [], []
+    for user_id in user_ids:
+        values = {field: counts[user_id].get(field, 0) for field in SUMMARY_FIELDS}
+        summary = summaries.get(user_id)
+        if summary is None:
+            if any(values.values()):
+                missing.append(BorrowerSummary(user_id=user_id, **values))
+        elif any(getattr(summary, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(summary, field, value)
+            changed.append(summary)
 
-async_task(check_overdue_borrowings)
+    BorrowerSummary.objects.bulk_update(changed, SUMMARY_FIELDS)
+    BorrowerSummary.objects.bulk_create(missing, ignore_conflicts=True)
+    return len(changed) + len(missing)
@@ -1,6 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db.models import Sum
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -37,3 +39,56 @@ class BorrowingTestCase(TestCase):
 
     def test_fine_price_property(self):
         self.assertEqual(self.borrowing.fine_price, 10.0)
+
+
+class BorrowingPriceAnnotationTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@user.com", "password")
+        self.book = Book.objects.create(title="Test Book", daily_fee=2.5, inventory=5)
+        today = date.today()
+        self.cases = [
+            (today + timedelta(days=4), None),
+            (today, None),
+            (today + timedelta(days=1), today + timedelta(days=6)),
+            (today + timedelta(days=3), today + timedelta(days=3)),
+        ]
+        for expected_return_date, actual_return_date in self.cases:
+            Borrowing.objects.create(
+                expected_return_date=expected_return_date,
+                actual_return_date=actual_return_date,
+                book=self.book,
+                user=self.user,
+            )
+
+    def test_annotated_prices_match_python_prices(self):
+        annotated = Borrowing.objects.with_prices().order_by("id")
+        plain = Borrowing.objects.select_related("book").order_by("id")
+
+        for with_prices, borrowing in zip(annotated, plain):
+            self.assertEqual(with_prices.total_price, borrowing.total_price)
+            self.assertEqual(with_prices.fine_price, borrowing.fine_price)
+
+    def test_annotated_prices_do_not_load_book(self):
+        with self.assertNumQueries(1):
+            prices = [
+                (borrowing.total_price, borrowing.fine_price)
+                for borrowing in Borrowing.objects.with_prices()
+            ]
+
+        self.assertEqual(
+            prices,
+            [
+                (Decimal("12.50"), Decimal("2.50")),
+                (Decimal("2.50"), Decimal("2.50")),
+                (Decimal("5.00"), Decimal("25.00")),
+                (Decimal("10.00"), Decimal("0.00")),
+            ],
+        )
+
+    def test_prices_can_be_aggregated(self):
+        totals = Borrowing.objects.with_prices().aggregate(
+            total=Sum("annotated_total_price"), fines=Sum("annotated_fine_price")
+        )
+
+        self.assertEqual(totals["total"], Decimal("30.00"))
+        self.assertEqual(totals["fines"], Decimal("30.00"))
@@ -0,0 +1,95 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+
+BORROWING_URL = reverse("borrowings:borrowing-list")
+
+User = get_user_model()
+
+
+def detail_url(borrowing_id):
+    return reverse("borrowings:borrowing-detail", args=[borrowing_id])
+
+
+class QueryCountMixin:
+    """
+    Fixed query budgets for the borrowing endpoints: one query for the
+    borrowings joined with their book and user, one for the prefetched
+    payments. The budget must hold whatever the number of rows.
+    """
+
+    LIST_QUERIES = 2
+    RETRIEVE_QUERIES = 2
+
+    def create_borrowings(self, count, payments_per_borrowing=2):
+        borrowings = []
+        for index in range(count):
+            book = Book.objects.create(
+                title=f"Book {index}", author="Author", daily_fee=1, inventory=5
+            )
+            borrowing = Borrowing.objects.create(
+                expected_return_date=date(2023, 1, 5), book=book, user=self.user
+            )
+            for _ in range(payments_per_borrowing):
+                Payment.objects.create(
+                    status=Payment.StatusChoices.PENDING,
+                    type=Payment.TypeChoices.PAYMENT,
+                    borrowing=borrowing,
+                    money_to_pay=1,
+                )
+            borrowings.append(borrowing)
+        return borrowings
+
+    def assertListQueries(self, rows):
+        self.create_borrowings(rows)
+
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(BORROWING_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), Borrowing.objects.count())
+        for borrowing in response.data["results"]:
+            self.assertEqual(len(borrowing["payments"]), 2)
+
+    def test_list_queries_single_row(self):
+        self.assertListQueries(1)
+
+    def test_list_queries_many_rows(self):
+        self.assertListQueries(10)
+
+    def test_retrieve_queries(self):
+        borrowing = self.create_borrowings(3)[1]
+
+        with self.assertNumQueries(self.RETRIEVE_QUERIES):
+            response = self.client.get(detail_url(borrowing.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["book"]["title"], borrowing.book.title)
+        self.assertEqual(response.data["user"], self.user.email)
+        self.assertEqual(len(response.data["payments"]), 2)
+
+
+class UserBorrowingQueryCountTestCase(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="user@example.com", password="password"
+        )
+        self.client.force_authenticate(self.user)
+
+
+class AdminBorrowingQueryCountTestCase(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_authenticate(self.user)
@@ -0,0 +1,110 @@
+import re
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrowing.models import Borrowing
+from borrowing.tasks import check_overdue_borrowings
+from payment.models import Payment
+
+User = get_user_model()
+
+HOT_TABLES = (Borrowing._meta.db_table, Payment._meta.db_table)
+
+
+class QueryPlanMixin:
+    """
+    Fails when a hot query reads a whole borrowing or payment table.
+
+    SQLite reports a full table or index walk as "SCAN <table>", Postgres
+    as "Seq Scan on <table>" once sequential scans are priced out.
+    """
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN " + sql)
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoTableScans(self, queries):
+        scan = re.compile(r"(SCAN|Seq Scan on) ({})\b".format("|".join(HOT_TABLES)))
+        checked = 0
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or not any(t in sql for t in HOT_TABLES):
+                continue
+            plan = self.explain(sql)
+            checked += 1
+            scans = [step for step in plan if scan.search(step)]
+            self.assertEqual(scans, [], f"{sql}\n" + "\n".join(plan))
+        self.assertTrue(checked, "no query on a hot table was captured")
+
+
+class HotQueryPlanTestCase(QueryPlanMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="user@example.com", password="pw")
+        self.client.force_authenticate(self.user)
+        book = Book.objects.create(
+            title="Book", author="Author", daily_fee=1, inventory=5
+        )
+        borrowing = Borrowing.objects.create(
+            expected_return_date=date.today() + timedelta(days=1),
+            book=book,
+            user=self.user,
+        )
+        Payment.objects.create(
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=borrowing,
+            money_to_pay=1,
+        )
+
+    def assertViewUsesIndexes(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+
+        self.assertNoTableScans(queries)
+
+    def test_user_borrowings(self):
+        self.assertViewUsesIndexes(reverse("borrowings:borrowing-list"))
+
+    def test_user_active_borrowings(self):
+        self.assertViewUsesIndexes(
+            reverse("borrowings:borrowing-list"), {"is_active": "true"}
+        )
+
+    def test_admin_borrowings_of_a_user(self):
+        admin = User.objects.create_superuser(email="admin@example.com", password="pw")
+        self.client.force_authenticate(admin)
+
+        self.assertViewUsesIndexes(
+            reverse("borrowings:borrowing-list"),
+            {"user_id": self.user.id, "is_active": "true"},
+        )
+
+    def test_user_payments(self):
+        self.assertViewUsesIndexes(reverse("payments:payment-list"))
+
+    def test_pending_payments_check(self):
+        with CaptureQueriesContext(connection) as queries:
+            Payment.objects.filter(
+                borrowing__user=self.user, status=Payment.StatusChoices.PENDING
+            ).exists()
+
+        self.assertNoTableScans(queries)
+
+    def test_overdue_scan(self):
+        with CaptureQueriesContext(connection) as queries:
+            check_overdue_borrowings()
+
+        self.assertNoTableScans(queries)
@@ -0,0 +1,229 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrowing.models import Borrowing, BorrowerSummary
+from borrowing.summary_service import schedule_summary_refresh
+from borrowing.tasks import repair_borrower_summaries
+from payment.webhooks import mark_session_paid
+from payment.models import Payment
+
+BORROWING_URL = reverse("borrowings:borrowing-list")
+SUMMARY_URL = reverse("borrowings:borrowing-summary")
+
+User = get_user_model()
+
+
+def return_url(borrowing_id):
+    return reverse("borrowings:borrowing-return-borrowing", args=[borrowing_id])
+
+
+@mock.patch("notification.notification_service.async_task", mock.Mock())
+@mock.patch("payment.payment_service.async_task", mock.Mock())
+class BorrowerSummaryTestCase(TestCase):
+    def setUp(self):
+        # Checkouts are throttled per user, and user ids repeat across tests
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="user@example.com", password="pw")
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(title="Book", daily_fee=2, inventory=5)
+
+    def borrow(self):
+        self.login()
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                BORROWING_URL,
+                {"book": self.book.id, "expected_return_date": str(date.today())},
+            )
+
+    def login(self):
+        # A fresh user per request, as authentication would load it
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+
+    def summary(self):
+        return BorrowerSummary.objects.get(user=self.user)
+
+    def test_borrowing_counts_as_active_with_a_pending_payment(self):
+        response = self.borrow()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        summary = self.summary()
+        self.assertEqual(summary.active_borrowings, 1)
+        self.assertEqual(summary.pending_payments, 1)
+        self.assertEqual(summary.outstanding_fines, 0)
+
+    def test_pending_payment_blocks_new_borrowings(self):
+        self.borrow()
+
+        self.login()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                BORROWING_URL,
+                {"book": self.book.id, "expected_return_date": str(date.today())},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # One summary row is read instead of the user's payment history
+        self.assertFalse(any("payment_payment" in q["sql"] for q in queries))
+        self.assertIn("pending payments", str(response.data))
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    def test_paid_payment_is_no_longer_pending(self):
+        self.borrow()
+        payment = Payment.objects.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.status = Payment.StatusChoices.PAID
+            payment.save()
+
+        self.assertEqual(self.summary().pending_payments, 0)
+        self.assertEqual(self.borrow().status_code, status.HTTP_201_CREATED)
+
+    def test_late_return_adds_an_outstanding_fine(self):
+        self.borrow()
+        borrowing = Borrowing.objects.get()
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            expected_return_date=date.today() - timedelta(days=3)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(return_url(borrowing.id))
+
+        summary = self.summary()
+        self.assertEqual(summary.active_borrowings, 0)
+        self.assertEqual(summary.pending_payments, 2)
+        self.assertEqual(summary.outstanding_fines, 12)
+
+    def test_summary_endpoint(self):
+        self.borrow()
+        self.login()
+
+        response = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(
+            response.data,
+            {
+                "active_borrowings": 1,
+                "pending_payments": 1,
+                "outstanding_fines": "0.00",
+            },
+        )
+
+    def test_summary_of_a_user_without_history(self):
+        response = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(response.data["active_borrowings"], 0)
+        self.assertFalse(BorrowerSummary.objects.exists())
+
+    def test_deleting_a_user_with_history(self):
+        self.borrow()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertFalse(BorrowerSummary.objects.exists())
+
+    def test_checkout_updates_the_summary_without_recounting(self):
+        self.login()
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(
+            connection
+        ) as queries:
+            self.client.post(
+                BORROWING_URL,
+                {"book": self.book.id, "expected_return_date": str(date.today())},
+            )
+
+        summary = self.summary()
+        self.assertEqual((summary.active_borrowings, summary.pending_payments), (1, 1))
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+        # Nothing is left to recount once the transaction commits
+        self.assertNotIn("_PendingRefresh", " ".join(map(repr, callbacks)))
+
+    def test_paid_session_is_counted_out(self):
+        self.borrow()
+        Payment.objects.update(session_id="cs_test")
+
+        mark_session_paid("cs_test")
+
+        self.assertEqual(self.summary().pending_payments, 0)
+
+    def test_bulk_return_counts_fines(self):
+        for _ in range(2):
+            self.borrow()
+            Payment.objects.update(status=Payment.StatusChoices.PAID)
+            BorrowerSummary.objects.update(pending_payments=0)
+        Borrowing.objects.update(expected_return_date=date.today() - timedelta(days=1))
+        self.login()
+
+        self.client.post(
+            reverse("borrowings:borrowing-bulk-return"),
+            {"ids": list(Borrowing.objects.values_list("id", flat=True))},
+            format="json",
+        )
+
+        summary = self.summary()
+        self.assertEqual(summary.active_borrowings, 0)
+        self.assertEqual(summary.pending_payments, 2)
+        self.assertEqual(summary.outstanding_fines, 8)
+
+    def test_refreshes_are_merged_per_transaction(self):
+        other = User.objects.create_user(email="other@example.com", password="pw")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            schedule_summary_refresh([self.user.id])
+            schedule_summary_refresh([self.user.id, other.id])
+
+        self.assertEqual(len(callbacks), 1)
+
+
+class RepairBorrowerSummariesTestCase(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title="Book", daily_fee=2, inventory=5)
+        self.users = [
+            User.objects.create_user(email=f"user{index}@example.com", password="pw")
+            for index in range(3)
+        ]
+        for user in self.users:
+            Borrowing.objects.create(
+                book=self.book, user=user, expected_return_date=date.today()
+            )
+
+    def test_drifted_and_missing_rows_are_fixed(self):
+        BorrowerSummary.objects.filter(user=self.users[0]).update(active_borrowings=5)
+        BorrowerSummary.objects.filter(user=self.users[1]).delete()
+
+        fixed = repair_borrower_summaries(chunk_size=2)
+
+        self.assertEqual(fixed, 2)
+        self.assertEqual(
+            list(
+                BorrowerSummary.objects.order_by("user_id").values_list(
+                    "active_borrowings", flat=True
+                )
+            ),
+            [1, 1, 1],
+        )
+
+    @mock.patch("borrowing.tasks.async_task")
+    def test_run_out_of_time_requeues_after_the_last_chunk(self, async_task):
+        BorrowerSummary.objects.update(active_borrowings=0)
+
+        fixed = repair_borrower_summaries(chunk_size=2, time_budget=-1)
+
+        self.assertEqual(fixed, 2)
+        async_task.assert_called_once_with(
+            "borrowing.tasks.repair_borrower_summaries", after_id=self.users[1].id
+        )
+        self.assertEqual(
+            BorrowerSummary.objects.get(user=self.users[2]).active_borrowings, 0
+        )
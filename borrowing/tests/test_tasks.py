@@ -0,0 +1,126 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from book.models import Book
+from borrowing.models import Borrowing, ScanCheckpoint
+from borrowing.tasks import OVERDUE_SCAN, check_overdue_borrowings
+from notification.models import TelegramMessage
+from scheduler.locks import task_lock
+
+User = get_user_model()
+
+
+class CheckOverdueBorrowingsTestCase(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title="Test Book", daily_fee=1, inventory=5)
+        self.users = [
+            User.objects.create_user(email=f"user{index}@example.com", password="pw")
+            for index in range(5)
+        ]
+
+    def create_borrowings(self, users, days=0, returned=False):
+        for user in users:
+            Borrowing.objects.create(
+                expected_return_date=date.today() + timedelta(days=days),
+                actual_return_date=date.today() if returned else None,
+                book=self.book,
+                user=user,
+            )
+
+    def messages(self):
+        return list(
+            TelegramMessage.objects.order_by("id").values_list("text", flat=True)
+        )
+
+    def test_overdue_borrowings_are_grouped_into_digests(self):
+        self.create_borrowings(self.users)
+        self.create_borrowings(self.users[:1], days=5)
+        self.create_borrowings(self.users[:1], returned=True)
+
+        found = check_overdue_borrowings(digest_size=2)
+
+        self.assertEqual(found, 5)
+        messages = self.messages()
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(all(m.startswith("Borrowings overdue:") for m in messages))
+        for user in self.users:
+            self.assertEqual(
+                sum(f"User: {user.email}\n" in message for message in messages), 1
+            )
+
+    def test_no_overdue_borrowings(self):
+        self.create_borrowings(self.users[:1], days=5)
+
+        self.assertEqual(check_overdue_borrowings(), 0)
+        self.assertEqual(self.messages(), ["No borrowings overdue today!"])
+
+    def test_rows_are_streamed_with_joined_fields(self):
+        check_overdue_borrowings()
+        restart = {"last_id": 0, "found": 0, "completed": False}
+
+        ScanCheckpoint.objects.update(**restart)
+        self.create_borrowings(self.users[:1])
+        with CaptureQueriesContext(connection) as one_row:
+            check_overdue_borrowings(digest_size=100)
+
+        ScanCheckpoint.objects.update(**restart)
+        self.create_borrowings(self.users)
+        with CaptureQueriesContext(connection) as many_rows:
+            check_overdue_borrowings(digest_size=100)
+
+        self.assertEqual(len(one_row), len(many_rows))
+
+    @mock.patch("borrowing.tasks.async_task")
+    def test_timed_out_run_resumes_from_checkpoint(self, async_task):
+        self.create_borrowings(self.users)
+
+        check_overdue_borrowings(digest_size=2, time_budget=0)
+
+        async_task.assert_called_once_with("borrowing.tasks.check_overdue_borrowings")
+        checkpoint = ScanCheckpoint.objects.get(name=OVERDUE_SCAN)
+        self.assertFalse(checkpoint.completed)
+        self.assertEqual(checkpoint.found, 2)
+        self.assertEqual(len(self.messages()), 1)
+
+        found = check_overdue_borrowings(digest_size=2)
+
+        self.assertEqual(found, 5)
+        checkpoint.refresh_from_db()
+        self.assertTrue(checkpoint.completed)
+        messages = "".join(self.messages())
+        for user in self.users:
+            self.assertEqual(messages.count(f"User: {user.email}\n"), 1)
+
+    def test_completed_scan_is_not_repeated_the_same_day(self):
+        self.create_borrowings(self.users)
+        check_overdue_borrowings()
+
+        check_overdue_borrowings()
+
+        self.assertEqual(len(self.messages()), 1)
+
+    def test_checkpoint_from_a_previous_day_is_reset(self):
+        self.create_borrowings(self.users)
+        ScanCheckpoint.objects.create(
+            name=OVERDUE_SCAN,
+            run_date=date.today() - timedelta(days=1),
+            last_id=Borrowing.objects.order_by("id").last().id,
+            found=3,
+            completed=True,
+        )
+
+        self.assertEqual(check_overdue_borrowings(), 5)
+
+    def test_scan_is_skipped_while_another_node_holds_the_lock(self):
+        self.create_borrowings(self.users)
+
+        with task_lock(OVERDUE_SCAN, ttl=60):
+            self.assertIsNone(check_overdue_borrowings())
+
+        self.assertEqual(self.messages(), [])
+        self.assertEqual(check_overdue_borrowings(), 5)
@@ -1,19 +1,38 @@
-from datetime import date
+import json
+from base64 import b64encode
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
 
 from book.models import Book
-from borrowing.models import Borrowing
+from borrowing.models import Borrowing, BorrowerSummary
+from borrowing.serializers import BULK_LIMIT
 from borrowing.views import BorrowingViewSet
+from notification.models import TelegramMessage
+from payment.models import Payment
+
+BORROWING_URL = reverse("borrowings:borrowing-list")
+BULK_URL = reverse("borrowings:borrowing-bulk")
+BULK_RETURN_URL = reverse("borrowings:borrowing-bulk-return")
+EXPORT_URL = reverse("borrowings:borrowing-export")
 
 User = get_user_model()
 
 
 class BorrowingViewSetTestCase(TestCase):
     def setUp(self):
+        # Checkouts are throttled per user, and user ids repeat across tests
+        cache.clear()
         self.factory = APIRequestFactory()
         self.user = User.objects.create_user(
             email="testuser@example.com", password="testpassword"
@@ -40,6 +59,21 @@ class BorrowingViewSetTestCase(TestCase):
         self.assertEqual(Borrowing.objects.count(), 2)
         self.assertEqual(Borrowing.objects.last().user, self.user)
 
+    def test_create_borrowing_out_of_stock(self):
+        self.book.inventory = 0
+        self.book.save()
+        data = {"expected_return_date": "2023-01-05", "book": self.book.id}
+        request = self.factory.post("/api/borrowings/", data)
+        force_authenticate(request, user=self.user)
+
+        view = BorrowingViewSet.as_view({"post": "create"})
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
     def test_list_borrowings(self):
         url = "/api/borrowings/"
         request = self.factory.get(url)
@@ -49,7 +83,7 @@ class BorrowingViewSetTestCase(TestCase):
         response = view(request)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
 
     def test_return_borrowing(self):
         url = f"/api/borrowings/{self.borrowing.id}/return/"
@@ -84,3 +118,299 @@ class BorrowingViewSetTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.book.refresh_from_db()
         self.assertEqual(self.book.inventory, 5)
+
+
+class BulkBorrowingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@example.com", password="testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.books = [
+            Book.objects.create(title=f"Book {index}", daily_fee=2, inventory=2)
+            for index in range(3)
+        ]
+
+    def checkout(self, books):
+        # A fresh user per request, as authentication would load it
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        payload = [
+            {"book": book.id, "expected_return_date": str(date.today())}
+            for book in books
+        ]
+        return self.client.post(BULK_URL, payload, format="json")
+
+    @mock.patch("notification.notification_service.async_task", mock.Mock())
+    @mock.patch("payment.payment_service.async_task")
+    def test_bulk_checkout(self, async_task):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.checkout(self.books + self.books[:1])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(
+            [book.inventory for book in Book.objects.order_by("id")], [0, 1, 1]
+        )
+        payments = Payment.objects.order_by("id")
+        self.assertEqual(len(payments), 4)
+        self.assertTrue(all(p.money_to_pay == 2 for p in payments))
+        async_task.assert_called_once()
+        self.assertEqual(async_task.call_args.args[1], [p.id for p in payments])
+        self.assertEqual(TelegramMessage.objects.count(), 1)
+
+    def test_bulk_checkout_queries_do_not_grow_with_books(self):
+        BorrowerSummary.objects.create(user=self.user)
+        with CaptureQueriesContext(connection) as one_book:
+            self.checkout(self.books[:1])
+        # Let the user check out again despite the pending payment
+        BorrowerSummary.objects.update(pending_payments=0)
+        with CaptureQueriesContext(connection) as three_books:
+            self.checkout(self.books)
+
+        # Each extra book costs its reservation UPDATE; books are fetched,
+        # and borrowings, payments and the message inserted, all at once
+        self.assertEqual(len(three_books), len(one_book) + 2)
+
+    def test_bulk_checkout_limit_is_checked_before_validation(self):
+        items = [{"book": 0, "expected_return_date": "2030-01-01"}] * (BULK_LIMIT + 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(BULK_URL, items, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Only the savepoint of the view's transaction
+        self.assertFalse(
+            [query for query in queries if query["sql"].startswith("SELECT")]
+        )
+
+    def test_bulk_checkout_rejects_a_non_list(self):
+        response = self.client.post(BULK_URL, {"book": self.books[0].id}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_checkout_reports_unknown_books(self):
+        response = self.client.post(
+            BULK_URL,
+            [
+                {"book": self.books[0].id, "expected_return_date": "2030-01-01"},
+                {"book": 999999, "expected_return_date": "2030-01-01"},
+                {"book": "x", "expected_return_date": "2030-01-01"},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("book", response.data[1])
+        self.assertIn("book", response.data[2])
+
+    def test_bulk_checkout_is_all_or_nothing(self):
+        response = self.checkout(self.books + self.books[:1] * 2)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["books"], [self.books[0].id])
+        self.assertFalse(Borrowing.objects.exists())
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(
+            [book.inventory for book in Book.objects.order_by("id")], [2, 2, 2]
+        )
+
+    def test_bulk_return(self):
+        self.checkout(self.books)
+        late = Borrowing.objects.get(book=self.books[0])
+        late.expected_return_date = date.today() - timedelta(days=2)
+        late.save()
+
+        response = self.client.post(
+            BULK_RETURN_URL,
+            {"ids": list(Borrowing.objects.values_list("id", flat=True))},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Borrowing.objects.filter(actual_return_date=None).exists())
+        self.assertEqual(
+            [book.inventory for book in Book.objects.order_by("id")], [2, 2, 2]
+        )
+        fine = Payment.objects.get(type=Payment.TypeChoices.FINE)
+        self.assertEqual(fine.borrowing, late)
+        self.assertEqual(fine.money_to_pay, 8)
+
+    def test_bulk_return_rejects_returned_and_foreign_borrowings(self):
+        self.checkout(self.books[:2])
+        returned, out = Borrowing.objects.order_by("id")
+        Borrowing.objects.filter(pk=returned.pk).update(actual_return_date=date.today())
+        other_user = User.objects.create_user(email="other@example.com", password="pw")
+        foreign = Borrowing.objects.create(
+            expected_return_date=date.today(), book=self.books[2], user=other_user
+        )
+
+        response = self.client.post(
+            BULK_RETURN_URL, {"ids": [returned.id, out.id, foreign.id]}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["borrowings"], [returned.id, foreign.id])
+        self.assertIsNone(Borrowing.objects.get(pk=out.pk).actual_return_date)
+
+
+class BorrowingExportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(title="Test Book", daily_fee=2, inventory=50)
+
+    def create_borrowings(self, count):
+        for _ in range(count):
+            borrowing = Borrowing.objects.create(
+                expected_return_date=date(2023, 1, 5), book=self.book, user=self.user
+            )
+            Borrowing.objects.filter(pk=borrowing.pk).update(
+                borrow_date=date(2023, 1, 1), actual_return_date=date(2023, 1, 8)
+            )
+            for payment_status, amount in [("Paid", 10), ("Pending", 12)]:
+                Payment.objects.create(
+                    status=payment_status,
+                    type=Payment.TypeChoices.PAYMENT,
+                    borrowing=borrowing,
+                    money_to_pay=amount,
+                )
+
+    def export(self, **params):
+        response = self.client.get(EXPORT_URL, {"file_format": "ndjson", **params})
+        self.assertTrue(response.streaming)
+        return [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+
+    def test_prices_and_payment_totals_are_computed_in_sql(self):
+        self.create_borrowings(1)
+
+        with self.assertNumQueries(1):
+            [row] = self.export()
+
+        self.assertEqual(row["book"], "Test Book")
+        self.assertEqual(row["user"], self.user.email)
+        prices = ["total_price", "fine_price", "paid", "pending"]
+        self.assertEqual([Decimal(row[price]) for price in prices], [10, 12, 10, 12])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.create_borrowings(20)
+
+        with self.assertNumQueries(1):
+            rows = self.export()
+
+        self.assertEqual(len(rows), 20)
+        self.assertEqual([row["id"] for row in rows], sorted(row["id"] for row in rows))
+
+    def test_export_uses_list_filters(self):
+        self.create_borrowings(2)
+        Borrowing.objects.create(
+            expected_return_date=date(2023, 1, 5), book=self.book, user=self.user
+        )
+
+        rows = self.export(is_active="true")
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(Decimal(rows[0]["paid"]), 0)
+
+    def test_csv_export(self):
+        self.create_borrowings(1)
+
+        response = self.client.get(EXPORT_URL)
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0].split(",")[:3], ["id", "borrow_date", "expected_return_date"]
+        )
+        self.assertEqual(len(lines), 2)
+
+
+class BorrowingPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_superuser(
+            email="admin@example.com", password="adminpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(title="Test Book", daily_fee=10.0, inventory=5)
+        # borrow_date is auto_now_add, so every row shares the same date and
+        # the pages can only be told apart by the id tiebreaker.
+        self.borrowings = [
+            Borrowing.objects.create(
+                expected_return_date=date(2023, 1, 1) + timedelta(days=index % 3),
+                actual_return_date=date(2023, 1, 2) if index % 2 else None,
+                book=self.book,
+                user=self.user,
+            )
+            for index in range(7)
+        ]
+
+    def walk(self, url, direction="next"):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            page = [borrowing["id"] for borrowing in response.data["results"]]
+            ids = ids + page if direction == "next" else page + ids
+            url = response.data[direction]
+        return ids
+
+    def test_default_ordering_pages_through_every_row_once(self):
+        ids = self.walk(f"{BORROWING_URL}?page_size=3")
+
+        expected = [borrowing.id for borrowing in reversed(self.borrowings)]
+        self.assertEqual(ids, expected)
+
+    def test_previous_links_return_the_same_rows(self):
+        url = f"{BORROWING_URL}?page_size=3"
+        while url:
+            response = self.client.get(url)
+            last_page_url, url = url, response.data["next"]
+
+        last_page = self.client.get(last_page_url)
+        ids = self.walk(last_page.data["previous"], direction="previous")
+        ids += [borrowing["id"] for borrowing in last_page.data["results"]]
+
+        self.assertEqual(ids, [borrowing.id for borrowing in reversed(self.borrowings)])
+
+    def test_ordering_filter_fields_are_paginated(self):
+        orderings = {
+            "expected_return_date": ("expected_return_date", "id"),
+            "-actual_return_date": (
+                F("actual_return_date").desc(nulls_last=True),
+                "-id",
+            ),
+        }
+        for ordering, order_by in orderings.items():
+            ids = self.walk(f"{BORROWING_URL}?page_size=3&ordering={ordering}")
+
+            expected = Borrowing.objects.order_by(*order_by).values_list(
+                "id", flat=True
+            )
+            self.assertEqual(ids, list(expected))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f"{BORROWING_URL}?cursor=bm90LWpzb24=")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_malformed_values(self):
+        cursors = [
+            {"v": ["2023-01-01", "abc"]},
+            {"v": ["not a date", 1]},
+            {"v": ["2023-01-01", {"id": 1}]},
+        ]
+        for tokens in cursors:
+            cursor = b64encode(json.dumps(tokens).encode()).decode()
+
+            response = self.client.get(BORROWING_URL, {"cursor": cursor})
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,7 +1,9 @@
 import os
+from collections import Counter
 
 import stripe
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
@@ -11,24 +13,50 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from book.inventory_service import release_copies, reserve_copies
+from book.models import Book
+from drf_library.pagination import BorrowingPagination
+from drf_library.routers import ReplicaReadMixin
+from drf_library.streaming import CONTENT_TYPES, get_file_format, streaming_response
+from notification.notification_service import send_telegram_message
 from payment.models import Payment
-from payment.payment_service import create_stripe_session
+from payment.payment_service import create_stripe_session, create_stripe_sessions
 from .models import Borrowing
 from .permissions import IsOwnerOrAdmin
 from .serializers import (
+    BULK_LIMIT,
     BorrowingSerializer,
     BorrowingListSerializer,
     BorrowingReturnSerializer,
+    BorrowingBulkReturnSerializer,
+    BorrowerSummarySerializer,
 )
-from .telegram_helper import send_telegram_message
+from .summary_service import SummaryChanges, apply_summary_deltas, get_summary
 
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 
 
-class BorrowingViewSet(viewsets.ModelViewSet):
+EXPORT_CHUNK_SIZE = 2000
+# Export column name -> lookup; prices and payment totals come from SQL
+EXPORT_COLUMNS = {
+    "id": "id",
+    "borrow_date": "borrow_date",
+    "expected_return_date": "expected_return_date",
+    "actual_return_date": "actual_return_date",
+    "book": "book__title",
+    "user": "user__email",
+    "total_price": "annotated_total_price",
+    "fine_price": "annotated_fine_price",
+    "paid": "paid_amount",
+    "pending": "pending_amount",
+}
+
+
+class BorrowingViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Borrowing.objects.select_related("book", "user")
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = BorrowingPagination
     filter_backends = [filters.OrderingFilter, filters.SearchFilter]
     search_fields = ["user__email", "book__title"]  # Add additional fields for search
     ordering_fields = [
@@ -37,26 +65,52 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         "actual_return_date",
     ]  # Add additional fields for ordering
 
+    @property
+    def throttle_scope(self):
+        # Both open Stripe checkout sessions
+        if self.action in ("create", "bulk"):
+            return "checkout"
+        return None
+
     def get_queryset(self):
         user = self.request.user
         is_active = self.request.query_params.get("is_active", None)
         user_id = self.request.query_params.get("user_id", None)
 
         if user.is_superuser:
-            borrowings = Borrowing.objects.all()
+            borrowings = self.get_action_queryset()
             if is_active is not None and is_active.lower() == "true":
                 borrowings = borrowings.filter(actual_return_date__isnull=True)
             if user_id is not None:
                 borrowings = borrowings.filter(user_id=user_id)
             return borrowings
         elif user.is_authenticated:
-            borrowings = Borrowing.objects.filter(user=user)
+            borrowings = self.get_action_queryset().filter(user=user)
             if is_active is not None and is_active.lower() == "true":
                 borrowings = borrowings.filter(actual_return_date__isnull=True)
             return borrowings
         else:
             return Borrowing.objects.none()
 
+    def get_bulk_response_data(self, borrowings):
+        borrowings = Borrowing.objects.filter(
+            pk__in=[borrowing.pk for borrowing in borrowings]
+        ).prefetch_related(
+            Prefetch("payments", queryset=Payment.objects.order_by("id"))
+        )
+        return BorrowingSerializer(borrowings.order_by("id"), many=True).data
+
+    def get_action_queryset(self):
+        """Join or prefetch exactly the relations the action's serializer reads"""
+        if self.action in ["list", "retrieve"]:
+            # BorrowingListSerializer nests the book, the user's email and
+            # every payment of the borrowing.
+            return self.queryset.prefetch_related(
+                Prefetch("payments", queryset=Payment.objects.order_by("id"))
+            )
+
+        return self.queryset
+
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:
             return [IsOwnerOrAdmin()]
@@ -66,9 +120,12 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         if self.action in ["list", "retrieve"]:
             return BorrowingListSerializer
 
-        if self.action == "book_return":
+        if self.action == "return_borrowing":
             return BorrowingReturnSerializer
 
+        if self.action == "bulk_return":
+            return BorrowingBulkReturnSerializer
+
         return BorrowingSerializer
 
     @transaction.atomic
@@ -78,21 +135,23 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         book = serializer.validated_data["book"]
         user = request.user
 
+        if not reserve_copies(book.id):
+            return Response(
+                {"detail": "Book is not available for borrowing."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         borrowing = Borrowing.objects.create(
-            expected_return_date=serializer.data["expected_return_date"],
+            expected_return_date=serializer.validated_data["expected_return_date"],
             book=book,
             user=user,
         )
 
+        # The payment starts out pending; its checkout session_url is filled
+        # in by a background task and can be polled through the payments API.
         create_stripe_session(request, borrowing)
-        if book.inventory == 0:
-            return Response(
-                {"detail": "Book is not available for borrowing."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        book.inventory -= 1
-        book.save()
 
+        serializer = self.get_serializer(borrowing)
         headers = self.get_success_headers(serializer.data)
         message = f"New borrowing created:\nUser: {user.email}\nBook: {book.title}"
         send_telegram_message(message)
@@ -124,25 +183,26 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
     @action(methods=["POST"], detail=True, url_path="return")
+    @transaction.atomic
     def return_borrowing(self, request, pk=None):
         borrowing = self.get_object()
         serializer = self.get_serializer(instance=borrowing, data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        # Check if borrowing is already returned
-        if borrowing.actual_return_date is not None:
+        # Mark as returned only if nobody else did it in the meantime
+        return_date = timezone.now().date()
+        returned = Borrowing.objects.filter(
+            pk=borrowing.pk, actual_return_date__isnull=True
+        ).update(actual_return_date=return_date)
+        if not returned:
             return Response(
                 {"detail": "Borrowing has already been returned."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        borrowing.actual_return_date = timezone.now().date()
-        borrowing.save()
+        borrowing.actual_return_date = return_date
 
         # Increase book inventory by 1
-        book = serializer.validated_data["book"]
-        book.inventory += 1
-        book.save()
+        release_copies(borrowing.book_id)
 
         serializer = self.get_serializer(borrowing)
         if borrowing.actual_return_date > borrowing.expected_return_date:
@@ -154,5 +214,164 @@ class BorrowingViewSet(viewsets.ModelViewSet):
                 borrowing=borrowing,
                 money_to_pay=fine_amount,
             )
+        # The fine payment is counted by its post_save signal
+        apply_summary_deltas(borrowing.user_id, {"active_borrowings": -1})
 
         return Response(serializer.data)
+
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    @transaction.atomic
+    def bulk(self, request):
+        """
+        Borrow a stack of books at once. Takes a list of borrowings, reserves
+        every copy, and charges for all of them in one checkout session.
+        Nothing is borrowed unless every book is available.
+        """
+        # Checked before validation, which looks at every item
+        if not isinstance(request.data, list) or not (
+            0 < len(request.data) <= BULK_LIMIT
+        ):
+            return Response(
+                {"detail": f"Send a list of 1 to {BULK_LIMIT} borrowings."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        book_ids = set()
+        for item in request.data:
+            try:
+                book_ids.add(int(item["book"]))
+            except (TypeError, ValueError, KeyError):
+                pass
+        serializer = self.get_serializer(
+            data=request.data,
+            many=True,
+            context={
+                **self.get_serializer_context(),
+                "books": Book.objects.in_bulk(book_ids),
+            },
+        )
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+
+        copies = Counter(item["book"].id for item in serializer.validated_data)
+        # Reserve in id order so that concurrent bulk checkouts cannot deadlock
+        unavailable = [
+            book_id
+            for book_id in sorted(copies)
+            if not reserve_copies(book_id, copies[book_id])
+        ]
+        if unavailable:
+            transaction.set_rollback(True)
+            return Response(
+                {
+                    "detail": "Books are not available for borrowing.",
+                    "books": unavailable,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                expected_return_date=item["expected_return_date"],
+                book=item["book"],
+                user=user,
+            )
+            for item in serializer.validated_data
+        )
+        apply_summary_deltas(user.id, {"active_borrowings": len(borrowings)})
+        create_stripe_sessions(request, borrowings)
+
+        titles = "\n".join(f"Book: {b.book.title}" for b in borrowings)
+        send_telegram_message(f"New borrowings created:\nUser: {user.email}\n{titles}")
+
+        return Response(
+            self.get_bulk_response_data(borrowings), status=status.HTTP_201_CREATED
+        )
+
+    @action(methods=["POST"], detail=False, url_path="bulk-return")
+    @transaction.atomic
+    def bulk_return(self, request):
+        """
+        Return a stack of borrowings at once. Nothing is returned unless every
+        borrowing is still out; late ones get their fine payments.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data["ids"])
+
+        borrowings = list(
+            self.get_queryset()
+            .select_for_update(of=("self",))
+            .filter(pk__in=ids, actual_return_date__isnull=True)
+            .order_by("id")
+        )
+        missing = ids - {borrowing.pk for borrowing in borrowings}
+        if missing:
+            return Response(
+                {
+                    "detail": "Borrowings are not out or do not exist.",
+                    "borrowings": sorted(missing),
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return_date = timezone.now().date()
+        Borrowing.objects.filter(pk__in=ids).update(actual_return_date=return_date)
+        for borrowing in borrowings:
+            borrowing.actual_return_date = return_date
+
+        copies = Counter(borrowing.book_id for borrowing in borrowings)
+        for book_id in sorted(copies):
+            release_copies(book_id, copies[book_id])
+
+        fines = Payment.objects.bulk_create(
+            Payment(
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.FINE,
+                borrowing=borrowing,
+                money_to_pay=borrowing.fine_price,
+            )
+            for borrowing in borrowings
+            if borrowing.actual_return_date > borrowing.expected_return_date
+        )
+        changes = SummaryChanges()
+        for borrowing in borrowings:
+            changes.add(borrowing.user_id, active_borrowings=-1)
+        for fine in fines:
+            changes.add_payment(fine.borrowing.user_id, fine)
+        changes.apply()
+
+        return Response(self.get_bulk_response_data(borrowings))
+
+    @action(methods=["GET"], detail=False)
+    def summary(self, request):
+        """The user's open borrowings, pending payments and outstanding fines"""
+        return Response(BorrowerSummarySerializer(get_summary(request.user)).data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="file_format",
+                description="csv (default) or ndjson",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=sorted(CONTENT_TYPES),
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False)
+    def export(self, request):
+        """
+        Stream the borrowings visible to the user, with prices and payment
+        totals, as CSV or NDJSON. Takes the same filters as the list.
+        """
+        file_format = get_file_format(request.query_params.get("file_format"))
+        rows = (
+            self.get_queryset()
+            .with_prices()
+            .with_payment_totals()
+            .order_by("id")
+            .values_list(*EXPORT_COLUMNS.values())
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        return streaming_response(rows, list(EXPORT_COLUMNS), file_format, "borrowings")
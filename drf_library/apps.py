@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.core.signals import request_started
+
+
+class DrfLibraryConfig(AppConfig):
+    name = "drf_library"
+
+    def ready(self):
+        from .routers import check_connection_health
+
+        request_started.connect(check_connection_health)
@@ -0,0 +1,55 @@
+"""Build the DATABASES setting from the environment"""
+import os
+
+# Seconds a connection is kept open between requests; 0 closes it after each
+CONN_MAX_AGE = 60
+CONNECT_TIMEOUT = 5
+
+
+def get_databases(base_dir, environ=os.environ):
+    """
+    Return the DATABASES setting.
+
+    Without POSTGRES_DB the project runs on the local sqlite file. With it,
+    connections go to Postgres and are kept open for DB_CONN_MAX_AGE
+    seconds, and every host in the comma separated POSTGRES_REPLICA_HOSTS
+    becomes a ``replica_<n>`` alias with the primary's credentials.
+    """
+    if not environ.get("POSTGRES_DB"):
+        return {
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": base_dir / "db.sqlite3",
+            }
+        }
+
+    primary = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": environ["POSTGRES_DB"],
+        "USER": environ.get("POSTGRES_USER", ""),
+        "PASSWORD": environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": environ.get("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": int(environ.get("DB_CONN_MAX_AGE", CONN_MAX_AGE)),
+        # Checked by drf_library.routers.check_connection_health on first
+        # use in each request; Django 4.0 has no built-in health checks
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "connect_timeout": int(environ.get("DB_CONNECT_TIMEOUT", CONNECT_TIMEOUT))
+        },
+    }
+    databases = {"default": primary}
+
+    replica_hosts = environ.get("POSTGRES_REPLICA_HOSTS", "")
+    for number, host in enumerate(filter(None, replica_hosts.split(",")), 1):
+        databases[f"replica_{number}"] = {
+            **primary,
+            "HOST": host.strip(),
+            # Tests read the primary's test database through the alias
+            "TEST": {"MIRROR": "default"},
+        }
+    return databases
+
+
+def get_replicas(databases):
+    return [alias for alias in databases if alias != "default"]
@@ -0,0 +1,224 @@
+import json
+import operator
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+Cursor = namedtuple("Cursor", ["values", "reverse"])
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the whole ordering key.
+
+    DRF's CursorPagination only remembers the first ordering field and
+    falls back to an OFFSET for rows sharing that value, which degrades
+    badly on low-cardinality keys such as dates. Here the cursor stores
+    the value of every ordering field (plus a unique tiebreaker), so each
+    page is a single ``WHERE (key) > (cursor) ORDER BY key LIMIT n`` range
+    scan and page 10 000 costs the same as page one.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    tiebreaker = "id"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.key = self._get_key(queryset.model, self.ordering)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        queryset = queryset.order_by(*self._get_order_by(reverse))
+        if self.cursor is not None:
+            queryset = queryset.filter(self._seek(self.cursor.values, reverse))
+
+        # Fetch one extra row to find out whether another page follows.
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Use the ordering requested through the view's OrderingFilter (or the
+        paginator default) and append the tiebreaker, so the key is unique.
+        """
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if hasattr(backend, "get_ordering"):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        ordering = ordering or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+
+        assert all("__" not in field for field in ordering), (
+            "Keyset pagination does not support double underscore lookups "
+            "for orderings."
+        )
+
+        if self.tiebreaker not in [field.lstrip("-") for field in ordering]:
+            direction = "-" if ordering[0].startswith("-") else ""
+            ordering += (direction + self.tiebreaker,)
+        return ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = json.loads(b64decode(encoded.encode("ascii")).decode("utf-8"))
+            values = tokens["v"]
+            reverse = bool(tokens.get("r", False))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor minted for another ordering cannot be applied to this one.
+        if not isinstance(values, list) or len(values) != len(self.key):
+            raise NotFound(self.invalid_cursor_message)
+
+        # The values come from the client, so they are checked like any
+        # other input before reaching the filters.
+        try:
+            values = [
+                self._get_field(self.model, name).to_python(value)
+                for (name, _, _), value in zip(self.key, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(values=values, reverse=reverse)
+
+    def encode_cursor(self, cursor):
+        tokens = {"v": cursor.values}
+        if cursor.reverse:
+            tokens["r"] = 1
+
+        encoded = b64encode(json.dumps(tokens, default=str).encode("utf-8"))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii")
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        if self.page:
+            values = self._get_values_from_instance(self.page[-1])
+        else:
+            values = self.cursor.values
+        return self.encode_cursor(Cursor(values=values, reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        if self.page:
+            values = self._get_values_from_instance(self.page[0])
+        else:
+            values = self.cursor.values
+        return self.encode_cursor(Cursor(values=values, reverse=True))
+
+    @staticmethod
+    def _get_field(model, name):
+        return model._meta.pk if name == "pk" else model._meta.get_field(name)
+
+    @classmethod
+    def _get_key(cls, model, ordering):
+        key = []
+        for field in ordering:
+            name = field.lstrip("-")
+            model_field = cls._get_field(model, name)
+            key.append((name, field.startswith("-"), model_field.null))
+        return key
+
+    def _get_order_by(self, reverse):
+        """
+        Nullable fields get an explicit NULLS FIRST/LAST so that the ordering
+        is identical on every backend and mirrors exactly when reversed.
+        """
+        order_by = []
+        for name, descending, nullable in self.key:
+            descending = descending != reverse
+            if nullable:
+                expression = (
+                    F(name).desc(nulls_last=True)
+                    if descending
+                    else F(name).asc(nulls_first=True)
+                )
+            else:
+                expression = f"-{name}" if descending else name
+            order_by.append(expression)
+        return order_by
+
+    def _seek(self, values, reverse):
+        """
+        Build the lexicographic "strictly after the cursor" condition:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        """
+        clauses = []
+        prefix = Q()
+        for (name, descending, nullable), value in zip(self.key, values):
+            after = self._after(name, value, descending != reverse, nullable)
+            if after is not None:
+                clauses.append(prefix & after)
+            prefix &= (
+                Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+            )
+
+        if not clauses:
+            return Q(pk__in=[])
+        return reduce(operator.or_, clauses)
+
+    @staticmethod
+    def _after(name, value, descending, nullable):
+        if value is None:
+            # NULLs sort first ascending and last descending.
+            return None if descending else Q(**{f"{name}__isnull": False})
+
+        after = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+        if nullable and descending:
+            after |= Q(**{f"{name}__isnull": True})
+        return after
+
+    def _get_values_from_instance(self, instance):
+        if isinstance(instance, dict):
+            return [instance[name] for name, _, _ in self.key]
+        return [getattr(instance, name) for name, _, _ in self.key]
+
+
+class BorrowingPagination(KeysetCursorPagination):
+    ordering = ("-borrow_date", "-id")
+
+
+class PaymentPagination(KeysetCursorPagination):
+    ordering = ("-id",)
@@ -0,0 +1,207 @@
+"""Send read-only requests to the database replicas"""
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Reads routed by this process, keyed by "replica:<alias>" or
+# "primary:<reason>"; served by DatabaseRoutingView
+routing_decisions = Counter()
+
+# alias -> (lag in seconds, time.monotonic() when it was measured)
+_replica_lag = {}
+
+_routing = ContextVar("db_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self, replica):
+        # Whether reads may go to a replica at all
+        self.replica = replica
+        # The user wrote in one of their last requests
+        self.pinned = False
+        # Something was written since the state was set up
+        self.wrote = False
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Route the queries made inside the block to a replica, if there is one.
+    Once the block writes anything, its later reads go to the primary so
+    they see the write; ``state.wrote`` tells whether that happened.
+    """
+    state = RoutingState(enabled)
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+def pin_to_primary(user):
+    """Serve the user's reads from the primary until replicas caught up"""
+    if user.is_authenticated:
+        cache.set(f"db:pin:{user.pk}", True, settings.REPLICA_ROUTING["PIN_SECONDS"])
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(cache.get(f"db:pin:{user.pk}"))
+
+
+def measure_lag(alias):
+    """Seconds the replica is behind the primary"""
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0.0
+    with connection.cursor() as cursor:
+        # An idle primary sends nothing to replay, which is not lag
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+            "THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM "
+            "now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_lag(alias):
+    """
+    The replica's lag, measured at most every LAG_CHECK_INTERVAL seconds
+    per process. A replica that cannot be asked counts as infinitely
+    behind, so reads fall back to the primary while it is down.
+    """
+    now = time.monotonic()
+    lag, measured_at = _replica_lag.get(alias, (None, None))
+    if (
+        lag is None
+        or now - measured_at >= settings.REPLICA_ROUTING["LAG_CHECK_INTERVAL"]
+    ):
+        try:
+            lag = measure_lag(alias)
+        except DatabaseError as error:
+            logger.warning("Could not measure the lag of %s: %s", alias, error)
+            lag = float("inf")
+        _replica_lag[alias] = lag, now
+    return lag
+
+
+class ReplicaRouter:
+    """
+    Writes and migrations always go to the primary. Reads go to a random
+    replica inside ``replica_reads()``, unless:
+
+    - the user wrote within the last PIN_SECONDS, or earlier in the block,
+      and must read their own writes;
+    - the primary is in the middle of a transaction the replicas cannot
+      see yet;
+    - every replica is more than MAX_LAG seconds behind.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        replicas = settings.DATABASE_REPLICAS
+        if state is None or not state.replica or not replicas:
+            return DEFAULT_DB_ALIAS
+
+        if state.pinned:
+            return self._primary("pinned")
+        if state.wrote:
+            return self._primary("wrote")
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return self._primary("transaction")
+
+        max_lag = settings.REPLICA_ROUTING["MAX_LAG"]
+        fresh = [alias for alias in replicas if replica_lag(alias) <= max_lag]
+        if not fresh:
+            return self._primary("lagging")
+
+        alias = random.choice(fresh)
+        routing_decisions[f"replica:{alias}"] += 1
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def _primary(reason):
+        routing_decisions[f"primary:{reason}"] += 1
+        return DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    Serve the viewset's read-only actions from the replicas. A user whose
+    request wrote to the database is pinned to the primary for a while, so
+    their next reads do not miss the change on a lagging replica.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        with replica_reads(action in self.replica_actions) as state:
+            self.routing_state = state
+            response = super().dispatch(request, *args, **kwargs)
+
+        if state.wrote:
+            pin_to_primary(self.request.user)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Only known once the request is authenticated
+        if self.routing_state.replica and is_pinned(request.user):
+            self.routing_state.pinned = True
+
+
+def check_connection_health(**kwargs):
+    """
+    Check persistent connections again in the new request, like Django
+    4.1's CONN_HEALTH_CHECKS: a connection that stopped working while idle,
+    e.g. after a database restart or a failover, is closed on its first
+    use in the request, so the query opens a fresh one instead of failing.
+    Connections the request does not use are never checked.
+    """
+    for connection in connections.all():
+        if connection.settings_dict.get("CONN_HEALTH_CHECKS"):
+            _install_health_check(connection)
+            connection.health_check_done = False
+
+
+def _install_health_check(connection):
+    if getattr(connection, "health_check_installed", False):
+        return
+    ensure_connection = connection.ensure_connection
+
+    def ensure_healthy_connection():
+        if not connection.health_check_done:
+            connection.health_check_done = True
+            if (
+                connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()
+            ):
+                connection.close()
+        ensure_connection()
+
+    # Every cursor goes through ensure_connection()
+    connection.ensure_connection = ensure_healthy_connection
+    connection.health_check_installed = True
@@ -16,6 +16,8 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+from drf_library.databases import get_databases, get_replicas
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,9 +31,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ["SECRET_KEY"]
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv("DEBUG", "True") == "True"
 
-ALLOWED_HOSTS = []
+# Comma separated; required once DEBUG is off
+ALLOWED_HOSTS = [
+    host.strip() for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host.strip()
+]
 
 
 # Application definition
@@ -53,11 +58,14 @@ INSTALLED_APPS = [
     "borrowing",
     "payment",
     "user",
+    "notification",
+    "scheduler",
+    "analytics",
+    "drf_library",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -66,6 +74,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+if DEBUG:
+    # The toolbar middleware is sync-only, so with it Django runs async
+    # views in a thread; keep it out of production
+    MIDDLEWARE.insert(1, "debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "drf_library.urls"
 
 TEMPLATES = [
@@ -85,16 +98,24 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "drf_library.wsgi.application"
+ASGI_APPLICATION = "drf_library.asgi.application"
 
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+DATABASES = get_databases(BASE_DIR)
+
+# Read-only list/retrieve requests are spread over these aliases
+DATABASE_REPLICAS = get_replicas(DATABASES)
+DATABASE_ROUTERS = ["drf_library.routers.ReplicaRouter"]
+
+# Reads fall back to the primary while every replica is more than MAX_LAG
+# seconds behind; users who wrote read from the primary for PIN_SECONDS
+REPLICA_ROUTING = {
+    "MAX_LAG": float(os.getenv("REPLICA_MAX_LAG", 2)),
+    "LAG_CHECK_INTERVAL": 5.0,
+    "PIN_SECONDS": int(os.getenv("REPLICA_PIN_SECONDS", 10)),
 }
 
 
@@ -118,6 +139,37 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = "user.User"
 
+# New passwords are hashed with PASSWORD_HASHER; passwords hashed with
+# another algorithm or cost are rehashed on the user's next login.
+# "argon2" needs the argon2-cffi package.
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "scrypt")
+_PASSWORD_HASHERS = {
+    "scrypt": "user.hashers.TunedScryptPasswordHasher",
+    "argon2": "user.hashers.TunedArgon2PasswordHasher",
+    "pbkdf2": "user.hashers.TunedPBKDF2PasswordHasher",
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+
+PASSWORD_HASHING = {
+    # 2**14 needs 16 MiB and about 50 ms per hash
+    "SCRYPT": {
+        "WORK_FACTOR": int(os.getenv("SCRYPT_WORK_FACTOR", 2**14)),
+        "BLOCK_SIZE": 8,
+        "PARALLELISM": 1,
+    },
+    # memory_cost is in KiB
+    "ARGON2": {
+        "TIME_COST": int(os.getenv("ARGON2_TIME_COST", 2)),
+        "MEMORY_COST": int(os.getenv("ARGON2_MEMORY_COST", 65536)),
+        "PARALLELISM": 1,
+    },
+    "PBKDF2": {"ITERATIONS": int(os.getenv("PBKDF2_ITERATIONS", 320000))},
+    # Processes hashing passwords of bulk imports
+    "WORKERS": int(os.getenv("PASSWORD_HASHING_WORKERS", os.cpu_count() or 1)),
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
@@ -145,13 +197,24 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # Counted in the cache, so with REDIS_URL the limits hold across processes
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "drf_library.throttling.AnonSlidingWindowThrottle",
+        "drf_library.throttling.UserSlidingWindowThrottle",
+        "drf_library.throttling.ScopedSlidingWindowThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "1000/day", "user": "1000/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "1000/day",
+        "user": "1000/day",
+        # Searches with ?search= or ?title=
+        "book_search": "60/min",
+        # Requests that open Stripe checkout sessions
+        "checkout": "10/min",
+        # Checkout redirects and the Stripe webhook
+        "payment_callback": "120/min",
+    },
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
 }
@@ -175,8 +238,46 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60 * 60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.TokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "user.serializers.TokenVerifySerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "user.serializers.LogoutSerializer",
+}
+
+# Bloom filter that answers most blacklist checks without a query; it is
+# rebuilt from the table every REBUILD_INTERVAL seconds
+TOKEN_BLACKLIST_FILTER = {
+    "CAPACITY": 1_000_000,
+    "ERROR_RATE": 0.001,
+    "REBUILD_INTERVAL": 60 * 60,
+}
+
+# Users resolved from access tokens are kept in a per-process LRU for
+# LOCAL_TTL seconds and in the shared cache for SHARED_TTL seconds; changes
+# reach other processes within LOCAL_TTL
+AUTH_USER_CACHE = {
+    "LOCAL_SIZE": 10000,
+    "LOCAL_TTL": 5,
+    "SHARED_TTL": 300,
 }
 
+# Share the cache through Redis in production; without REDIS_URL every
+# process keeps its own in-memory cache.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 Q_CLUSTER = {
     "name": "DRF library borrowing service",
     "workers": 8,
@@ -193,3 +294,27 @@ Q_CLUSTER = {
         "db": 0,
     },
 }
+
+# Dotted path of the function that opens checkout sessions; point it at
+# "payment.payment_service.local_checkout_session" to work without Stripe.
+PAYMENT_CHECKOUT_BACKEND = os.getenv(
+    "PAYMENT_CHECKOUT_BACKEND", "payment.payment_service.stripe_checkout_session"
+)
+
+# Signing secret of the Stripe webhook endpoint, used to verify its events
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+
+TELEGRAM = {
+    "BOT_TOKEN": os.getenv("TELEGRAM_BOT_TOKEN"),
+    "CHAT_ID": os.getenv("TELEGRAM_CHAT_ID"),
+    "API_URL": "https://api.telegram.org",
+    # Telegram allows about one message per second in a single chat
+    "MIN_INTERVAL": 1.0,
+    # A send gives up within TelegramClient.max_send_duration, about 40s
+    # with these values, so it always fits in the cluster's task timeout
+    "MAX_RETRIES": 3,
+    "BACKOFF": 1.0,
+    "TIMEOUT": 5,
+    # Longer waits asked for by a 429 are left to the next flush
+    "MAX_RETRY_AFTER": 5,
+}
@@ -0,0 +1,115 @@
+"""Read and write record streams as CSV or NDJSON without holding them in memory"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+
+# Only the first errors of an import are kept, so a broken file cannot
+# exhaust memory
+MAX_ERRORS = 100
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def get_file_format(value, default="csv"):
+    """Validate a requested format, answering 400 for unknown ones"""
+    file_format = value or default
+    if file_format not in CONTENT_TYPES:
+        raise ValidationError(
+            {"file_format": [f"Use one of {', '.join(CONTENT_TYPES)}."]}
+        )
+    return file_format
+
+
+def detect_format(filename, default="csv"):
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    if extension == "csv":
+        return "csv"
+    return default
+
+
+def read_upload(request):
+    """
+    The uploaded "file" of a request as a lazily decoded text stream,
+    together with its format: the "file_format" field, or else the one of
+    the file's extension. Answers 400 when no file was submitted.
+    """
+    upload = request.FILES.get("file")
+    if upload is None:
+        raise ValidationError({"file": ["No file was submitted."]})
+    file_format = get_file_format(
+        request.data.get("file_format"), default=detect_format(upload.name)
+    )
+    return io.TextIOWrapper(upload.file, encoding="utf-8", newline=""), file_format
+
+
+def read_records(lines, file_format):
+    """
+    Yield one dict per record of a text stream, together with its line
+    number. Lines are read lazily, so files of any size can be passed.
+    NDJSON lines that do not hold a JSON object yield None.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+    elif file_format == "ndjson":
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class _Echo:
+    """A file-like object that hands back what csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def render_records(rows, fields, file_format):
+    """
+    Yield the text of ``rows`` (tuples ordered like ``fields``) as CSV with
+    a header line, or as one JSON object per line.
+    """
+    if file_format == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+    elif file_format == "ndjson":
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(dict(zip(fields, row))) + "\n"
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+
+def streaming_response(rows, fields, file_format, filename):
+    response = StreamingHttpResponse(
+        render_records(rows, fields, file_format),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{file_format}"'
+    return response
@@ -0,0 +1,63 @@
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.models import Book
+from drf_library.asgi import application
+from user.models import User
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # As the test client does, so the request keeps the test transaction
+        request_started.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        self.admin = User.objects.create_superuser("admin@test.com", "password")
+        for title in ("Dune", "Emma"):
+            Book.objects.create(title=title, cover="SOFT", inventory=1, daily_fee=1)
+
+    def get(self, path):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"testserver"),
+                (
+                    b"authorization",
+                    f"Bearer {AccessToken.for_user(self.admin)}".encode(),
+                ),
+            ],
+            "client": ("127.0.0.1", 1234),
+            "server": ("testserver", 80),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(application)(scope, receive, send)
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        return messages[0]["status"], body.decode()
+
+    def test_export_streams_every_row(self):
+        status, body = self.get(reverse("books:book-export"))
+
+        self.assertEqual(status, 200)
+        lines = body.splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "title"])
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], ["Dune", "Emma"])
@@ -0,0 +1,294 @@
+import os
+import tempfile
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from analytics.models import DailyRevenue
+from book.models import Book
+from borrowing.models import Borrowing
+from drf_library.databases import get_databases, get_replicas
+from drf_library import routers
+from drf_library.routers import (
+    ReplicaRouter,
+    is_pinned,
+    replica_reads,
+    routing_decisions,
+)
+from payment.models import Payment
+from user.models import User
+
+REPLICA = "replica_1"
+
+
+class GetDatabasesTests(SimpleTestCase):
+    def test_sqlite_without_postgres(self):
+        databases = get_databases(Path("/srv"), environ={})
+
+        self.assertEqual(databases["default"]["ENGINE"], "django.db.backends.sqlite3")
+        self.assertEqual(get_replicas(databases), [])
+
+    def test_postgres_with_replicas(self):
+        databases = get_databases(
+            Path("/srv"),
+            environ={
+                "POSTGRES_DB": "library",
+                "POSTGRES_HOST": "primary",
+                "POSTGRES_REPLICA_HOSTS": "replica-a, replica-b",
+                "DB_CONN_MAX_AGE": "300",
+            },
+        )
+
+        self.assertEqual(get_replicas(databases), ["replica_1", "replica_2"])
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 300)
+        self.assertTrue(databases["default"]["CONN_HEALTH_CHECKS"])
+        self.assertEqual(databases["replica_1"]["HOST"], "replica-a")
+        self.assertEqual(databases["replica_2"]["NAME"], "library")
+        self.assertEqual(databases["replica_2"]["TEST"], {"MIRROR": "default"})
+
+
+class FakeConnection:
+    def __init__(self, usable, health_checks=True):
+        self.connection = object()
+        self.settings_dict = {"CONN_HEALTH_CHECKS": health_checks}
+        self.in_atomic_block = False
+        self.is_usable = mock.Mock(return_value=usable)
+        self.close = mock.Mock()
+        self.ensured = 0
+
+    def ensure_connection(self):
+        self.ensured += 1
+
+
+class ConnectionHealthTests(SimpleTestCase):
+    def start_request(self, *connections):
+        with mock.patch("drf_library.routers.connections") as handler:
+            handler.all.return_value = connections
+            request_started.send(sender=self.__class__)
+
+    def test_starting_a_request_does_not_query(self):
+        connection = FakeConnection(True)
+
+        self.start_request(connection)
+
+        connection.is_usable.assert_not_called()
+
+    def test_broken_connection_is_closed_on_first_use(self):
+        broken, healthy = FakeConnection(False), FakeConnection(True)
+        self.start_request(broken, healthy)
+
+        for connection in [broken, healthy, broken, healthy]:
+            connection.ensure_connection()
+
+        broken.close.assert_called_once_with()
+        healthy.close.assert_not_called()
+        self.assertEqual(broken.is_usable.call_count, 1)
+        self.assertEqual(healthy.is_usable.call_count, 1)
+        self.assertEqual(broken.ensured, 2)
+
+    def test_checked_again_in_the_next_request(self):
+        connection = FakeConnection(True)
+
+        for _ in range(2):
+            self.start_request(connection)
+            connection.ensure_connection()
+
+        self.assertEqual(connection.is_usable.call_count, 2)
+
+    def test_not_checked_inside_a_transaction(self):
+        connection = FakeConnection(False)
+        self.start_request(connection)
+        connection.in_atomic_block = True
+
+        connection.ensure_connection()
+
+        connection.is_usable.assert_not_called()
+        connection.close.assert_not_called()
+
+    def test_checks_can_be_disabled(self):
+        connection = FakeConnection(False, health_checks=False)
+        self.start_request(connection)
+
+        connection.ensure_connection()
+
+        connection.is_usable.assert_not_called()
+        connection.close.assert_not_called()
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    """A second sqlite database stands in for a replica"""
+
+    def setUp(self):
+        cache.clear()
+        routing_decisions.clear()
+        routers._replica_lag.clear()
+        self.add_replica()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com", password="pw"
+        )
+        self.client.force_authenticate(self.admin)
+
+    def add_replica(self):
+        replica_dir = tempfile.TemporaryDirectory()
+        connections.settings[REPLICA] = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict,
+            "NAME": os.path.join(replica_dir.name, "replica.sqlite3"),
+        }
+        with connections[REPLICA].schema_editor() as editor:
+            for model in [User, Book, Borrowing, Payment, DailyRevenue]:
+                editor.create_model(model)
+
+        def remove_replica():
+            connections[REPLICA].close()
+            del connections[REPLICA]
+            del connections.settings[REPLICA]
+            replica_dir.cleanup()
+
+        self.addCleanup(remove_replica)
+
+    def replicate(self, *objects):
+        for obj in objects:
+            obj.save(using=REPLICA, force_insert=True)
+
+    def borrowing_ids(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse("borrowings:borrowing-list"))
+        return [item["id"] for item in response.data["results"]]
+
+    def test_book_reads_are_served_by_the_replica(self):
+        book = Book.objects.create(title="Replicated", daily_fee=1, inventory=1)
+        self.replicate(book)
+        Book.objects.create(title="Not replicated yet", daily_fee=1, inventory=1)
+
+        response = self.client.get(reverse("books:book-list"))
+        self.assertEqual([book["title"] for book in response.data], ["Replicated"])
+
+        response = self.client.get(reverse("books:book-detail", args=[book.pk]))
+        self.assertEqual(response.data["title"], "Replicated")
+
+    def test_writes_go_to_the_primary(self):
+        response = self.client.post(
+            reverse("books:book-list"),
+            {
+                "title": "New",
+                "author": "Author",
+                "cover": "HARD",
+                "inventory": 1,
+                "daily_fee": 1,
+            },
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Book.objects.using(DEFAULT_DB_ALIAS).filter(title="New"))
+        self.assertFalse(Book.objects.using(REPLICA).filter(title="New"))
+
+    def test_borrowing_reads_are_served_by_the_replica(self):
+        book = Book.objects.create(title="Book", daily_fee=1, inventory=1)
+        borrowing = Borrowing.objects.create(
+            expected_return_date=date.today(), book=book, user=self.admin
+        )
+        self.replicate(self.admin, book, borrowing)
+        Borrowing.objects.create(
+            expected_return_date=date.today(), book=book, user=self.admin
+        )
+
+        self.assertEqual(self.borrowing_ids(self.admin), [borrowing.pk])
+        self.assertEqual(set(routing_decisions), {"replica:replica_1"})
+
+    def test_transactions_read_from_the_primary(self):
+        router = ReplicaRouter()
+
+        self.assertEqual(router.db_for_read(Book), DEFAULT_DB_ALIAS)
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Book), REPLICA)
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Book), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(Book), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate(REPLICA, "book"))
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        router = ReplicaRouter()
+
+        with replica_reads() as state:
+            Book.objects.create(title="Book", daily_fee=1, inventory=1)
+
+            self.assertTrue(state.wrote)
+            self.assertEqual(router.db_for_read(Book), DEFAULT_DB_ALIAS)
+        self.assertEqual(routing_decisions["primary:wrote"], 1)
+
+    def test_writers_are_pinned_to_the_primary(self):
+        other_admin = User.objects.create_superuser(
+            email="other@example.com", password="pw"
+        )
+        book = Book.objects.create(title="Book", daily_fee=1, inventory=1)
+        borrowing = Borrowing.objects.create(
+            expected_return_date=date.today(), book=book, user=self.admin
+        )
+
+        self.client.patch(
+            reverse("books:book-detail", args=[book.pk]), {"inventory": 2}
+        )
+
+        self.assertTrue(is_pinned(self.admin))
+        self.assertEqual(self.borrowing_ids(self.admin), [borrowing.pk])
+        self.assertEqual(self.borrowing_ids(other_admin), [])
+        self.assertTrue(routing_decisions["primary:pinned"])
+
+        cache.clear()
+        self.assertEqual(self.borrowing_ids(self.admin), [])
+
+    @mock.patch("drf_library.routers.measure_lag", return_value=30.0)
+    def test_lagging_replicas_are_skipped(self, measure_lag):
+        book = Book.objects.create(title="Book", daily_fee=1, inventory=1)
+        borrowing = Borrowing.objects.create(
+            expected_return_date=date.today(), book=book, user=self.admin
+        )
+
+        self.assertEqual(self.borrowing_ids(self.admin), [borrowing.pk])
+        self.assertEqual(self.borrowing_ids(self.admin), [borrowing.pk])
+
+        # The lag is measured once per LAG_CHECK_INTERVAL
+        measure_lag.assert_called_once_with(REPLICA)
+        self.assertTrue(routing_decisions["primary:lagging"])
+        self.assertFalse(routing_decisions["replica:replica_1"])
+
+    @mock.patch("drf_library.routers.measure_lag", side_effect=DatabaseError)
+    def test_unreachable_replicas_are_skipped(self, measure_lag):
+        DailyRevenue.objects.create(date=date.today(), payments=1, revenue=10)
+
+        response = self.client.get(reverse("analytics:report-revenue"))
+
+        self.assertEqual(len(response.data), 1)
+        response = self.client.get(reverse("db-routing"))
+        self.assertEqual(response.data["replica_lag"], {REPLICA: None})
+
+    def test_reports_are_served_by_the_replica(self):
+        DailyRevenue(date=date.today(), payments=1, revenue=10).save(using=REPLICA)
+
+        response = self.client.get(reverse("analytics:report-revenue"))
+
+        self.assertEqual(response.data[0]["payments"], 1)
+        self.assertFalse(DailyRevenue.objects.exists())
+
+    def test_routing_metrics(self):
+        self.client.get(reverse("books:book-list"))
+
+        response = self.client.get(reverse("db-routing"))
+
+        self.assertEqual(response.data["decisions"], {"replica:replica_1": 1})
+        self.assertEqual(response.data["replica_lag"], {REPLICA: 0.0})
+
+        self.client.force_authenticate(
+            User.objects.create_user(email="user@example.com", password="pw")
+        )
+        response = self.client.get(reverse("db-routing"))
+        self.assertEqual(response.status_code, 403)
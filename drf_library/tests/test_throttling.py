@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from borrowing.views import BorrowingViewSet
+from drf_library.throttling import (
+    ScopedSlidingWindowThrottle,
+    SlidingWindowThrottle,
+    hit,
+)
+from payment.views import PaymentViewSet, StripeWebhookView
+
+BOOK_URL = reverse("books:book-list")
+
+
+class ScopedView(APIView):
+    throttle_classes = [ScopedSlidingWindowThrottle]
+    throttle_scope = "test"
+
+    def get(self, request):
+        return Response()
+
+
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 30.0
+        timer = mock.patch.object(
+            SlidingWindowThrottle, "timer", side_effect=lambda: self.now
+        )
+        timer.start()
+        self.addCleanup(timer.stop)
+        rates = mock.patch.dict(
+            ScopedSlidingWindowThrottle.THROTTLE_RATES, test="4/min"
+        )
+        rates.start()
+        self.addCleanup(rates.stop)
+
+    def request(self, at):
+        self.now = at
+        request = APIRequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+        return ScopedView.as_view()(request).status_code
+
+    def test_limit_within_a_window(self):
+        codes = [self.request(at=30 + second) for second in range(5)]
+
+        self.assertEqual(codes[:4], [status.HTTP_200_OK] * 4)
+        self.assertEqual(codes[4], status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_previous_window_weighs_by_its_overlap(self):
+        for _ in range(4):
+            self.request(at=30)
+
+        # 3/4 of the previous window overlaps: 4 * 0.75 + 1
+        self.assertEqual(self.request(at=75), status.HTTP_200_OK)
+        # 4 * 0.75 + 2
+        self.assertEqual(self.request(at=75), status.HTTP_429_TOO_MANY_REQUESTS)
+        # Nothing of the previous window is left
+        self.assertEqual(self.request(at=120), status.HTTP_200_OK)
+
+    def test_retry_after(self):
+        for _ in range(4):
+            self.request(at=30)
+        self.request(at=75)
+
+        self.now = 75
+        response = ScopedView.as_view()(
+            APIRequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # 2 + 4 * overlap <= 4 once the overlap is down to 1/2, at 90
+        self.assertEqual(response["Retry-After"], "15")
+
+    def test_clients_are_counted_separately(self):
+        for _ in range(4):
+            self.request(at=30)
+
+        self.now = 30
+        request = APIRequestFactory().get("/", REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(ScopedView.as_view()(request).status_code, status.HTTP_200_OK)
+
+    def test_each_window_is_one_counter(self):
+        for _ in range(3):
+            self.request(at=30)
+
+        self.assertEqual(cache.get("throttle_test_10.0.0.1:0"), 3)
+
+
+class ThrottleScopeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_book_search_has_its_own_limit(self):
+        with mock.patch.dict(
+            ScopedSlidingWindowThrottle.THROTTLE_RATES, book_search="2/min"
+        ):
+            codes = [
+                self.client.get(BOOK_URL, {"search": "dune"}).status_code
+                for _ in range(3)
+            ]
+            plain = self.client.get(BOOK_URL)
+
+        self.assertEqual(
+            codes,
+            [
+                status.HTTP_200_OK,
+                status.HTTP_200_OK,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            ],
+        )
+        self.assertEqual(plain.status_code, status.HTTP_200_OK)
+
+    def test_checkout_scope(self):
+        self.assertEqual(BorrowingViewSet(action="create").throttle_scope, "checkout")
+        self.assertEqual(BorrowingViewSet(action="bulk").throttle_scope, "checkout")
+        self.assertIsNone(BorrowingViewSet(action="list").throttle_scope)
+
+    def test_payment_callback_scopes(self):
+        self.assertEqual(
+            PaymentViewSet(action="payment_success").throttle_scope,
+            "payment_callback",
+        )
+        self.assertIsNone(PaymentViewSet(action="list").throttle_scope)
+        self.assertEqual(StripeWebhookView.throttle_scope, "payment_callback")
+
+    @override_settings(STRIPE_WEBHOOK_SECRET="whsec_test_secret")
+    def test_stripe_webhook_is_not_held_to_the_anon_limit(self):
+        rates = {"anon": "2/min", "payment_callback": "3/min"}
+        with mock.patch.dict(ScopedSlidingWindowThrottle.THROTTLE_RATES, rates):
+            codes = [
+                self.client.post(
+                    reverse("payments:stripe_webhook"),
+                    b"{}",
+                    content_type="application/json",
+                    HTTP_STRIPE_SIGNATURE="t=1,v1=invalid",
+                ).status_code
+                for _ in range(4)
+            ]
+
+        # Rejected for the signature, until the webhook's own limit is hit
+        self.assertEqual(
+            codes,
+            [status.HTTP_400_BAD_REQUEST] * 3 + [status.HTTP_429_TOO_MANY_REQUESTS],
+        )
+
+
+class RedisHitTests(SimpleTestCase):
+    def setUp(self):
+        if not settings.REDIS_URL:
+            self.skipTest("needs REDIS_URL")
+        self.cache = RedisCache(settings.REDIS_URL, {"KEY_PREFIX": "test-throttle"})
+        self.addCleanup(self.cache.delete_many, ["hits:1", "hits:0"])
+
+    def test_concurrent_hits_are_not_lost(self):
+        self.cache.set("hits:0", 7)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    lambda _: hit(self.cache, "hits:1", "hits:0", 120), range(50)
+                )
+            )
+
+        self.assertEqual(sorted(current for current, _ in results), list(range(1, 51)))
+        self.assertEqual({previous for _, previous in results}, {7})
+        self.assertEqual(self.cache.get("hits:1"), 50)
@@ -0,0 +1,107 @@
+"""Rate limits shared by every process through the cache"""
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import (
+    AnonRateThrottle,
+    ScopedRateThrottle,
+    SimpleRateThrottle,
+    UserRateThrottle,
+)
+
+
+def hit(cache, current_key, previous_key, timeout):
+    """
+    Count a request in the current window and return the counts of the
+    current and the previous window.
+
+    On Redis this is one round trip: INCR, EXPIRE and GET run in a
+    MULTI/EXEC block, so concurrent workers never lose a hit. Other
+    backends go through the cache API; they are per process anyway.
+    """
+    if isinstance(cache, RedisCache):
+        current_key = cache.make_key(current_key)
+        previous_key = cache.make_key(previous_key)
+        client = cache._cache.get_client(current_key, write=True)
+        with client.pipeline() as pipe:
+            current, _, previous = (
+                pipe.incr(current_key)
+                .expire(current_key, timeout)
+                .get(previous_key)
+                .execute()
+            )
+        return current, int(previous or 0)
+
+    cache.add(current_key, 0, timeout)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Expired between add and incr
+        cache.add(current_key, 1, timeout)
+        current = 1
+    return current, cache.get(previous_key, 0)
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Approximates a sliding window with two fixed windows: the count of the
+    current window plus the previous window's count weighted by how much
+    of it still overlaps the sliding window. Each check costs one counter
+    increment and one read, however many requests the window holds,
+    unlike SimpleRateThrottle, which stores every request's timestamp.
+
+    Rejected requests are counted too, so a client that keeps retrying
+    stays throttled until it slows down.
+    """
+
+    cache_alias = DEFAULT_CACHE_ALIAS
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self.window = int(self.now // self.duration)
+        self.current, self.previous = hit(
+            self.cache,
+            f"{self.key}:{self.window}",
+            f"{self.key}:{self.window - 1}",
+            # The count is read as the previous window during the next one
+            2 * self.duration,
+        )
+        return self.estimate(self.now) <= self.num_requests
+
+    def estimate(self, now):
+        overlap = 1 - (now / self.duration - self.window)
+        return self.current + self.previous * overlap
+
+    def wait(self):
+        window_end = (self.window + 1) * self.duration
+        if self.current >= self.num_requests or not self.previous:
+            return window_end - self.now
+        # When the previous window's weight has dropped far enough
+        overlap = (self.num_requests - self.current) / self.previous
+        return max(0, window_end - overlap * self.duration - self.now)
+
+
+class AnonSlidingWindowThrottle(AnonRateThrottle, SlidingWindowThrottle):
+    """Limits anonymous users by IP, with the "anon" rate"""
+
+
+class UserSlidingWindowThrottle(UserRateThrottle, SlidingWindowThrottle):
+    """Limits users by id, and anonymous users by IP, with the "user" rate"""
+
+
+class ScopedSlidingWindowThrottle(ScopedRateThrottle, SlidingWindowThrottle):
+    """
+    Limits the requests to views with a ``throttle_scope`` by the rate of
+    that scope, per user or IP. The scope may be a property that depends
+    on the action; views whose scope is None are not limited.
+    """
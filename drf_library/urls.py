@@ -23,6 +23,8 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from drf_library.views import DatabaseRoutingView
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -30,6 +32,12 @@ urlpatterns = [
     path("api/book/", include("book.urls", namespace="books")),
     path("api/borrowing/", include("borrowing.urls", namespace="borrowings")),
     path("api/payment/", include("payment.urls", namespace="payments")),
+    path("api/analytics/", include("analytics.urls", namespace="analytics")),
+    path(
+        "api/metrics/db-routing/",
+        DatabaseRoutingView.as_view(),
+        name="db-routing",
+    ),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/doc/swagger/",
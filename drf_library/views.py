@@ -0,0 +1,31 @@
+import math
+import os
+
+from django.conf import settings
+from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .routers import replica_lag, routing_decisions
+
+
+class DatabaseRoutingView(APIView):
+    """Read routing decisions and replica lag as seen by this process"""
+
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(exclude=True)
+    def get(self, request):
+        lags = {alias: replica_lag(alias) for alias in settings.DATABASE_REPLICAS}
+        return Response(
+            {
+                "pid": os.getpid(),
+                "decisions": dict(routing_decisions),
+                # Unreachable replicas are reported without a lag
+                "replica_lag": {
+                    alias: lag if math.isfinite(lag) else None
+                    for alias, lag in lags.items()
+                },
+            }
+        )
@@ -0,0 +1,5 @@
+from django.contrib import admin
+
+from .models import TelegramMessage
+
+admin.site.register(TelegramMessage)
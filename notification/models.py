@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class TelegramMessage(models.Model):
+    """A message waiting in the outbox for the Telegram dispatcher"""
+
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set while a flush is sending the message; a flush that died leaves
+    # it to the next one once this has passed
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Telegram message #{self.id}"
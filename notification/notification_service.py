@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_q.tasks import async_task
+
+from .models import TelegramMessage
+
+# Set while a flush is queued and has not started yet
+FLUSH_PENDING = "telegram:flush-pending"
+
+
+def send_telegram_message(message):
+    """
+    Queue a message for the Telegram chat.
+
+    The message is written to the outbox in the caller's transaction and
+    delivered by the django-q cluster after commit, so request handlers
+    never wait on Telegram and rolled back work sends nothing.
+    """
+    TelegramMessage.objects.create(text=message)
+    transaction.on_commit(schedule_flush)
+
+
+def schedule_flush():
+    """
+    Queue a flush of the outbox, unless one is queued already and will
+    pick up the new messages. The flag expires with the cluster timeout,
+    so a lost task cannot hold back later flushes for long.
+    """
+    if cache.add(FLUSH_PENDING, True, settings.Q_CLUSTER["timeout"]):
+        async_task("notification.tasks.flush_telegram_messages")
@@ -0,0 +1,108 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from scheduler.locks import task_lock
+from .models import TelegramMessage
+from .notification_service import FLUSH_PENDING, schedule_flush
+from .telegram import TelegramClient, coalesce, pack
+
+FLUSH = "flush_telegram_messages"
+
+_client = None
+
+
+def get_client():
+    """One client per worker process, so the HTTP connection is reused"""
+    global _client
+    if _client is None:
+        _client = TelegramClient()
+    return _client
+
+
+def flush_telegram_messages(batch_size=100, client=None):
+    """
+    Drain the outbox, packing queued messages into as few Telegram calls as
+    possible.
+
+    Only one flush runs at a time across all workers, so the sends to the
+    chat stay spaced by the client's ``MIN_INTERVAL``; a flush started
+    while another one holds the lock returns None. When the lock is
+    released, messages still waiting get a new flush queued.
+
+    Messages are claimed in a short transaction and sent outside of it, so
+    no lock or transaction is held while Telegram answers. Every message
+    is deleted as soon as the call carrying it succeeded; when a call
+    fails, the claims on the messages not sent yet are released for the
+    next flush. A flush that would not finish the next call before the
+    cluster timeout leaves the rest to its continuation.
+    """
+    # Messages queued from now on are not guaranteed to be seen by this
+    # flush, so they queue another one
+    cache.delete(FLUSH_PENDING)
+
+    timeout = settings.Q_CLUSTER["timeout"]
+    with task_lock(FLUSH, ttl=timeout) as acquired:
+        if not acquired:
+            return None
+        flushed = _flush(batch_size, client or get_client(), timeout)
+
+    # Queued only once the lock is released, so the next flush can take it
+    if _waiting(timezone.now()).exists():
+        schedule_flush()
+    return flushed
+
+
+def _flush(batch_size, client, timeout):
+    deadline = time.monotonic() + timeout - client.max_send_duration
+    flushed = 0
+
+    while messages := _claim(batch_size, timeout):
+        groups = list(pack(messages))
+        for index, group in enumerate(groups):
+            if time.monotonic() > deadline:
+                _release(groups[index:])
+                return flushed
+            try:
+                for text in coalesce(message.text for message in group):
+                    client.send(text)
+            except Exception:
+                _release(groups[index:])
+                raise
+
+            TelegramMessage.objects.filter(
+                pk__in=[message.pk for message in group]
+            ).delete()
+            flushed += len(group)
+
+    return flushed
+
+
+def _waiting(now):
+    """Messages that no running flush has claimed"""
+    return TelegramMessage.objects.filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lte=now)
+    )
+
+
+@transaction.atomic
+def _claim(batch_size, seconds):
+    now = timezone.now()
+    messages = list(
+        _waiting(now).select_for_update(skip_locked=True).order_by("id")[:batch_size]
+    )
+    TelegramMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+        claimed_until=now + timedelta(seconds=seconds)
+    )
+    return messages
+
+
+def _release(groups):
+    TelegramMessage.objects.filter(
+        pk__in=[message.pk for group in groups for message in group]
+    ).update(claimed_until=None)
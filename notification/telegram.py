@@ -0,0 +1,133 @@
+import logging
+import time
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramError(Exception):
+    pass
+
+
+class TelegramClient:
+    """
+    Sends messages to the configured chat over one pooled HTTP session.
+
+    Sends are spaced by ``MIN_INTERVAL`` seconds to stay under Telegram's
+    per-chat limit. Network errors and 5xx responses are retried with
+    exponential backoff; 429 responses wait for the ``retry_after`` that
+    Telegram asks for, unless it is longer than ``MAX_RETRY_AFTER``.
+    """
+
+    def __init__(self, session=None, **options):
+        config = {**settings.TELEGRAM, **options}
+        self.url = f"{config['API_URL']}/bot{config['BOT_TOKEN']}/sendMessage"
+        self.chat_id = config["CHAT_ID"]
+        self.min_interval = config["MIN_INTERVAL"]
+        self.max_retries = config["MAX_RETRIES"]
+        self.backoff = config["BACKOFF"]
+        self.timeout = config["TIMEOUT"]
+        self.max_retry_after = config["MAX_RETRY_AFTER"]
+        self.session = session or requests.Session()
+        self._last_sent_at = None
+
+    def send(self, text):
+        payload = {"chat_id": self.chat_id, "text": text}
+
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_slot()
+            try:
+                response = self.session.post(
+                    self.url, json=payload, timeout=self.timeout
+                )
+            except requests.RequestException as error:
+                reason, delay = str(error), self.backoff * 2**attempt
+            else:
+                if response.status_code == 200:
+                    return
+                reason = response.text
+                if response.status_code == 429:
+                    delay = self._retry_after(response, attempt)
+                    if delay > self.max_retry_after:
+                        raise TelegramError(
+                            f"Telegram asked to retry after {delay}s: {reason}"
+                        )
+                elif response.status_code >= 500:
+                    delay = self.backoff * 2**attempt
+                else:
+                    raise TelegramError(f"Failed to send Telegram message: {reason}")
+
+            logger.warning("Telegram send attempt %s failed: %s", attempt + 1, reason)
+            if attempt < self.max_retries:
+                time.sleep(delay)
+
+        raise TelegramError(f"Failed to send Telegram message: {reason}")
+
+    @property
+    def max_send_duration(self):
+        """Seconds after which send() has returned or raised at the latest"""
+        delay = max(self.backoff * 2 ** (self.max_retries - 1), self.max_retry_after)
+        return (self.max_retries + 1) * (
+            self.timeout + self.min_interval
+        ) + self.max_retries * delay
+
+    def _wait_for_slot(self):
+        if self._last_sent_at is not None:
+            wait = self._last_sent_at + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        self._last_sent_at = time.monotonic()
+
+    def _retry_after(self, response, attempt):
+        try:
+            return float(response.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return self.backoff * 2**attempt
+
+
+def pack(messages, limit=MAX_MESSAGE_LENGTH, separator="\n\n"):
+    """
+    Group messages (objects with a ``text``) into the runs that coalesce()
+    joins into a single message; a text longer than ``limit`` is a run of
+    its own, sent in several parts.
+    """
+    group, length = [], 0
+    for message in messages:
+        added = len(message.text) + (len(separator) if group else 0)
+        if group and length + added > limit:
+            yield group
+            group, added = [], len(message.text)
+            length = 0
+        group.append(message)
+        length += added
+
+    if group:
+        yield group
+
+
+def coalesce(texts, limit=MAX_MESSAGE_LENGTH, separator="\n\n"):
+    """Pack many short texts into as few messages of at most ``limit`` chars"""
+    message = ""
+    for text in texts:
+        while len(text) > limit:
+            if message:
+                yield message
+                message = ""
+            yield text[:limit]
+            text = text[limit:]
+
+        if not message:
+            message = text
+        elif len(message) + len(separator) + len(text) <= limit:
+            message += separator + text
+        else:
+            yield message
+            message = text
+
+    if message:
+        yield message
@@ -0,0 +1,311 @@
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from notification.models import TelegramMessage
+from notification.notification_service import send_telegram_message
+from notification.tasks import FLUSH, flush_telegram_messages
+from notification.telegram import TelegramClient, TelegramError, coalesce, pack
+from scheduler.locks import task_lock
+
+
+class FakeTelegramServer:
+    """A local HTTP endpoint standing in for api.telegram.org"""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                server.requests.append(
+                    {"path": self.path, "body": json.loads(self.rfile.read(length))}
+                )
+                status, body = 200, {"ok": True}
+                if server.responses:
+                    status, body = server.responses.pop(0)
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TelegramTestMixin:
+    def setUp(self):
+        self.server = FakeTelegramServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    def make_client(self, **options):
+        options = {
+            "API_URL": self.server.url,
+            "BOT_TOKEN": "token",
+            "CHAT_ID": "42",
+            "MIN_INTERVAL": 0,
+            "BACKOFF": 0,
+            **options,
+        }
+        return TelegramClient(**options)
+
+
+class TelegramClientTests(TelegramTestMixin, TestCase):
+    def test_send(self):
+        self.make_client().send("Hello")
+
+        self.assertEqual(
+            self.server.requests,
+            [
+                {
+                    "path": "/bottoken/sendMessage",
+                    "body": {"chat_id": "42", "text": "Hello"},
+                }
+            ],
+        )
+
+    def test_retries_server_errors(self):
+        self.server.responses = [(502, {"ok": False}), (500, {"ok": False})]
+
+        self.make_client().send("Hello")
+
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_honours_retry_after(self):
+        self.server.responses = [
+            (429, {"ok": False, "parameters": {"retry_after": 0}}),
+        ]
+
+        self.make_client(BACKOFF=60).send("Hello")
+
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.responses = [(500, {"ok": False})] * 3
+
+        with self.assertRaises(TelegramError):
+            self.make_client(MAX_RETRIES=2).send("Hello")
+
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.responses = [(400, {"ok": False})]
+
+        with self.assertRaises(TelegramError):
+            self.make_client().send("Hello")
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_sends_are_rate_limited(self):
+        client = self.make_client(MIN_INTERVAL=0.05)
+
+        sent_at = []
+        for _ in range(3):
+            client.send("Hello")
+            sent_at.append(client._last_sent_at)
+
+        self.assertGreaterEqual(sent_at[1] - sent_at[0], 0.05)
+        self.assertGreaterEqual(sent_at[2] - sent_at[1], 0.05)
+
+    def test_long_retry_after_is_left_to_the_next_flush(self):
+        self.server.responses = [(429, {"parameters": {"retry_after": 30}})]
+
+        with self.assertRaises(TelegramError):
+            self.make_client(MAX_RETRY_AFTER=5).send("Hello")
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_send_fits_in_the_cluster_timeout(self):
+        client = TelegramClient()
+
+        self.assertLess(client.max_send_duration, settings.Q_CLUSTER["timeout"])
+
+
+class CoalesceTests(TestCase):
+    def test_short_texts_are_joined(self):
+        self.assertEqual(list(coalesce(["a", "b", "c"])), ["a\n\nb\n\nc"])
+
+    def test_messages_respect_the_limit(self):
+        messages = list(coalesce(["a" * 6, "b" * 6, "c" * 3], limit=10))
+
+        self.assertEqual(messages, ["a" * 6, "b" * 6, "c" * 3])
+
+    def test_long_texts_are_split(self):
+        messages = list(coalesce(["x", "y" * 25], limit=10))
+
+        self.assertEqual(messages, ["x", "y" * 10, "y" * 10, "y" * 5])
+
+
+class PackTests(TestCase):
+    def test_groups_match_coalesced_messages(self):
+        messages = [TelegramMessage(text=text) for text in ["a" * 6, "b" * 3, "c" * 20]]
+
+        groups = list(pack(messages, limit=12, separator="--"))
+
+        self.assertEqual(
+            [[message.text[0] for message in group] for group in groups],
+            [["a", "b"], ["c"]],
+        )
+
+
+class FlushTelegramMessagesTests(TelegramTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_send_telegram_message_only_queues(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            send_telegram_message("New borrowing created")
+
+        self.assertEqual(TelegramMessage.objects.count(), 1)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.server.requests, [])
+
+    def test_flush_coalesces_queued_messages(self):
+        for index in range(5):
+            send_telegram_message(f"Message {index}")
+
+        flushed = flush_telegram_messages(client=self.make_client())
+
+        self.assertEqual(flushed, 5)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(
+            self.server.requests[0]["body"]["text"],
+            "\n\n".join(f"Message {index}" for index in range(5)),
+        )
+        self.assertFalse(TelegramMessage.objects.exists())
+
+    def test_failed_flush_keeps_messages(self):
+        send_telegram_message("Message")
+        self.server.responses = [(500, {"ok": False})] * 2
+
+        with self.assertRaises(TelegramError):
+            flush_telegram_messages(client=self.make_client(MAX_RETRIES=1))
+
+        self.assertEqual(TelegramMessage.objects.count(), 1)
+
+    def test_failed_chunk_keeps_only_unsent_messages(self):
+        for letter in "abc":
+            send_telegram_message(letter * 3000)
+        # The first chunk goes through, the second one fails
+        self.server.responses = [(200, {"ok": True}), (400, {"ok": False})]
+
+        with self.assertRaises(TelegramError):
+            flush_telegram_messages(client=self.make_client())
+
+        self.assertEqual(
+            list(TelegramMessage.objects.values_list("text", "claimed_until")),
+            [("b" * 3000, None), ("c" * 3000, None)],
+        )
+
+        flush_telegram_messages(client=self.make_client())
+
+        self.assertEqual(
+            [request["body"]["text"][0] for request in self.server.requests],
+            ["a", "b", "b", "c"],
+        )
+        self.assertFalse(TelegramMessage.objects.exists())
+
+    def test_claimed_messages_are_skipped(self):
+        send_telegram_message("Claimed")
+        send_telegram_message("Free")
+        TelegramMessage.objects.filter(text="Claimed").update(
+            claimed_until=timezone.now() + timedelta(minutes=1)
+        )
+
+        flushed = flush_telegram_messages(client=self.make_client())
+
+        self.assertEqual(flushed, 1)
+        self.assertEqual(self.server.requests[0]["body"]["text"], "Free")
+        self.assertTrue(TelegramMessage.objects.filter(text="Claimed").exists())
+
+    def test_expired_claims_are_taken_over(self):
+        send_telegram_message("Abandoned")
+        TelegramMessage.objects.update(
+            claimed_until=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(flush_telegram_messages(client=self.make_client()), 1)
+
+    @mock.patch("notification.notification_service.async_task")
+    def test_flush_near_the_timeout_requeues(self, async_task):
+        send_telegram_message("Message")
+        client = self.make_client()
+
+        with mock.patch.object(
+            TelegramClient, "max_send_duration", settings.Q_CLUSTER["timeout"] + 1
+        ):
+            flushed = flush_telegram_messages(client=client)
+
+        self.assertEqual(flushed, 0)
+        self.assertEqual(self.server.requests, [])
+        async_task.assert_called_once_with("notification.tasks.flush_telegram_messages")
+        self.assertIsNone(TelegramMessage.objects.get().claimed_until)
+
+    @mock.patch("notification.notification_service.async_task")
+    def test_only_one_flush_is_queued_at_a_time(self, async_task):
+        with self.captureOnCommitCallbacks(execute=True):
+            send_telegram_message("First")
+        with self.captureOnCommitCallbacks(execute=True):
+            send_telegram_message("Second")
+
+        async_task.assert_called_once_with("notification.tasks.flush_telegram_messages")
+
+        flush_telegram_messages(client=self.make_client())
+        with self.captureOnCommitCallbacks(execute=True):
+            send_telegram_message("Third")
+
+        self.assertEqual(async_task.call_count, 2)
+
+    def test_flushes_do_not_run_concurrently(self):
+        send_telegram_message("Message")
+
+        with task_lock(FLUSH, ttl=60):
+            flushed = flush_telegram_messages(client=self.make_client())
+
+        self.assertIsNone(flushed)
+        self.assertEqual(self.server.requests, [])
+        self.assertIsNone(TelegramMessage.objects.get().claimed_until)
+
+    @mock.patch("notification.notification_service.async_task")
+    def test_messages_queued_during_a_flush_are_flushed_next(self, async_task):
+        send_telegram_message("Message")
+        client = self.make_client()
+        send = client.send
+
+        def send_and_queue(text):
+            send(text)
+            # Its flush gave up on the lock held by this one
+            send_telegram_message("Late")
+
+        with mock.patch.object(client, "send", send_and_queue):
+            with mock.patch(
+                "notification.tasks._claim",
+                side_effect=[list(TelegramMessage.objects.all()), []],
+            ):
+                self.assertEqual(flush_telegram_messages(client=client), 1)
+
+        async_task.assert_called_once_with("notification.tasks.flush_telegram_messages")
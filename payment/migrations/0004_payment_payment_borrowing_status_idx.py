@@ -0,0 +1,21 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "payment",
+            "0003_alter_payment_money_to_pay_alter_payment_session_id_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["borrowing", "status"], name="payment_borrowing_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.4 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("payment", "0004_payment_payment_borrowing_status_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="paid_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
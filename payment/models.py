@@ -20,6 +20,26 @@ class Payment(models.Model):
     session_url = models.URLField(null=True, blank=True)
     session_id = models.CharField(max_length=255, null=True, blank=True)
     money_to_pay = models.DecimalField(max_digits=8, decimal_places=2)
+    paid_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Covers the pending-payment check made before every new borrowing
+            models.Index(
+                fields=["borrowing", "status"], name="payment_borrowing_status_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Payment #{self.id}"
+
+
+class StripeEvent(models.Model):
+    """A processed Stripe webhook event, so that redeliveries are ignored"""
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
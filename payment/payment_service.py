@@ -1,54 +1,98 @@
 import os
+from types import SimpleNamespace
+from uuid import uuid4
 
 import stripe
 from _decimal import Decimal
 from django.db import transaction
+from django_q.tasks import async_task
 from rest_framework.reverse import reverse
 
+from borrowing.summary_service import SummaryChanges
 from .models import Payment
 
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 
 
-@transaction.atomic
 def create_stripe_session(request, borrowing):
+    """
+    Create a pending payment for the borrowing and schedule its checkout
+    session. The Stripe round trip runs on the django-q cluster once the
+    surrounding transaction commits; clients poll the payment until its
+    session_url is filled in.
+    """
+    return create_stripe_sessions(request, [borrowing])[0]
+
+
+def create_stripe_sessions(request, borrowings):
+    """
+    Create pending payments for several borrowings in one INSERT and
+    schedule a single checkout session that charges for all of them.
+    """
+    payments = Payment.objects.bulk_create(
+        Payment(
+            borrowing=borrowing,
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            money_to_pay=get_total_price(borrowing),
+        )
+        for borrowing in borrowings
+    )
+    payment_ids = [payment.pk for payment in payments]
+    changes = SummaryChanges()
+    for payment in payments:
+        changes.add_payment(payment.borrowing.user_id, payment)
+    changes.apply()
+
+    success_url = request.build_absolute_uri(
+        reverse("payments:payment_success", kwargs={"pk": payment_ids[0]})
+    )
+    cancel_url = request.build_absolute_uri(
+        reverse("payments:payment_cancel", kwargs={"pk": payment_ids[0]})
+    )
+    transaction.on_commit(
+        lambda: async_task(
+            "payment.tasks.open_checkout_session",
+            payment_ids,
+            success_url,
+            cancel_url,
+        )
+    )
+
+    return payments
+
+
+def get_total_price(borrowing):
     total_price = borrowing.total_price
 
     if total_price <= 0:
         total_price = Decimal(str(borrowing.book.daily_fee))
+    return total_price
 
-    unit_amount = int(total_price * 100)
 
-    payment = Payment.objects.create(
-        borrowing=borrowing,
-        status=Payment.StatusChoices.PENDING,
-        type=Payment.TypeChoices.PAYMENT,
-        money_to_pay=total_price,
-    )
-
-    session = stripe.checkout.Session.create(
+def stripe_checkout_session(line_items, success_url, cancel_url):
+    return stripe.checkout.Session.create(
         payment_method_types=["card"],
         line_items=[
             {
                 "price_data": {
                     "currency": "usd",
-                    "unit_amount": unit_amount,
+                    "unit_amount": item["unit_amount"],
                     "product_data": {
-                        "name": borrowing.book.title,
+                        "name": item["name"],
                     },
                 },
                 "quantity": 1,
             }
+            for item in line_items
         ],
         mode="payment",
-        success_url=request.build_absolute_uri(
-            reverse("payments:payment_success", kwargs={"pk": payment.pk})
-        ),
-        cancel_url=request.build_absolute_uri(
-            reverse("payments:payment_cancel", kwargs={"pk": payment.pk})
-        ),
+        success_url=success_url,
+        cancel_url=cancel_url,
     )
 
-    payment.session_url = session.url
-    payment.session_id = session.id
-    payment.save()
+
+def local_checkout_session(line_items, success_url, cancel_url):
+    """Offline stand-in for Stripe, for development and tests"""
+    session_id = f"cs_local_{uuid4().hex}"
+    return SimpleNamespace(id=session_id, url=f"{success_url}?session_id={session_id}")
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import Payment
+
+
+def open_checkout_session(payment_ids, success_url, cancel_url):
+    """
+    Open one checkout session for pending payments and store its URL on
+    all of them. ``payment_ids`` may also be a single id.
+    """
+    if isinstance(payment_ids, int):
+        payment_ids = [payment_ids]
+    payments = list(
+        Payment.objects.select_related("borrowing__book")
+        .filter(pk__in=payment_ids)
+        .order_by("id")
+    )
+
+    # The task may be retried after the session was already stored
+    for payment in payments:
+        if payment.session_id:
+            return payment.session_url
+
+    open_session = import_string(settings.PAYMENT_CHECKOUT_BACKEND)
+    session = open_session(
+        line_items=[
+            {
+                "name": payment.borrowing.book.title,
+                "unit_amount": int(payment.money_to_pay * 100),
+            }
+            for payment in payments
+        ],
+        success_url=success_url,
+        cancel_url=cancel_url,
+    )
+
+    Payment.objects.filter(pk__in=payment_ids, session_id__isnull=True).update(
+        session_url=session.url, session_id=session.id
+    )
+    return session.url
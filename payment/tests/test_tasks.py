@@ -0,0 +1,123 @@
+from datetime import date
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+from payment.payment_service import create_stripe_session
+from payment.tasks import open_checkout_session
+from user.models import User
+
+LOCAL_CHECKOUT = "payment.payment_service.local_checkout_session"
+
+
+class CreateStripeSessionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="testuser@example.com", password="testpassword"
+        )
+        self.book = Book.objects.create(title="Test Book", daily_fee=10.0, inventory=5)
+        self.borrowing = Borrowing.objects.create(
+            expected_return_date=date.today(), book=self.book, user=self.user
+        )
+        self.request = APIRequestFactory().post("/api/borrowing/borrowings/")
+
+    @mock.patch("payment.payment_service.async_task")
+    def test_payment_is_created_pending_and_session_is_queued_on_commit(
+        self, async_task
+    ):
+        with self.captureOnCommitCallbacks() as callbacks:
+            payment = create_stripe_session(self.request, self.borrowing)
+
+        self.assertEqual(payment.status, Payment.StatusChoices.PENDING)
+        self.assertEqual(payment.money_to_pay, 10)
+        self.assertIsNone(payment.session_url)
+        async_task.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+
+        async_task.assert_called_once_with(
+            "payment.tasks.open_checkout_session",
+            [payment.pk],
+            f"http://testserver/api/payment/payments/{payment.pk}/success/",
+            f"http://testserver/api/payment/payments/{payment.pk}/cancel/",
+        )
+
+
+@override_settings(PAYMENT_CHECKOUT_BACKEND=LOCAL_CHECKOUT)
+class OpenCheckoutSessionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="testuser@example.com", password="testpassword"
+        )
+        self.book = Book.objects.create(title="Test Book", daily_fee=10.0, inventory=5)
+        self.borrowing = Borrowing.objects.create(
+            expected_return_date=date.today(), book=self.book, user=self.user
+        )
+        self.payment = Payment.objects.create(
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=self.borrowing,
+            money_to_pay=12.5,
+        )
+
+    def test_session_url_is_stored(self):
+        url = open_checkout_session(
+            self.payment.pk, "https://example.com/success/", "https://example.com/"
+        )
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.session_url, url)
+        self.assertTrue(self.payment.session_id.startswith("cs_local_"))
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PENDING)
+
+    def test_backend_receives_payment_details(self):
+        backend = mock.Mock(return_value=mock.Mock(id="cs_1", url="https://pay/"))
+
+        with mock.patch(LOCAL_CHECKOUT, backend):
+            open_checkout_session(self.payment.pk, "https://ok/", "https://cancel/")
+
+        backend.assert_called_once_with(
+            line_items=[{"name": "Test Book", "unit_amount": 1250}],
+            success_url="https://ok/",
+            cancel_url="https://cancel/",
+        )
+
+    def test_retry_does_not_open_a_second_session(self):
+        first = open_checkout_session(self.payment.pk, "https://ok/", "https://no/")
+        second = open_checkout_session(self.payment.pk, "https://ok/", "https://no/")
+
+        self.assertEqual(first, second)
+
+    def test_payments_share_one_session(self):
+        other = Payment.objects.create(
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=Borrowing.objects.create(
+                expected_return_date=date.today(), book=self.book, user=self.user
+            ),
+            money_to_pay=3,
+        )
+        backend = mock.Mock(return_value=mock.Mock(id="cs_1", url="https://pay/"))
+
+        with mock.patch(LOCAL_CHECKOUT, backend):
+            open_checkout_session(
+                [self.payment.pk, other.pk], "https://ok/", "https://no/"
+            )
+
+        backend.assert_called_once_with(
+            line_items=[
+                {"name": "Test Book", "unit_amount": 1250},
+                {"name": "Test Book", "unit_amount": 300},
+            ],
+            success_url="https://ok/",
+            cancel_url="https://no/",
+        )
+        self.assertEqual(
+            list(Payment.objects.values_list("session_id", flat=True).distinct()),
+            ["cs_1"],
+        )
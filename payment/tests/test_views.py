@@ -1,6 +1,9 @@
+import csv
+import io
 from datetime import date
 
 from django.test import TestCase
+from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
@@ -42,10 +45,32 @@ class PaymentViewSetTestCase(TestCase):
         url = "/api/payment/payments/"
 
         response = self.client.get(url)
-        payments = Payment.objects.all()
+        payments = Payment.objects.order_by("-id")
         serializer = PaymentSerializer(payments, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
+
+    def test_list_payments_paginated(self):
+        """Test that payments are served page by page, newest first"""
+        for _ in range(4):
+            Payment.objects.create(
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.FINE,
+                borrowing=self.borrowing,
+                money_to_pay=5.0,
+            )
+        url = "/api/payment/payments/?page_size=2"
+
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [payment["id"] for payment in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(
+            ids, list(Payment.objects.order_by("-id").values_list("id", flat=True))
+        )
 
     def test_retrieve_payment(self):
         """Test retrieving a single payment"""
@@ -63,3 +88,32 @@ class PaymentViewSetTestCase(TestCase):
         serializer = PaymentSerializer(self.payment)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, serializer.data)
+
+    def test_export_streams_only_own_payments(self):
+        other = User.objects.create_user(email="other@example.com", password="pw")
+        Payment.objects.create(
+            status=Payment.StatusChoices.PAID,
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=Borrowing.objects.create(
+                expected_return_date=date(2023, 1, 5), book=self.book, user=other
+            ),
+            money_to_pay=5,
+        )
+
+        response = self.client.get(reverse("payments:payment-export"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["id"], str(self.payment.id))
+        self.assertEqual(rows[0]["user"], self.user.email)
+        self.assertEqual(rows[0]["money_to_pay"], "10.00")
+
+    def test_export_rejects_unknown_format(self):
+        response = self.client.get(
+            reverse("payments:payment-export"), {"file_format": "xml"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from datetime import date
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+from user.models import User
+
+
+# Production middleware only: the debug toolbar would run the view in a thread
+ASYNC_MIDDLEWARE = [m for m in settings.MIDDLEWARE if "debug_toolbar" not in m]
+
+
+@mock.patch("payment.views.LONG_POLL_INTERVAL", 0.01)
+@override_settings(MIDDLEWARE=ASYNC_MIDDLEWARE)
+class WaitForPaymentTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pw")
+        book = Book.objects.create(title="Test Book", daily_fee=10, inventory=5)
+        self.payment = Payment.objects.create(
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=Borrowing.objects.create(
+                expected_return_date=date.today(), book=book, user=self.user
+            ),
+            money_to_pay=10,
+        )
+        self.url = reverse("payments:payment_wait", args=[self.payment.pk])
+
+    async def wait(self, user=None, **params):
+        await sync_to_async(self.async_client.force_login)(user or self.user)
+        return await self.async_client.get(self.url, params)
+
+    async def test_returns_once_the_session_is_stored(self):
+        async def open_session():
+            await asyncio.sleep(0.05)
+            await sync_to_async(Payment.objects.filter(pk=self.payment.pk).update)(
+                session_url="https://checkout.stripe.com/c/pay/cs_test"
+            )
+
+        response, _ = await asyncio.gather(self.wait(timeout=5), open_session())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["session_url"], "https://checkout.stripe.com/c/pay/cs_test"
+        )
+
+    async def test_waits_for_the_webhook_confirmation(self):
+        await sync_to_async(Payment.objects.filter(pk=self.payment.pk).update)(
+            status=Payment.StatusChoices.PAID
+        )
+
+        response = await self.wait(until="paid")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "Paid")
+
+    async def test_times_out_with_the_current_state(self):
+        started = time.monotonic()
+
+        response = await self.wait(timeout=0.05)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNone(response.json()["session_url"])
+
+    @mock.patch("payment.views.LONG_POLL_TIMEOUT", 0.05)
+    async def test_timeout_is_capped(self):
+        started = time.monotonic()
+
+        response = await self.wait(timeout=1000)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, 202)
+
+    async def test_other_users_payments_are_hidden(self):
+        other = await sync_to_async(User.objects.create_user)(
+            email="other@example.com", password="pw"
+        )
+
+        response = await self.wait(user=other, timeout=0.01)
+
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, 401)
+
+    async def test_rejects_invalid_parameters(self):
+        for params in [
+            {"until": "shipped"},
+            {"timeout": "soon"},
+            {"timeout": "nan"},
+            {"timeout": "inf"},
+            {"timeout": "-1"},
+            {"timeout": "0"},
+        ]:
+            response = await self.wait(**params)
+
+            self.assertEqual(response.status_code, 400)
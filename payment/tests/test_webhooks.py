@@ -0,0 +1,167 @@
+import hashlib
+import hmac
+import json
+import time
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrowing.models import Borrowing, BorrowerSummary
+from notification.models import TelegramMessage
+from payment.models import Payment, StripeEvent
+from user.models import User
+
+FIXTURES = Path(__file__).parent / "fixtures"
+WEBHOOK_URL = reverse("payments:stripe_webhook")
+SECRET = "whsec_test_secret"
+SESSION_ID = "cs_test_a1b2c3d4e5f6"
+
+
+def load_event(name):
+    return (FIXTURES / f"{name}.json").read_bytes()
+
+
+def sign(payload, secret=SECRET, timestamp=None):
+    timestamp = timestamp or int(time.time())
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+@mock.patch("notification.notification_service.async_task", mock.Mock())
+@override_settings(STRIPE_WEBHOOK_SECRET=SECRET)
+class StripeWebhookTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="user@example.com", password="pw")
+        book = Book.objects.create(title="Test Book", daily_fee=10, inventory=5)
+        self.payments = [
+            Payment.objects.create(
+                status=Payment.StatusChoices.PENDING,
+                type=Payment.TypeChoices.PAYMENT,
+                borrowing=Borrowing.objects.create(
+                    expected_return_date=date.today(), book=book, user=self.user
+                ),
+                session_id=SESSION_ID,
+                money_to_pay=6.25,
+            )
+            for _ in range(2)
+        ]
+
+    def post_event(self, payload, signature=None):
+        return self.client.generic(
+            "POST",
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature or sign(payload),
+        )
+
+    def statuses(self):
+        return list(Payment.objects.order_by("id").values_list("status", flat=True))
+
+    def test_completed_session_marks_its_payments_paid(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_event(load_event("checkout_session_completed"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["processed"])
+        self.assertEqual(self.statuses(), ["Paid", "Paid"])
+        self.assertTrue(all(p.paid_at for p in Payment.objects.all()))
+        self.assertEqual(
+            BorrowerSummary.objects.get(user=self.user).pending_payments, 0
+        )
+        [message] = TelegramMessage.objects.all()
+        for payment in self.payments:
+            self.assertIn(f"Payment #{payment.id} was successful.", message.text)
+
+    def test_redelivered_event_is_processed_once(self):
+        payload = load_event("checkout_session_completed")
+        self.post_event(payload)
+        Payment.objects.update(status=Payment.StatusChoices.PENDING)
+
+        response = self.post_event(payload)
+
+        self.assertFalse(response.data["processed"])
+        self.assertEqual(self.statuses(), ["Pending", "Pending"])
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        self.assertEqual(TelegramMessage.objects.count(), 1)
+
+    def test_delayed_payment_is_confirmed_by_a_later_event(self):
+        self.post_event(load_event("checkout_session_completed_unpaid"))
+        self.assertEqual(self.statuses(), ["Pending", "Pending"])
+
+        self.post_event(load_event("checkout_session_async_payment_succeeded"))
+
+        self.assertEqual(self.statuses(), ["Paid", "Paid"])
+
+    def test_other_events_are_recorded_and_ignored(self):
+        response = self.post_event(load_event("payment_intent_created"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.statuses(), ["Pending", "Pending"])
+        self.assertTrue(StripeEvent.objects.filter(type="payment_intent.created"))
+
+    def test_invalid_signature_is_rejected(self):
+        payload = load_event("checkout_session_completed")
+
+        for signature in [sign(payload, secret="whsec_other"), "garbage"]:
+            response = self.post_event(payload, signature=signature)
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.statuses(), ["Pending", "Pending"])
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_stale_signature_is_rejected(self):
+        payload = load_event("checkout_session_completed")
+
+        response = self.post_event(
+            payload, signature=sign(payload, timestamp=int(time.time()) - 3600)
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tampered_payload_is_rejected(self):
+        payload = load_event("checkout_session_completed")
+        tampered = json.dumps({**json.loads(payload), "id": "evt_forged"}).encode()
+
+        response = self.post_event(tampered, signature=sign(payload))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentSuccessRedirectTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user(email="user@example.com", password="pw")
+        self.client.force_authenticate(user)
+        book = Book.objects.create(title="Test Book", daily_fee=10, inventory=5)
+        self.payment = Payment.objects.create(
+            status=Payment.StatusChoices.PENDING,
+            type=Payment.TypeChoices.PAYMENT,
+            borrowing=Borrowing.objects.create(
+                expected_return_date=date.today(), book=book, user=user
+            ),
+            session_id=SESSION_ID,
+            money_to_pay=10,
+        )
+        self.url = reverse("payments:payment_success", args=[self.payment.pk])
+
+    def test_pending_payment_is_being_confirmed(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_paid_payment(self):
+        Payment.objects.update(status=Payment.StatusChoices.PAID)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
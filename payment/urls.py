@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import PaymentViewSet
+from .views import PaymentViewSet, StripeWebhookView, wait_for_payment
 
 router = DefaultRouter()
 router.register(r"payments", PaymentViewSet, basename="payment")
@@ -17,6 +17,16 @@ urlpatterns = [
                       PaymentViewSet.as_view({"get": "payment_cancel"}),
                       name="payment_cancel",
                   ),
+                  path(
+                      "payments/<int:pk>/wait/",
+                      wait_for_payment,
+                      name="payment_wait",
+                  ),
+                  path(
+                      "webhooks/stripe/",
+                      StripeWebhookView.as_view(),
+                      name="stripe_webhook",
+                  ),
               ] + router.urls
 
 app_name = "payments"
@@ -1,19 +1,62 @@
+import asyncio
+import math
+import time
+
 import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
-from rest_framework import viewsets, status
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import exceptions, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from borrowing.telegram_helper import send_telegram_message
+from drf_library.pagination import PaymentPagination
+from drf_library.routers import ReplicaReadMixin
+from drf_library.streaming import CONTENT_TYPES, get_file_format, streaming_response
+from drf_library.throttling import ScopedSlidingWindowThrottle
 from .models import Payment
 from .serializers import PaymentSerializer
+from .webhooks import process_event
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_COLUMNS = {
+    "id": "id",
+    "borrowing": "borrowing_id",
+    "user": "borrowing__user__email",
+    "type": "type",
+    "status": "status",
+    "money_to_pay": "money_to_pay",
+    "session_id": "session_id",
+}
+
+# Kept below the usual 30 second proxy timeout
+LONG_POLL_TIMEOUT = 25
+LONG_POLL_INTERVAL = 0.5
+WAIT_CONDITIONS = {
+    "session": lambda payment: bool(payment.session_url),
+    "paid": lambda payment: payment.status == Payment.StatusChoices.PAID,
+}
 
 
-class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
+class PaymentViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaymentPagination
+
+    @property
+    def throttle_scope(self):
+        if self.action in ("payment_success", "payment_cancel"):
+            return "payment_callback"
+        return None
 
     def get_queryset(self):
         queryset = self.queryset
@@ -25,30 +68,21 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=True, methods=["GET"], url_path="success")
     def payment_success(self, request, pk=None):
-        """Handle a successful payment"""
+        """
+        Handle the redirect after checkout. Payments are confirmed by the
+        Stripe webhook, so this only reports the local status.
+        """
         payment = get_object_or_404(Payment, pk=pk)
 
-        session = stripe.checkout.Session.retrieve(payment.session_id)
-        if session.payment_status == "paid":
-            payment.status = Payment.status.PAID
-            payment.save()
-
-            message = (
-                f"Payment #{payment.id} was successful.\n"
-                f"Type: {payment.type}\n"
-                f"Borrowing: {payment.borrowing}"
-            )
-            send_telegram_message(message)
-
+        if payment.status == Payment.StatusChoices.PAID:
             return Response(
                 {"success": "Payment was successful."},
                 status=status.HTTP_200_OK,
             )
-        else:
-            return Response(
-                {"error": "Payment was not successful."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        return Response(
+            {"message": "Payment is being confirmed."},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
     @action(detail=True, methods=["GET"], url_path="cancel")
     def payment_cancel(self, request, pk=None):
@@ -57,3 +91,106 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
             {"message": "Payment can be made later."},
             status=status.HTTP_200_OK,
         )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="file_format",
+                description="csv (default) or ndjson",
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=sorted(CONTENT_TYPES),
+            ),
+        ]
+    )
+    @action(detail=False, methods=["GET"])
+    def export(self, request):
+        """Stream the payments visible to the user as CSV or NDJSON"""
+        file_format = get_file_format(request.query_params.get("file_format"))
+        rows = (
+            self.get_queryset()
+            .order_by("id")
+            .values_list(*EXPORT_COLUMNS.values())
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        return streaming_response(rows, list(EXPORT_COLUMNS), file_format, "payments")
+
+
+class StripeWebhookView(APIView):
+    """Receives Stripe events; only signed requests are accepted"""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    # Stripe sends every event from a few IPs, so the anon limit shared by
+    # all clients of an IP would soon reject them; Stripe retries events
+    # answered with 429
+    throttle_classes = [ScopedSlidingWindowThrottle]
+    throttle_scope = "payment_callback"
+
+    @extend_schema(exclude=True)
+    def post(self, request):
+        try:
+            event = stripe.Webhook.construct_event(
+                request.body,
+                request.headers.get("Stripe-Signature", ""),
+                settings.STRIPE_WEBHOOK_SECRET,
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            return Response(
+                {"error": "Invalid Stripe event."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        processed = process_event(event)
+        return Response({"processed": processed}, status=status.HTTP_200_OK)
+
+
+async def wait_for_payment(request, pk):
+    """
+    Long-poll a payment until its checkout URL is stored (``until=session``)
+    or the Stripe webhook confirmed it (``until=paid``). Answers 200 as soon
+    as that happens, or 202 with the current state after ``timeout``
+    seconds. The view is async, so under ASGI waiting clients do not hold a
+    worker thread.
+    """
+    until = request.GET.get("until", "session")
+    try:
+        timeout = float(request.GET.get("timeout", LONG_POLL_TIMEOUT))
+    except ValueError:
+        timeout = None
+    # nan and inf would never reach the deadline
+    if timeout is not None and (not math.isfinite(timeout) or timeout <= 0):
+        timeout = None
+    if until not in WAIT_CONDITIONS or timeout is None:
+        return JsonResponse({"error": "Invalid wait parameters."}, status=400)
+
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except exceptions.APIException as error:
+        return JsonResponse({"detail": str(error.detail)}, status=401)
+    if not user.is_authenticated:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."}, status=401
+        )
+
+    queryset = Payment.objects.filter(pk=pk)
+    if not user.is_staff:
+        queryset = queryset.filter(borrowing__user=user)
+
+    deadline = time.monotonic() + min(timeout, LONG_POLL_TIMEOUT)
+    while True:
+        payment = await sync_to_async(queryset.first)()
+        if payment is None:
+            return JsonResponse({"detail": "Not found."}, status=404)
+
+        data = PaymentSerializer(payment).data
+        if WAIT_CONDITIONS[until](payment):
+            return JsonResponse(data, status=200)
+        if time.monotonic() >= deadline:
+            return JsonResponse(data, status=202)
+        await asyncio.sleep(LONG_POLL_INTERVAL)
+
+
+def _authenticate(request):
+    """Resolve the user with the API's authentication classes"""
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    return Request(request, authenticators=authenticators).user
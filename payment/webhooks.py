@@ -0,0 +1,83 @@
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from borrowing.summary_service import SummaryChanges
+from notification.notification_service import send_telegram_message
+from .models import Payment, StripeEvent
+
+logger = logging.getLogger(__name__)
+
+
+@transaction.atomic
+def process_event(event):
+    """
+    Apply a verified Stripe event once. The event id is recorded in the
+    same transaction as its effects, so a redelivered event, or one that
+    arrives twice at the same time, is skipped. Returns False for
+    duplicates.
+    """
+    _, created = StripeEvent.objects.get_or_create(
+        event_id=event["id"], defaults={"type": event["type"]}
+    )
+    if not created:
+        return False
+
+    handler = EVENT_HANDLERS.get(event["type"])
+    if handler is None:
+        logger.info("Ignoring Stripe event %s of type %s", event["id"], event["type"])
+    else:
+        handler(event["data"]["object"])
+    return True
+
+
+def checkout_session_completed(session):
+    # Card payments are paid on completion; delayed methods send
+    # async_payment_succeeded later
+    if session["payment_status"] == "paid":
+        mark_session_paid(session["id"])
+
+
+def checkout_session_async_payment_succeeded(session):
+    mark_session_paid(session["id"])
+
+
+def mark_session_paid(session_id):
+    """
+    Mark every pending payment of a checkout session as paid with one
+    UPDATE, and queue a single notification about them.
+    """
+    payments = list(
+        Payment.objects.select_for_update(of=("self",))
+        .select_related("borrowing__book", "borrowing__user")
+        .filter(session_id=session_id, status=Payment.StatusChoices.PENDING)
+        .order_by("id")
+    )
+    if not payments:
+        return []
+
+    Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+        status=Payment.StatusChoices.PAID, paid_at=timezone.now()
+    )
+    changes = SummaryChanges()
+    for payment in payments:
+        changes.add_payment(payment.borrowing.user_id, payment, sign=-1)
+    changes.apply()
+    send_telegram_message(
+        "\n\n".join(
+            f"Payment #{payment.id} was successful.\n"
+            f"Type: {payment.type}\n"
+            f"Borrowing: {payment.borrowing}"
+            for payment in payments
+        )
+    )
+    return payments
+
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": checkout_session_completed,
+    "checkout.session.async_payment_succeeded": (
+        checkout_session_async_payment_succeeded
+    ),
+}
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class SchedulerConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "scheduler"
+
+    def ready(self):
+        from .schedules import sync_schedules_after_migrate
+
+        post_migrate.connect(sync_schedules_after_migrate, sender=self)
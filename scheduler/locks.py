@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from uuid import uuid4
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TaskLock
+
+
+@contextmanager
+def task_lock(name, ttl):
+    """
+    Hold the named lock for the duration of the block, or yield False when
+    another worker holds it.
+
+    The lock is taken with a conditional UPDATE on a shared table, so it
+    works across every node that talks to the database. It expires after
+    ``ttl`` seconds, so a worker killed mid-task cannot hold it forever.
+    """
+    owner = uuid4().hex
+    TaskLock.objects.get_or_create(name=name)
+
+    now = timezone.now()
+    acquired = TaskLock.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now), name=name
+    ).update(owner=owner, locked_until=now + timedelta(seconds=ttl))
+
+    try:
+        yield bool(acquired)
+    finally:
+        if acquired:
+            TaskLock.objects.filter(name=name, owner=owner).update(
+                owner="", locked_until=None
+            )
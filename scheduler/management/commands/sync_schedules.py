@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from scheduler.schedules import SCHEDULES, sync_schedules
+
+
+class Command(BaseCommand):
+    help = "Create or update the django-q schedules of the project"
+
+    def handle(self, *args, **options):
+        sync_schedules()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Synced {len(SCHEDULES)} schedules: {', '.join(SCHEDULES)}"
+            )
+        )
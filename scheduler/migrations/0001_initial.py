@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskLock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("owner", models.CharField(blank=True, max_length=32)),
+                ("locked_until", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
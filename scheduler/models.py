@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class TaskLock(models.Model):
+    """A lease that lets only one node at a time run a given task"""
+
+    name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,63 @@
+from django.db.models import Q
+from django.utils import timezone
+from django_q.models import Schedule
+
+SCHEDULES = {
+    "check_overdue_borrowings": {
+        "func": "borrowing.tasks.check_overdue_borrowings",
+        "schedule_type": Schedule.DAILY,
+    },
+    # Safety net for messages whose flush task was lost
+    "flush_telegram_messages": {
+        "func": "notification.tasks.flush_telegram_messages",
+        "schedule_type": Schedule.MINUTES,
+        "minutes": 5,
+    },
+    # Cheap: each run only re-aggregates the last two days
+    "rollup_daily_stats": {
+        "func": "analytics.tasks.rollup_daily_stats",
+        "schedule_type": Schedule.HOURLY,
+    },
+    # Summaries are kept by deltas; this only repairs drift
+    "repair_borrower_summaries": {
+        "func": "borrowing.tasks.repair_borrower_summaries",
+        "schedule_type": Schedule.DAILY,
+    },
+    "purge_expired_tokens": {
+        "func": "user.tasks.purge_expired_tokens",
+        "schedule_type": Schedule.DAILY,
+    },
+}
+
+
+def sync_schedules(schedules=None):
+    """
+    Make the django-q schedule table match ``SCHEDULES``: exactly one
+    repeating schedule per entry, matched by name or by function. Existing
+    schedules keep their next_run, so re-syncing never triggers extra runs.
+    """
+    schedules = SCHEDULES if schedules is None else schedules
+
+    for name, options in schedules.items():
+        existing = Schedule.objects.filter(
+            Q(name=name) | Q(func=options["func"])
+        ).order_by("id")
+        schedule = existing.first()
+
+        if schedule is None:
+            Schedule.objects.create(
+                name=name, repeats=-1, next_run=timezone.now(), **options
+            )
+            continue
+
+        existing.exclude(pk=schedule.pk).delete()
+        schedule.name = name
+        schedule.repeats = -1
+        for field, value in options.items():
+            setattr(schedule, field, value)
+        schedule.save()
+
+
+def sync_schedules_after_migrate(using="default", **kwargs):
+    if using == "default":
+        sync_schedules()
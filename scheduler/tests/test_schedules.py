@@ -0,0 +1,101 @@
+import importlib
+import sys
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django_q.models import Schedule
+
+from scheduler.locks import task_lock
+from scheduler.models import TaskLock
+from scheduler.schedules import SCHEDULES, sync_schedules
+
+
+class SyncSchedulesTests(TestCase):
+    def setUp(self):
+        Schedule.objects.all().delete()
+
+    def test_creates_one_schedule_per_entry(self):
+        sync_schedules()
+
+        self.assertEqual(
+            set(Schedule.objects.values_list("name", "func")),
+            {(name, options["func"]) for name, options in SCHEDULES.items()},
+        )
+        self.assertTrue(all(s.repeats == -1 for s in Schedule.objects.all()))
+
+    def test_is_idempotent(self):
+        sync_schedules()
+        next_runs = dict(Schedule.objects.values_list("name", "next_run"))
+
+        call_command("sync_schedules", stdout=mock.Mock())
+
+        self.assertEqual(Schedule.objects.count(), len(SCHEDULES))
+        self.assertEqual(
+            dict(Schedule.objects.values_list("name", "next_run")), next_runs
+        )
+
+    def test_removes_duplicates(self):
+        for name in ["overdue", "overdue copy", "check_overdue_borrowings"]:
+            Schedule.objects.create(
+                name=name,
+                func="borrowing.tasks.check_overdue_borrowings",
+                schedule_type=Schedule.HOURLY,
+            )
+
+        sync_schedules()
+
+        schedule = Schedule.objects.get(func="borrowing.tasks.check_overdue_borrowings")
+        self.assertEqual(schedule.name, "check_overdue_borrowings")
+        self.assertEqual(schedule.schedule_type, Schedule.DAILY)
+
+
+class ImportSideEffectTests(TestCase):
+    def test_importing_tasks_does_not_enqueue(self):
+        import borrowing.tasks
+
+        # Later tests must keep using the original module, not the reloaded
+        # one holding the mocked async_task
+        with mock.patch.dict(sys.modules), mock.patch.object(
+            borrowing, "tasks", borrowing.tasks
+        ), mock.patch("django_q.tasks.async_task") as async_task:
+            sys.modules.pop("borrowing.tasks")
+            importlib.import_module("borrowing.tasks")
+
+        async_task.assert_not_called()
+        self.assertIs(sys.modules["borrowing.tasks"], borrowing.tasks)
+        self.assertIsNot(borrowing.tasks.async_task, async_task)
+
+
+class TaskLockTests(TestCase):
+    def test_lock_is_exclusive(self):
+        with task_lock("job", ttl=60) as first:
+            with task_lock("job", ttl=60) as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+
+    def test_lock_is_released(self):
+        with task_lock("job", ttl=60):
+            pass
+
+        with task_lock("job", ttl=60) as acquired:
+            self.assertTrue(acquired)
+
+    def test_expired_lock_can_be_taken_over(self):
+        TaskLock.objects.create(
+            name="job",
+            owner="crashed-worker",
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+
+        with task_lock("job", ttl=60) as acquired:
+            self.assertTrue(acquired)
+
+    def test_stale_owner_does_not_release_new_lock(self):
+        with task_lock("job", ttl=60):
+            # The first holder's lease expired and another worker took over
+            TaskLock.objects.filter(name="job").update(owner="other-worker")
+
+        self.assertEqual(TaskLock.objects.get(name="job").owner, "other-worker")
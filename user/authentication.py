@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+class LocalCache:
+    """A thread-safe LRU whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value, time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_users = LocalCache(
+    settings.AUTH_USER_CACHE["LOCAL_SIZE"], settings.AUTH_USER_CACHE["LOCAL_TTL"]
+)
+
+
+def _cache_key(user_id):
+    # v2 entries leave out the password hash
+    return f"auth:user:v2:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    Load a user through the process-local LRU and the shared cache.
+
+    Only the user's column values are cached; every call builds a new
+    instance, so relations cached on one request's user (``user.summary``)
+    never leak into the next request. The password hash is left out of
+    the caches and deferred; reading it loads it from the table.
+    """
+    User = get_user_model()
+    values = _local_users.get(user_id)
+    if values is None:
+        values = cache.get(_cache_key(user_id))
+        if values is None:
+            user = User.objects.get(pk=user_id)
+            values = [getattr(user, field.attname) for field in _fields()]
+            cache.set(
+                _cache_key(user_id), values, settings.AUTH_USER_CACHE["SHARED_TTL"]
+            )
+        _local_users.set(user_id, values)
+
+    return User.from_db(
+        DEFAULT_DB_ALIAS, [field.attname for field in _fields()], values
+    )
+
+
+def invalidate_user(user_id):
+    """
+    Drop the user from the caches now and again once the transaction
+    commits, so a request racing with the change cannot cache the old row.
+    Other processes keep their local copy for at most LOCAL_TTL seconds.
+    """
+
+    def invalidate():
+        _local_users.delete(user_id)
+        cache.delete(_cache_key(user_id))
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+def _fields():
+    return [
+        field
+        for field in get_user_model()._meta.concrete_fields
+        if field.attname != "password"
+    ]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from the caches
+    instead of querying the user table on every request, and rejects
+    access tokens issued before the user last logged out.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = get_cached_user(user_id)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if user.tokens_valid_after is not None and "iat" in validated_token:
+            issued_at = datetime.fromtimestamp(validated_token["iat"], timezone.utc)
+            if issued_at < user.tokens_valid_after.replace(microsecond=0):
+                raise AuthenticationFailed(
+                    _("Token has been revoked"), code="token_revoked"
+                )
+
+        return user
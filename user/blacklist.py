@@ -0,0 +1,154 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+VERSION_KEY = "auth:blacklist:version"
+# Processes that did not check the version for longer rebuild their filter
+ENTRY_TTL = 60 * 60
+# Catching up on more new entries than this rebuilds the filter instead
+MAX_CATCH_UP = 1000
+
+
+def cache_is_shared():
+    """Whether every process reads the same cache, e.g. Redis"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+class BloomFilter:
+    """
+    A set of strings that answers "maybe" or "definitely not", in
+    ``capacity`` * ~1.2 bytes for a 1% false positive rate
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big")
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class TokenBlacklistFilter:
+    """
+    Per-process Bloom filter over the jtis of blacklisted tokens, so a
+    token that was never blacklisted is accepted without a query.
+
+    Every blacklisting bumps a version counter in the shared cache and
+    stores the jti under the new version. Each check reads the counter
+    and, when it moved, adds the new jtis to the local filter; if some of
+    them are gone from the cache, the filter is rebuilt from the table
+    instead. A blacklisted token is therefore never missed, whichever
+    process blacklisted it. The filter is also rebuilt every
+    REBUILD_INTERVAL seconds to drop the tokens that expired.
+
+    That only holds when the cache is shared by the processes. With a
+    per-process cache (no REDIS_URL), other processes would never hear of
+    a new entry, so every check queries the table instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._version = 0
+        self._built_at = 0
+
+    def is_blacklisted(self, jti):
+        if cache_is_shared() and not self.might_contain(jti):
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self._filter
+
+    def announce(self, jti):
+        """Tell every process about a new blacklisted jti"""
+        cache.add(VERSION_KEY, 0, timeout=None)
+        version = cache.incr(VERSION_KEY)
+        cache.set(f"auth:blacklist:{version}", jti, ENTRY_TTL)
+
+    def sync(self):
+        version = cache.get(VERSION_KEY, 0)
+        config = settings.TOKEN_BLACKLIST_FILTER
+
+        with self._lock:
+            if (
+                self._filter is None
+                # The counter was lost and started over
+                or version < self._version
+                or version - self._version > MAX_CATCH_UP
+                or time.monotonic() - self._built_at > config["REBUILD_INTERVAL"]
+            ):
+                self._rebuild(version, config)
+            elif version > self._version:
+                keys = [
+                    f"auth:blacklist:{number}"
+                    for number in range(self._version + 1, version + 1)
+                ]
+                jtis = cache.get_many(keys)
+                if len(jtis) < len(keys):
+                    self._rebuild(version, config)
+                    return
+                for jti in jtis.values():
+                    self._filter.add(jti)
+                self._version = version
+
+    def _rebuild(self, version, config):
+        # The version is read before the table, so a jti blacklisted
+        # meanwhile is either in the table or announced under a newer one
+        bloom = BloomFilter(config["CAPACITY"], config["ERROR_RATE"])
+        jtis = BlacklistedToken.objects.filter(
+            token__expires_at__gt=timezone.now()
+        ).values_list("token__jti", flat=True)
+        for jti in jtis.iterator(chunk_size=10000):
+            bloom.add(jti)
+
+        self._filter = bloom
+        self._version = version
+        self._built_at = time.monotonic()
+
+
+blacklist_filter = TokenBlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """A refresh token whose blacklist check goes through the Bloom filter"""
+
+    def check_blacklist(self):
+        if blacklist_filter.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        transaction.on_commit(lambda: blacklist_filter.announce(jti))
+        return result
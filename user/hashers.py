@@ -0,0 +1,57 @@
+"""Password hashers whose cost comes from the PASSWORD_HASHING setting"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+
+# Enough for any work factor we have used so far
+MIN_SCRYPT_MAXMEM = 64 * 1024 * 1024
+
+
+def _option(hasher, name):
+    return settings.PASSWORD_HASHING[hasher][name]
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return _option("SCRYPT", "WORK_FACTOR")
+
+    @property
+    def block_size(self):
+        return _option("SCRYPT", "BLOCK_SIZE")
+
+    @property
+    def parallelism(self):
+        return _option("SCRYPT", "PARALLELISM")
+
+    @property
+    def maxmem(self):
+        # OpenSSL refuses more than 32 MiB unless asked; scrypt needs
+        # 128 * n * r * p bytes
+        needed = 128 * self.work_factor * self.block_size * self.parallelism
+        return max(MIN_SCRYPT_MAXMEM, 2 * needed)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Needs argon2-cffi, which is only installed where it is configured"""
+
+    @property
+    def time_cost(self):
+        return _option("ARGON2", "TIME_COST")
+
+    @property
+    def memory_cost(self):
+        return _option("ARGON2", "MEMORY_COST")
+
+    @property
+    def parallelism(self):
+        return _option("ARGON2", "PARALLELISM")
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return _option("PBKDF2", "ITERATIONS")
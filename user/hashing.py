@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+
+# Smaller batches are hashed in this process; the round trip to the pool
+# is not worth it
+MIN_POOL_BATCH = 8
+
+_pool = None
+_pool_workers = None
+
+
+def _init_worker():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "drf_library.settings")
+    django.setup()
+
+
+def _hash(password, algorithm):
+    return make_password(password, hasher=algorithm)
+
+
+def get_pool(workers):
+    """
+    One pool per process, so its workers are started only once. They are
+    spawned rather than forked: a fork of a web or task worker would
+    inherit its open database connections and running threads.
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        _pool_workers = workers
+    return _pool
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hash passwords with the preferred hasher across a pool of processes,
+    one per core by default, and return the hashes in order. Password
+    hashing is CPU-bound by design, so threads would not help.
+    """
+    passwords = list(passwords)
+    workers = workers or settings.PASSWORD_HASHING["WORKERS"]
+    algorithm = get_hasher().algorithm
+
+    if workers <= 1 or len(passwords) < MIN_POOL_BATCH:
+        return [_hash(password, algorithm) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(
+        get_pool(workers).map(
+            _hash, passwords, [algorithm] * len(passwords), chunksize=chunksize
+        )
+    )
@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from drf_library.streaming import MAX_ERRORS, chunked, read_records
+from .hashing import hash_passwords
+from .serializers import UserImportSerializer
+
+BATCH_SIZE = 1000
+FIELDS = ["email", "password", "first_name", "last_name"]
+
+
+def import_users(lines, file_format, batch_size=BATCH_SIZE, workers=None):
+    """
+    Create users from a CSV or NDJSON text stream.
+
+    Records are read lazily and validated with ``UserImportSerializer``,
+    which normalizes the email. Records whose email is already taken,
+    in the table or earlier in the batch, are skipped and reported as
+    duplicates; the rest of the batch is still created. The passwords of
+    a batch are hashed in parallel (see ``hash_passwords``) before the
+    batch is inserted with one ``bulk_create`` in its own transaction.
+    Users without a password get an unusable one and must reset it.
+    """
+    result = {"created": 0, "duplicate": 0, "invalid": 0, "errors": []}
+
+    def report(key, line_number, errors):
+        result[key] += 1
+        if len(result["errors"]) < MAX_ERRORS:
+            result["errors"].append({"line": line_number, "errors": errors})
+
+    def report_duplicate(line_number):
+        report(
+            "duplicate",
+            line_number,
+            {"email": ["A user with this email already exists."]},
+        )
+
+    User = get_user_model()
+    for batch in chunked(read_records(lines, file_format), batch_size):
+        users = []
+        for line_number, record in batch:
+            user = _validate(record)
+            if isinstance(user, User):
+                users.append((line_number, user))
+            else:
+                report("invalid", line_number, user)
+
+        taken = _existing_emails(user.email for _, user in users)
+        new_users = []
+        for line_number, user in users:
+            if user.email in taken:
+                report_duplicate(line_number)
+                continue
+            taken.add(user.email)
+            new_users.append((line_number, user))
+
+        batch_users = [user for _, user in new_users]
+        _hash(batch_users, workers)
+        created = _create(batch_users)
+        for line_number, user in new_users:
+            if user.email not in created:
+                report_duplicate(line_number)
+        result["created"] += len(created)
+
+    return result
+
+
+def _validate(record):
+    if record is None:
+        return {"non_field_errors": ["Not a JSON object."]}
+
+    serializer = UserImportSerializer(data=record)
+    if not serializer.is_valid():
+        return serializer.errors
+    # The raw password is kept until the batch is hashed
+    return get_user_model()(**serializer.validated_data)
+
+
+def _existing_emails(emails):
+    return set(
+        get_user_model()
+        .objects.filter(email__in=list(emails))
+        .values_list("email", flat=True)
+    )
+
+
+def _hash(users, workers):
+    """Hash the raw passwords, outside any transaction as this is slow"""
+    with_password = [user for user in users if user.password]
+    hashes = hash_passwords([user.password for user in with_password], workers)
+    for user, encoded in zip(with_password, hashes):
+        user.password = encoded
+    for user in users:
+        if not user.password:
+            user.set_unusable_password()
+
+
+@transaction.atomic
+def _create(users):
+    """
+    Insert ``users`` and return the emails of those actually created.
+    A user registered by someone else since the emails were checked is
+    skipped instead of failing the batch; as each password hash is
+    salted, the rows that are ours are told apart by it.
+    """
+    User = get_user_model()
+    User.objects.bulk_create(users, ignore_conflicts=True)
+    hashes = {user.email: user.password for user in users}
+    stored = User.objects.filter(email__in=list(hashes)).values_list(
+        "email", "password"
+    )
+    return {email for email, password in stored if hashes[email] == password}
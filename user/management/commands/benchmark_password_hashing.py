@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, get_hashers, make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from user.hashing import _hash, get_pool, hash_passwords
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how many registrations per second one core and the bulk "
+        "import pool can hash with the configured password hashers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hasher",
+            action="append",
+            dest="hashers",
+            help="Algorithm to measure, e.g. scrypt; repeatable. "
+            "Defaults to the preferred hasher",
+        )
+        parser.add_argument("--seconds", type=float, default=3.0)
+        parser.add_argument(
+            "--workers", type=int, default=settings.PASSWORD_HASHING["WORKERS"]
+        )
+
+    def handle(self, *args, **options):
+        available = [hasher.algorithm for hasher in get_hashers()]
+        hashers = options["hashers"] or [get_hasher().algorithm]
+        for algorithm in hashers:
+            if algorithm not in available:
+                raise CommandError(
+                    f"Unknown hasher {algorithm}; use one of {', '.join(available)}"
+                )
+
+        workers = options["workers"]
+        if workers > 1:
+            # Start the workers before the clock runs
+            hash_passwords(["warm-up"] * workers * 8, workers)
+
+        for algorithm in hashers:
+            per_core = self.measure_one_core(algorithm, options["seconds"])
+            line = f"{algorithm}: {per_core:.1f} registrations/s on one core"
+
+            if workers > 1:
+                count = max(workers * 8, int(per_core * workers * options["seconds"]))
+                started = time.perf_counter()
+                list(
+                    get_pool(workers).map(
+                        _hash,
+                        ["benchmark"] * count,
+                        [algorithm] * count,
+                        chunksize=max(1, count // (workers * 4)),
+                    )
+                )
+                pooled = count / (time.perf_counter() - started)
+                line += (
+                    f", {pooled:.1f}/s with {workers} workers "
+                    f"({pooled / workers:.1f}/s per core)"
+                )
+            self.stdout.write(line)
+
+    @staticmethod
+    def measure_one_core(algorithm, seconds):
+        count = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline or not count:
+            make_password("benchmark", hasher=algorithm)
+            count += 1
+        return count / (time.perf_counter() - started)
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from drf_library.streaming import detect_format
+from user.import_service import BATCH_SIZE, import_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users from a CSV or NDJSON file with the columns email, "
+        "password, first_name, last_name; existing emails are reported"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to import, or "-" for stdin')
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Defaults to the file extension, or csv",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Processes hashing passwords; defaults to PASSWORD_HASHING_WORKERS",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or detect_format(path)
+
+        try:
+            lines = (
+                sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+            )
+        except OSError as error:
+            raise CommandError(error)
+
+        with lines:
+            result = import_users(
+                lines, file_format, options["batch_size"], options["workers"]
+            )
+
+        for error in result["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result['created']}, skipped {result['duplicate']} "
+                f"duplicate and {result['invalid']} invalid users"
+            )
+        )
@@ -1,5 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+
+from .authentication import invalidate_user
+from .blacklist import FilteredRefreshToken, blacklist_filter
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,3 +29,50 @@ class UserSerializer(serializers.ModelSerializer):
             user.save()
 
         return user
+
+
+class UserImportSerializer(serializers.Serializer):
+    """
+    One record of a user import. Unlike UserSerializer it does not query
+    for the email's uniqueness; the import checks a whole batch at once.
+    """
+
+    email = serializers.EmailField()
+    password = serializers.CharField(min_length=5, required=False, allow_blank=True)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True)
+
+    def validate_email(self, value):
+        return get_user_model().objects.normalize_email(value)
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    def validate(self, attrs):
+        """Reject blacklisted refresh tokens, not only expired or forged ones"""
+        token = UntypedToken(attrs["token"])
+        if blacklist_filter.is_blacklisted(token.get(api_settings.JTI_CLAIM)):
+            raise serializers.ValidationError("Token is blacklisted")
+        return {}
+
+
+class LogoutSerializer(jwt_serializers.TokenBlacklistSerializer):
+    token_class = FilteredRefreshToken
+
+    def validate(self, attrs):
+        """
+        Blacklist the refresh token and revoke the access tokens issued to
+        the user so far; other sessions get a new one from their refresh
+        token.
+        """
+        user_id = self.token_class(attrs["refresh"])[api_settings.USER_ID_CLAIM]
+        data = super().validate(attrs)
+
+        get_user_model().objects.filter(pk=user_id).update(
+            tokens_valid_after=timezone.now()
+        )
+        invalidate_user(user_id)
+        return data
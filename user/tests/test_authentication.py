@@ -0,0 +1,146 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from user.authentication import LocalCache, _local_users, get_cached_user
+from user.models import User
+
+ME_URL = reverse("users:manage")
+LOGOUT_URL = reverse("users:token_blacklist")
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_users.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="user@example.com", password="pw")
+
+    def authenticate(self, token=None):
+        token = token or AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_user_is_loaded_once(self):
+        self.authenticate()
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+        with self.assertNumQueries(0):
+            response = self.client.get(ME_URL)
+
+        self.assertEqual(response.data["email"], "user@example.com")
+
+    def test_shared_cache_is_used_by_other_processes(self):
+        self.authenticate()
+        self.client.get(ME_URL)
+        _local_users.clear()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(ME_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_update_is_seen_immediately(self):
+        self.authenticate()
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {"email": "new@example.com"})
+        response = self.client.get(ME_URL)
+
+        self.assertEqual(response.data["email"], "new@example.com")
+
+    def test_profile_update_does_not_write_back_stale_columns(self):
+        self.authenticate()
+        self.client.get(ME_URL)
+        # Another process changes the user without this one noticing
+        User.objects.filter(pk=self.user.pk).update(
+            is_staff=True, tokens_valid_after=timezone.now() - timedelta(days=1)
+        )
+
+        self.client.patch(ME_URL, {"email": "new@example.com"})
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, "new@example.com")
+        self.assertTrue(self.user.is_staff)
+        self.assertIsNotNone(self.user.tokens_valid_after)
+
+    def test_password_hash_is_not_cached(self):
+        get_cached_user(self.user.pk)
+
+        self.assertNotIn(
+            self.user.password, str(cache.get(f"auth:user:v2:{self.user.pk}"))
+        )
+        user = get_cached_user(self.user.pk)
+        self.assertIn("password", user.get_deferred_fields())
+        self.assertTrue(user.check_password("pw"))
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.client.get(ME_URL)
+
+        # As the admin does it
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(ME_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        self.authenticate()
+        self.client.get(ME_URL)
+
+        self.user.delete()
+
+        response = self.client.get(ME_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_earlier_access_tokens(self):
+        refresh = RefreshToken.for_user(self.user)
+        access = refresh.access_token
+        access.set_iat(at_time=timezone.now() - timedelta(seconds=2))
+        self.authenticate(access)
+        self.client.get(ME_URL)
+
+        response = self.client.post(LOGOUT_URL, {"refresh": str(refresh)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(ME_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data["code"], "token_revoked")
+
+        # Logging in again is not affected
+        self.authenticate()
+        response = self.client.get(ME_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_every_call_builds_a_new_instance(self):
+        # Relations cached on one request's user must not leak into the next
+        first, second = get_cached_user(self.user.pk), get_cached_user(self.user.pk)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first, self.user)
+        self.assertFalse(first._state.adding)
+
+
+class LocalCacheTests(TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        local = LocalCache(max_size=2, ttl=60)
+        local.set("a", 1)
+        local.set("b", 2)
+        local.get("a")
+
+        local.set("c", 3)
+
+        self.assertEqual((local.get("a"), local.get("b"), local.get("c")), (1, None, 3))
+
+    def test_entries_expire(self):
+        local = LocalCache(max_size=2, ttl=0)
+        local.set("a", 1)
+
+        self.assertIsNone(local.get("a"))
@@ -0,0 +1,166 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from scheduler.locks import task_lock
+from user.blacklist import (
+    BloomFilter,
+    FilteredRefreshToken,
+    TokenBlacklistFilter,
+    blacklist_filter,
+    cache_is_shared,
+)
+from user.models import User
+from user.tasks import PURGE, purge_expired_tokens
+
+REFRESH_URL = reverse("users:token_refresh")
+VERIFY_URL = reverse("users:token_verify")
+LOGOUT_URL = reverse("users:token_blacklist")
+
+
+class BloomFilterTests(TestCase):
+    def test_added_keys_are_always_found(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f"jti-{index}" for index in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for index in range(1000):
+            bloom.add(f"jti-{index}")
+
+        false_positives = sum(f"other-{index}" in bloom for index in range(10000))
+
+        self.assertLess(false_positives, 300)
+
+
+# The test process's cache stands in for a cache shared by all processes
+@mock.patch("user.blacklist.cache_is_shared", mock.Mock(return_value=True))
+class TokenBlacklistFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        blacklist_filter.__init__()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email="user@example.com", password="pw")
+        self.refresh = RefreshToken.for_user(self.user)
+        self.jti = self.refresh["jti"]
+
+    def logout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(LOGOUT_URL, {"refresh": str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_valid_tokens_are_checked_without_queries(self):
+        self.client.post(REFRESH_URL, {"refresh": str(self.refresh)})
+
+        with self.assertNumQueries(0):
+            response = self.client.post(REFRESH_URL, {"refresh": str(self.refresh)})
+            self.client.post(VERIFY_URL, {"token": str(self.refresh)})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_blacklisted_tokens_are_rejected(self):
+        self.logout()
+
+        response = self.client.post(REFRESH_URL, {"refresh": str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(VERIFY_URL, {"token": str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_processes_catch_up(self):
+        other_process = TokenBlacklistFilter()
+        self.assertFalse(other_process.is_blacklisted(self.jti))
+
+        self.logout()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(other_process.is_blacklisted(self.jti))
+
+    def test_filter_is_rebuilt_when_entries_are_lost(self):
+        other_process = TokenBlacklistFilter()
+        other_process.sync()
+        self.logout()
+
+        cache.delete("auth:blacklist:1")
+
+        self.assertTrue(other_process.is_blacklisted(self.jti))
+
+    def test_rebuild_reads_the_table(self):
+        self.refresh.blacklist()
+
+        self.assertTrue(TokenBlacklistFilter().is_blacklisted(self.jti))
+
+
+class PerProcessCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="user@example.com", password="pw")
+        self.refresh = RefreshToken.for_user(self.user)
+        self.jti = self.refresh["jti"]
+
+    def test_locmem_is_not_shared(self):
+        self.assertFalse(cache_is_shared())
+
+    def test_token_blacklisted_by_another_process_is_rejected(self):
+        other_process = TokenBlacklistFilter()
+        other_process.sync()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FilteredRefreshToken(str(self.refresh)).blacklist()
+        # The other process has a cache of its own, which never saw the
+        # announcement
+        cache.clear()
+
+        self.assertTrue(other_process.is_blacklisted(self.jti))
+
+    def test_every_check_reads_the_table(self):
+        with self.assertNumQueries(1):
+            self.assertFalse(TokenBlacklistFilter().is_blacklisted(self.jti))
+
+
+class PurgeExpiredTokensTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email="user@example.com", password="pw")
+        now = timezone.now()
+        for index in range(5):
+            token = OutstandingToken.objects.create(
+                user=user,
+                jti=f"expired-{index}",
+                token="token",
+                expires_at=now - timedelta(days=1),
+            )
+            if index % 2:
+                BlacklistedToken.objects.create(token=token)
+        live = OutstandingToken.objects.create(
+            user=user, jti="live", token="token", expires_at=now + timedelta(days=1)
+        )
+        BlacklistedToken.objects.create(token=live)
+
+    def test_expired_tokens_are_purged_in_batches(self):
+        self.assertEqual(purge_expired_tokens(batch_size=2), 5)
+
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list("jti", flat=True)), ["live"]
+        )
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+    def test_purge_is_skipped_while_another_node_holds_the_lock(self):
+        with task_lock(PURGE, ttl=60):
+            self.assertIsNone(purge_expired_tokens())
+
+        self.assertEqual(OutstandingToken.objects.count(), 6)
@@ -0,0 +1,112 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user import hashing
+from user.hashing import hash_passwords
+from user.models import User
+
+TOKEN_URL = reverse("users:token_obtain_pair")
+
+FAST_HASHING = {
+    "SCRYPT": {"WORK_FACTOR": 2**10, "BLOCK_SIZE": 8, "PARALLELISM": 1},
+    "ARGON2": {"TIME_COST": 1, "MEMORY_COST": 1024, "PARALLELISM": 1},
+    "PBKDF2": {"ITERATIONS": 1000},
+    "WORKERS": 2,
+}
+
+
+@override_settings(PASSWORD_HASHING=FAST_HASHING)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def login(self, password="test_password"):
+        return self.client.post(
+            TOKEN_URL, {"email": "user@test.com", "password": password}
+        )
+
+    def test_new_passwords_use_the_configured_scrypt_cost(self):
+        user = User.objects.create_user("user@test.com", "test_password")
+
+        decoded = identify_hasher(user.password).decode(user.password)
+        self.assertEqual(decoded["algorithm"], "scrypt")
+        self.assertEqual(
+            (decoded["work_factor"], decoded["block_size"], decoded["parallelism"]),
+            (2**10, 8, 1),
+        )
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        user = User.objects.create_user("user@test.com")
+        user.password = make_password("test_password", hasher="pbkdf2_sha256")
+        user.save()
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("scrypt$"))
+        self.assertTrue(user.check_password("test_password"))
+
+    def test_changing_the_work_factor_rehashes_on_login(self):
+        user = User.objects.create_user("user@test.com", "test_password")
+
+        stronger = {**FAST_HASHING, "SCRYPT": {**FAST_HASHING["SCRYPT"]}}
+        stronger["SCRYPT"]["WORK_FACTOR"] = 2**11
+        with override_settings(PASSWORD_HASHING=stronger):
+            response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        decoded = identify_hasher(user.password).decode(user.password)
+        self.assertEqual(decoded["work_factor"], 2**11)
+
+    def test_wrong_password_is_not_rehashed(self):
+        user = User.objects.create_user("user@test.com")
+        user.password = make_password("test_password", hasher="pbkdf2_sha256")
+        user.save()
+
+        response = self.login("wrong_password")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+
+    def test_hash_passwords_in_pool_keeps_order(self):
+        passwords = [f"password-{index}" for index in range(16)]
+
+        hashes = hash_passwords(passwords, workers=2)
+
+        self.assertEqual(len(hashes), len(passwords))
+        self.assertEqual(len(set(hashes)), len(passwords))
+        for password, encoded in zip(passwords, hashes):
+            self.assertTrue(encoded.startswith("scrypt$"))
+            self.assertTrue(check_password(password, encoded))
+
+    @mock.patch.multiple(hashing, _pool=None, _pool_workers=None)
+    @mock.patch.object(hashing, "ProcessPoolExecutor")
+    def test_pool_workers_are_spawned(self, executor):
+        hashing.get_pool(3)
+
+        options = executor.call_args.kwargs
+        self.assertEqual(options["max_workers"], 3)
+        self.assertEqual(options["mp_context"].get_start_method(), "spawn")
+
+    def test_hash_passwords_inline_for_small_batches(self):
+        hashes = hash_passwords(["first", "second"], workers=2)
+
+        self.assertTrue(check_password("first", hashes[0]))
+        self.assertTrue(check_password("second", hashes[1]))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+
+        call_command("benchmark_password_hashing", seconds=0.1, workers=1, stdout=out)
+
+        self.assertRegex(out.getvalue(), r"^scrypt: [\d.]+ registrations/s on one core")
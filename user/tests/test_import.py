@@ -0,0 +1,169 @@
+import io
+import json
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user import import_service
+from user.import_service import import_users
+from user.models import User
+
+IMPORT_URL = reverse("users:import")
+
+FAST_HASHING = {
+    "SCRYPT": {"WORK_FACTOR": 2**10, "BLOCK_SIZE": 8, "PARALLELISM": 1},
+    "ARGON2": {"TIME_COST": 1, "MEMORY_COST": 1024, "PARALLELISM": 1},
+    "PBKDF2": {"ITERATIONS": 1000},
+    "WORKERS": 1,
+}
+
+USERS_CSV = (
+    "email,password,first_name,last_name\n"
+    "ann@School.ORG,secret1,Ann,Lee\n"
+    "bob@school.org,secret2,Bob,\n"
+    "not an email,secret3,,\n"
+    "ann@school.org,secret4,Ann,Again\n"
+    "carl@school.org,,Carl,\n"
+)
+
+
+@override_settings(PASSWORD_HASHING=FAST_HASHING)
+class ImportUsersTests(TestCase):
+    def test_csv_import_reports_invalid_and_duplicate_rows(self):
+        User.objects.create_user("bob@school.org", "existing")
+
+        result = import_users(io.StringIO(USERS_CSV), "csv", batch_size=2)
+
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(result["duplicate"], 2)
+        self.assertEqual(result["invalid"], 1)
+        self.assertEqual(
+            [(error["line"], list(error["errors"])) for error in result["errors"]],
+            [(3, ["email"]), (4, ["email"]), (5, ["email"])],
+        )
+
+        ann = User.objects.get(email="ann@school.org")
+        self.assertEqual((ann.first_name, ann.last_name), ("Ann", "Lee"))
+        self.assertTrue(ann.check_password("secret1"))
+        self.assertFalse(ann.is_staff)
+        self.assertFalse(
+            User.objects.get(email="carl@school.org").has_usable_password()
+        )
+        self.assertTrue(
+            User.objects.get(email="bob@school.org").check_password("existing")
+        )
+
+    def test_duplicates_within_a_batch(self):
+        lines = [
+            {"email": "ann@school.org", "password": "secret1"},
+            {"email": "ann@SCHOOL.org", "password": "secret2"},
+        ]
+        stream = io.StringIO("\n".join(map(json.dumps, lines)) + "\n[]\n")
+
+        result = import_users(stream, "ndjson")
+
+        self.assertEqual(
+            (result["created"], result["duplicate"], result["invalid"]), (1, 1, 1)
+        )
+        self.assertTrue(
+            User.objects.get(email="ann@school.org").check_password("secret1")
+        )
+
+    def test_users_registered_during_the_import_are_duplicates(self):
+        # Registered between the email check and the insert
+        User.objects.create_user("bob@school.org", "existing")
+
+        with mock.patch.object(import_service, "_existing_emails", return_value=set()):
+            result = import_users(io.StringIO(USERS_CSV), "csv")
+
+        self.assertEqual(
+            (result["created"], result["duplicate"], result["invalid"]), (2, 2, 1)
+        )
+        self.assertEqual(sorted(error["line"] for error in result["errors"]), [3, 4, 5])
+        self.assertTrue(
+            User.objects.get(email="bob@school.org").check_password("existing")
+        )
+
+    def test_passwords_are_hashed_outside_the_transaction(self):
+        depth = len(connection.savepoint_ids)
+        hash_passwords = import_service.hash_passwords
+        depths = []
+
+        def hash_and_record(passwords, workers):
+            depths.append(len(connection.savepoint_ids))
+            return hash_passwords(passwords, workers)
+
+        with mock.patch.object(import_service, "hash_passwords", hash_and_record):
+            import_users(io.StringIO(USERS_CSV), "csv", batch_size=2)
+
+        self.assertEqual(depths, [depth] * 3)
+
+    def test_passwords_are_hashed_in_the_pool(self):
+        csv = "email,password\n" + "".join(
+            f"user{index}@school.org,password{index}\n" for index in range(10)
+        )
+
+        result = import_users(io.StringIO(csv), "csv", workers=2)
+
+        self.assertEqual(result["created"], 10)
+        user = User.objects.get(email="user7@school.org")
+        self.assertTrue(user.password.startswith("scrypt$"))
+        self.assertTrue(user.check_password("password7"))
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as file:
+            file.write(USERS_CSV)
+            file.flush()
+
+            out = io.StringIO()
+            call_command("import_users", file.name, stdout=out, stderr=io.StringIO())
+
+        self.assertEqual(User.objects.count(), 3)
+        self.assertIn("Created 3, skipped 1 duplicate and 1 invalid", out.getvalue())
+
+
+@override_settings(PASSWORD_HASHING=FAST_HASHING)
+class ImportUsersViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def upload(self):
+        return self.client.post(
+            IMPORT_URL,
+            {"file": SimpleUploadedFile("users.csv", USERS_CSV.encode())},
+            format="multipart",
+        )
+
+    def test_admin_can_import(self):
+        admin = User.objects.create_superuser("admin@test.com", "test_password")
+        self.client.force_authenticate(admin)
+
+        response = self.upload()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(response.data["duplicate"], 1)
+
+    def test_regular_user_cannot_import(self):
+        user = User.objects.create_user("user@test.com", "test_password")
+        self.client.force_authenticate(user)
+
+        response = self.upload()
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_missing_file(self):
+        admin = User.objects.create_superuser("admin@test.com", "test_password")
+        self.client.force_authenticate(admin)
+
+        response = self.client.post(IMPORT_URL, {}, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -6,7 +6,7 @@ from rest_framework_simplejwt.views import (
     TokenBlacklistView,
 )
 
-from user.views import CreateUserView, ManageUserView
+from user.views import CreateUserView, ImportUsersView, ManageUserView
 
 app_name = "users"
 
@@ -15,6 +15,7 @@ urlpatterns = [
     path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
+    path("import/", ImportUsersView.as_view(), name="import"),
     path("me/", ManageUserView.as_view(), name="manage"),
     path("logout/", TokenBlacklistView.as_view(), name="token_blacklist"),
 ]